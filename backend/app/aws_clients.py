@@ -0,0 +1,70 @@
+# app/aws_clients.py
+"""
+Process-wide registry of long-lived boto3 clients.
+
+`boto3.client(...)` loads the botocore service model, resolves credentials and
+builds an endpoint and connection pool – tens of milliseconds – and the
+helpers in main.py did that on every order detail and export. Clients are
+thread-safe once built, so one per (service, region, config) is created lazily
+and shared by all requests and worker threads.
+
+Creation goes through a private boto3 Session under a lock (the default
+session is not safe to build clients from concurrently). Reusing a client also
+keeps its resolved credentials and region-pinned endpoint, so
+`generate_presigned_url` is a local HMAC with no network round trip.
+"""
+import os
+import threading
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32"))
+
+_session: Optional[boto3.session.Session] = None
+_clients: Dict[Hashable, Any] = {}
+_lock = threading.Lock()
+
+
+def _config_key(options: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, repr(v)) for k, v in options.items()))
+
+
+def aws_client(service: str, region: Optional[str] = None, **config_options: Any):
+    """
+    Shared client for `service` in `region` (None = boto3's default resolution).
+    `config_options` are botocore Config arguments; standard-mode retries with
+    3 attempts and AWS_MAX_POOL_CONNECTIONS are the defaults.
+    """
+    global _session
+    options = {
+        "retries": {"max_attempts": 3, "mode": "standard"},
+        "max_pool_connections": AWS_MAX_POOL_CONNECTIONS,
+        **config_options,
+    }
+    key = (service, region or "", _config_key(options))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            if _session is None:
+                _session = boto3.session.Session()
+            client = _session.client(service, region_name=region, config=Config(**options))
+            _clients[key] = client
+    return client
+
+
+def clear_aws_clients() -> None:
+    """Drop every cached client (credential rotation, benchmarks)."""
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
+
+
+def aws_client_stats() -> Dict[str, Any]:
+    with _lock:
+        return {"clients": sorted(f"{k[0]}@{k[1] or 'default'}" for k in _clients)}
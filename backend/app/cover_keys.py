@@ -0,0 +1,134 @@
+# app/cover_keys.py
+"""
+Persisted cover-image keys for the order detail view.
+
+The detail view shows the first generated page (`jpg_output/{job_id}_pg0_*`,
+preferring `_001.jpg`) from DIFFRUN_GENERATIONS_BUCKET. Finding it meant
+listing up to 2000 objects on every render. Once the `_001.jpg` page exists
+its key is stored on the order docs of that job as `cover_image_key`, so
+rendering reads the field and only signs it. Until then the earliest pg0
+image is shown but not stored (a later `_001.jpg` must still win), and the
+listing stays as the fallback for docs without the field.
+
+`backfill_cover_keys()` fills the field for existing paid orders (nightly job,
+/debug/backfill-cover-keys, or `python -m app.cover_keys`). Jobs without a
+final cover yet are left unset and retried on the next run.
+"""
+import os
+import re
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import UpdateMany
+from pymongo.collection import Collection
+
+logger = logging.getLogger(__name__)
+
+COVER_KEY_FIELD = "cover_image_key"
+COVER_BACKFILL_WORKERS = int(os.getenv("COVER_BACKFILL_WORKERS", "8"))
+
+
+def generations_bucket() -> str:
+    return (os.getenv("DIFFRUN_GENERATIONS_BUCKET") or "").strip()
+
+
+def list_objects_with_prefix(s3, bucket: str, prefix: str, max_collect: int = 1000) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    token: Optional[str] = None
+    while True:
+        kwargs = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": 1000}
+        if token:
+            kwargs["ContinuationToken"] = token
+        resp = s3.list_objects_v2(**kwargs)
+        out.extend(resp.get("Contents", []) or [])
+        if not resp.get("IsTruncated") or len(out) >= max_collect:
+            break
+        token = resp.get("NextContinuationToken")
+    return out
+
+
+def is_final_cover_key(key: Optional[str]) -> bool:
+    """Only the `_001.jpg` page is final; other pg0 images may still be superseded."""
+    return bool(key) and key.lower().endswith("_001.jpg")
+
+
+def find_cover_key(s3, bucket: str, job_id: str) -> Optional[str]:
+    """Key of the job's cover page (earliest `_001.jpg`, else earliest pg0 image), or None."""
+    objs = list_objects_with_prefix(s3, bucket, f"jpg_output/{job_id}_pg0_", max_collect=2000)
+    if not objs:
+        return None
+    preferred = [o for o in objs if is_final_cover_key(str(o.get("Key", "")))]
+    return min(preferred or objs, key=lambda o: o.get("LastModified"))["Key"]
+
+
+# docs without a final key (unset, or a provisional pg0 key stored by older code)
+_NOT_FINAL = {"$or": [
+    {COVER_KEY_FIELD: {"$exists": False}},
+    {COVER_KEY_FIELD: {"$not": re.compile(r"_001\.jpg$", re.IGNORECASE)}},
+]}
+
+
+def _remember_op(job_id: str, key: str) -> UpdateMany:
+    return UpdateMany({"job_id": job_id, **_NOT_FINAL}, {"$set": {COVER_KEY_FIELD: key}})
+
+
+def remember_cover_key(col: Collection, job_id: str, key: str) -> bool:
+    """Store `key` for the job if it is final; returns whether a write was issued."""
+    if not is_final_cover_key(key):
+        return False
+    col.bulk_write([_remember_op(job_id, key)], ordered=False)
+    return True
+
+
+def backfill_cover_keys(
+    col: Collection,
+    get_client: Callable[[], Any],
+    batch_size: int = 200,
+    workers: int = COVER_BACKFILL_WORKERS,
+) -> Dict[str, int]:
+    """Discover and store `cover_image_key` for paid orders that lack it. Safe to re-run."""
+    bucket = generations_bucket()
+    if not bucket:
+        logger.warning("[COVER-KEYS] DIFFRUN_GENERATIONS_BUCKET not set; skipping backfill")
+        return {"jobs": 0, "found": 0, "provisional": 0, "updated": 0, "failed": 0}
+
+    s3 = get_client()
+    job_ids = col.distinct(
+        "job_id", {"paid": True, "job_id": {"$nin": [None, ""]}, **_NOT_FINAL})
+    found = provisional = updated = failed = 0
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cover-keys") as pool:
+        for start in range(0, len(job_ids), batch_size):
+            chunk = job_ids[start:start + batch_size]
+            ops = []
+            for job_id, fut in zip(chunk, [pool.submit(find_cover_key, s3, bucket, j) for j in chunk]):
+                try:
+                    key = fut.result()
+                except Exception:
+                    logger.warning("[COVER-KEYS] listing failed for job %s", job_id, exc_info=True)
+                    failed += 1
+                    continue
+                if is_final_cover_key(key):
+                    found += 1
+                    ops.append(_remember_op(job_id, key))
+                elif key:
+                    provisional += 1  # no _001.jpg yet; retried next run
+            if ops:
+                updated += col.bulk_write(ops, ordered=False).modified_count
+    return {"jobs": len(job_ids), "found": found, "provisional": provisional, "updated": updated, "failed": failed}
+
+
+if __name__ == "__main__":
+    # one-off backfill: python -m app.cover_keys
+    import boto3
+    from botocore.config import Config
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    _col = MongoClient(os.getenv("MONGO_URI"), tz_aware=True)["candyman"]["user_details"]
+    _region = (os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "").strip() or None
+    _client = boto3.client("s3", region_name=_region, config=Config(retries={"max_attempts": 3, "mode": "standard"}))
+    logger.info("[COVER-KEYS] backfill done: %s", backfill_cover_keys(_col, lambda: _client))
@@ -0,0 +1,97 @@
+# app/fieldsets.py
+"""
+Sparse fieldsets (`fields=`) for the order list endpoints.
+
+`/api/orders_api` and `/api/shipment-orders` project ~30 source fields
+(including the whole `shipping_address` and three S3 URLs) and remap each into
+the response, while most grid views show a handful of columns. With
+`fields=order_id,name,city` the Mongo projection and the response mapping are
+both narrowed to what those columns need; without it the full shape is served
+as before.
+
+ORDER_ROW_FIELDS maps each response key to the source fields it reads and how
+it is computed; an endpoint's full shape is a tuple of those keys.
+`order_id` is always included as the row key.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+Getter = Callable[[Dict[str, Any]], Any]
+
+
+def _price(doc: Dict[str, Any]) -> Any:
+    return doc.get("price", doc.get("total_price", doc.get("amount", doc.get("total_amount", 0))))
+
+
+# response key -> (source fields, getter)
+ORDER_ROW_FIELDS: Dict[str, Tuple[Tuple[str, ...], Getter]] = {
+    "order_id": (("order_id",), lambda d: d.get("order_id", "")),
+    "job_id": (("job_id",), lambda d: d.get("job_id", "")),
+    "coverPdf": (("cover_url",), lambda d: d.get("cover_url", "")),
+    "interiorPdf": (("book_url",), lambda d: d.get("book_url", "")),
+    "previewUrl": (("preview_url",), lambda d: d.get("preview_url", "")),
+    "name": (("name",), lambda d: d.get("name", "")),
+    "city": (("shipping_address.city",), lambda d: d.get("shipping_address", {}).get("city", "")),
+    "price": (("price", "total_price", "amount", "total_amount"), _price),
+    "paymentDate": (("processed_at",), lambda d: d.get("processed_at", "")),
+    "approvalDate": (("approved_at",), lambda d: d.get("approved_at", "")),
+    "status": (("approved",), lambda d: "Approved" if d.get("approved") else "Uploaded"),
+    "bookId": (("book_id",), lambda d: d.get("book_id", "")),
+    "bookStyle": (("book_style",), lambda d: d.get("book_style", "")),
+    "printStatus": (("print_status",), lambda d: d.get("print_status", "")),
+    "feedback_email": (("feedback_email",), lambda d: d.get("feedback_email", False)),
+    "print_approval": (("print_approval",), lambda d: d.get("print_approval", None)),
+    "discount_code": (("discount_code",), lambda d: d.get("discount_code", "")),
+    "currency": (("currency",), lambda d: d.get("currency", "")),
+    "locale": (("locale",), lambda d: d.get("locale", "")),
+    "shippedAt": (("shipped_at",), lambda d: d.get("shipped_at")),
+    "quantity": (("quantity",), lambda d: d.get("quantity", 1)),
+    "cust_status": (("cust_status",), lambda d: d.get("cust_status", "")),
+    "printer": (("printer",), lambda d: d.get("printer", "")),
+    "locked": (("locked",), lambda d: bool(d.get("locked", False))),
+    "locked_by": (("locked_by",), lambda d: d.get("locked_by", "")),
+    "unlock_by": (("unlock_by",), lambda d: d.get("unlock_by", "")),
+    "print_sent_by": (("print_sent_by",), lambda d: d.get("print_sent_by", "")),
+    "google_review_received": (("google_review_received",), lambda d: bool(d.get("google_review_received", False))),
+    "shippingStatus": (("current_status",), lambda d: d.get("current_status", "")),
+}
+
+# full response shapes, in response key order
+ORDERS_LIST_FIELDS = (
+    "order_id", "job_id", "coverPdf", "interiorPdf", "previewUrl", "name", "city", "price",
+    "paymentDate", "approvalDate", "status", "bookId", "bookStyle", "printStatus", "feedback_email",
+    "print_approval", "discount_code", "currency", "locale", "shippedAt", "quantity", "cust_status",
+    "printer", "locked", "locked_by", "unlock_by", "print_sent_by", "google_review_received",
+)
+SHIPMENT_ORDERS_LIST_FIELDS = (
+    "order_id", "job_id", "coverPdf", "interiorPdf", "previewUrl", "name", "city", "price",
+    "paymentDate", "approvalDate", "status", "bookId", "bookStyle", "printStatus", "print_approval",
+    "discount_code", "currency", "locale", "shippedAt", "quantity", "cust_status", "printer",
+    "locked", "locked_by", "unlock_by", "print_sent_by", "shippingStatus",
+)
+
+
+def select_fields(requested: Optional[Iterable[str]], available: Sequence[str]) -> Sequence[str]:
+    """
+    Response keys for a `fields=` value (repeated and/or comma-separated), in
+    `available` order; the full shape when nothing is requested. ValueError
+    names unknown keys.
+    """
+    wanted = {f.strip() for item in (requested or []) for f in str(item).split(",") if f.strip()}
+    if not wanted:
+        return available
+    unknown = sorted(wanted.difference(available))
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}; available: {list(available)}")
+    wanted.add("order_id")
+    return tuple(k for k in available if k in wanted)
+
+
+def fieldset_projection(keys: Sequence[str]) -> Dict[str, int]:
+    projection = {src: 1 for k in keys for src in ORDER_ROW_FIELDS[k][0]}
+    projection["_id"] = 0
+    return projection
+
+
+def render_rows(docs: Iterable[Dict[str, Any]], keys: Sequence[str]) -> List[Dict[str, Any]]:
+    getters = [(k, ORDER_ROW_FIELDS[k][1]) for k in keys]
+    return [{k: get(doc) for k, get in getters} for doc in docs]
@@ -0,0 +1,266 @@
+# app/indexes.py
+"""
+Declarative index registry for the candyman database.
+
+`INDEX_REGISTRY` is the single place indexes are declared; `ensure_indexes()`
+applies it on a background thread at lifespan startup. `query_shapes()` lists the
+hot queries issued by main.py, reconcile.py and shiprocket_webhook.py, built by the
+same query builders the endpoints call (in both STATS_ORDER_FLAGS modes);
+`check_query_plans()` runs each through explain() and reports any that fall back
+to a COLLSCAN or an in-memory SORT, or that win with another index than the
+shape's expected `index`. Run against a local mongod with:
+
+    MONGO_URI=mongodb://localhost:27017 python -m app.indexes
+"""
+import os
+import sys
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.database import Database
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    "user_details": [
+        # point lookups
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        IndexModel([("job_id", ASCENDING)], name="job_id"),
+        IndexModel([("email", ASCENDING)], name="email"),
+        IndexModel([("transaction_id", ASCENDING)], name="transaction_id"),
+        IndexModel([("reprint_order_id", ASCENDING)], name="reprint_order_id", sparse=True),
+        IndexModel([("sr_shipment_id", ASCENDING)], name="sr_shipment_id", sparse=True),
+        IndexModel([("awb_code", ASCENDING)], name="awb_code", sparse=True),
+        IndexModel([("current_status", ASCENDING)], name="current_status"),
+        # list endpoints (default sort created_at) and payment-date filters
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        IndexModel([("paid", ASCENDING), ("created_at", DESCENDING)], name="paid_created_at"),
+        IndexModel([("paid", ASCENDING), ("processed_at", DESCENDING)], name="paid_processed_at"),
+        # typed timestamps / calendar keys (app/order_timestamps.py)
+        # (sort field, _id) also serves keyset pagination (app/keyset.py), with and without paid
+        IndexModel([("created_at_dt", ASCENDING), ("_id", ASCENDING)], name="created_at_dt_id"),
+        IndexModel([("processed_at_dt", ASCENDING), ("_id", ASCENDING)], name="processed_at_dt_id"),
+        IndexModel([("paid", ASCENDING), ("created_at_dt", ASCENDING), ("_id", ASCENDING)],
+                   name="paid_created_at_dt_id"),
+        IndexModel([("paid", ASCENDING), ("processed_at_dt", ASCENDING), ("_id", ASCENDING)],
+                   name="paid_processed_at_dt_id"),
+        IndexModel([("ist_date", ASCENDING)], name="ist_date"),
+        # raw-timestamp branches of the derived-field sweep (order_timestamps._recent_filter)
+        IndexModel([("processed_at", ASCENDING)], name="processed_at"),
+        IndexModel([("current_timestamp_iso", ASCENDING)], name="current_timestamp_iso"),
+        # classification flags (app/order_flags.py): equality prefix, then the window
+        IndexModel(
+            [("paid", ASCENDING), ("is_real_order", ASCENDING), ("is_cancelled", ASCENDING),
+             ("is_excluded_code", ASCENDING), ("loc_norm", ASCENDING), ("processed_at_dt", ASCENDING)],
+            name="paid_order_flags_processed_at_dt",
+        ),
+        # SLA / KPI populations: no locale filter, so printer follows the flags instead
+        IndexModel(
+            [("paid", ASCENDING), ("is_real_order", ASCENDING), ("is_cancelled", ASCENDING),
+             ("printer", ASCENDING), ("processed_at_dt", ASCENDING)],
+            name="paid_printer_flags_processed_at_dt",
+        ),
+        # grid search (app/search.py)
+        IndexModel([("search_tokens", ASCENDING)], name="search_tokens"),
+        IndexModel([("iso_year", ASCENDING), ("iso_week", ASCENDING)], name="iso_year_week"),
+    ],
+    "shipping_details": [
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+        IndexModel([("awb_code", ASCENDING)], name="awb_code", sparse=True),
+    ],
+    # app/stats_rollup.py
+    "order_rollups_hourly": [
+        IndexModel(
+            [("hour", ASCENDING), ("locale", ASCENDING), ("LOC", ASCENDING),
+             ("discount_code", ASCENDING), ("book_id", ASCENDING)],
+            name="rollup_key",
+            unique=True,
+        ),
+        IndexModel([("hour", ASCENDING)], name="rollup_hour"),
+    ],
+}
+
+
+def ensure_indexes(db: Database, registry: Optional[Dict[str, List[IndexModel]]] = None) -> List[str]:
+    """Create every registered index (idempotent). Returns the names that failed."""
+    failed: List[str] = []
+    for coll_name, models in (registry or INDEX_REGISTRY).items():
+        coll = db[coll_name]
+        for model in models:
+            name = model.document.get("name")
+            try:
+                coll.create_indexes([model])
+            except OperationFailure as exc:
+                # typically an existing index with the same keys under another name/options
+                logger.warning("[INDEXES] %s.%s not created: %s", coll_name, name, exc)
+                failed.append(f"{coll_name}.{name}")
+    return failed
+
+
+def _sample_window() -> Tuple[datetime, datetime]:
+    end = datetime.now(timezone.utc)
+    return end - timedelta(days=7), end
+
+
+def _builder_shapes(main: Any, flags: bool) -> List[Dict[str, Any]]:
+    """
+    Stats filters exactly as main.py builds them, with STATS_ORDER_FLAGS forced to
+    `flags` and the derived fields taken as backfilled (the shapes the indexes serve).
+    """
+    from app import kpi_counters
+
+    start, end = _sample_window()
+    tag = " [flags]" if flags else ""
+    saved = (main.STATS_ORDER_FLAGS, kpi_counters.STATS_ORDER_FLAGS, main._derived_ready)
+    main.STATS_ORDER_FLAGS = kpi_counters.STATS_ORDER_FLAGS = flags
+    main._derived_ready = lambda: True
+    try:
+        loc_match = main._build_loc_match("IN")
+        shapes = [
+            {"name": f"order counts{tag}", "collection": "user_details",
+             "filter": main._fetch_counts_match(start, end, ["TEST", "COLLAB", "REJECTED"], loc_match)},
+            {"name": f"sla population{tag}", "collection": "user_details",
+             "filter": main._sla_base_query(start, end)},
+            {"name": f"status board window{tag}", "collection": "user_details",
+             "filter": main._status_board_query(start, end, loc_match), "index": "paid_processed_at_dt_id"},
+            {"name": f"kpi population{tag}", "collection": "user_details",
+             "filter": kpi_counters.kpi_population_query()},
+        ]
+        if flags:
+            expected = {
+                "order counts": "paid_order_flags_processed_at_dt",
+                "sla population": "paid_printer_flags_processed_at_dt",
+                "kpi population": "paid_printer_flags_processed_at_dt",
+            }
+            for shape in shapes:
+                shape.setdefault("index", expected.get(shape["name"][:-len(tag)]))
+        return shapes
+    finally:
+        main.STATS_ORDER_FLAGS, kpi_counters.STATS_ORDER_FLAGS, main._derived_ready = saved
+
+
+def query_shapes(main: Any = None) -> List[Dict[str, Any]]:
+    """
+    The hot queries. Point lookups are literal; everything with builder logic is
+    produced by the builder the endpoint calls (`main` is the imported main.py
+    module; its stats shapes are skipped when it is not given). `index` names the
+    index the plan must use where exactly one registry index fits the shape.
+    """
+    from app.keyset import keyset_filter, keyset_sort
+    from app.order_timestamps import TIMESTAMPS_LOOKBACK, _recent_filter
+    from app.search import ORDER_SEARCH_FIELDS, search_filter
+
+    start, end = _sample_window()
+    keyset_field, keyset_dir = keyset_sort("created_at", "desc")
+    keyset_after = keyset_filter(keyset_field, keyset_dir, end, ObjectId("0" * 24))
+    keyset_order = [(keyset_field, keyset_dir), ("_id", keyset_dir)]
+    shapes = [
+        {"name": "order by order_id", "collection": "user_details", "filter": {"order_id": "#1001"}, "index": "order_id"},
+        {"name": "order by job_id", "collection": "user_details", "filter": {"job_id": "00000000-0000-4000-8000-000000000000"},
+         "index": "job_id"},
+        {"name": "order by email", "collection": "user_details", "filter": {"email": "a@example.com"}, "index": "email"},
+        {"name": "order by transaction_id", "collection": "user_details", "filter": {"transaction_id": "pay_X"},
+         "index": "transaction_id"},
+        {"name": "order by reprint_order_id", "collection": "user_details", "filter": {"reprint_order_id": "#1001_RP1"},
+         "index": "reprint_order_id"},
+        {"name": "order by sr_shipment_id", "collection": "user_details", "filter": {"sr_shipment_id": 1}, "index": "sr_shipment_id"},
+        {"name": "order by awb_code", "collection": "user_details", "filter": {"awb_code": "AWB1"}, "index": "awb_code"},
+        {"name": "orders list default page", "collection": "user_details",
+         "filter": {"paid": True}, "sort": [("created_at", DESCENDING)], "index": "paid_created_at"},
+        {"name": "jobs list default page", "collection": "user_details",
+         "filter": {}, "sort": [("created_at", DESCENDING)], "index": "created_at"},
+        {"name": "orders list keyset page", "collection": "user_details",
+         "filter": {"$and": [{"paid": True}, keyset_after]}, "sort": keyset_order},
+        {"name": "jobs list keyset page", "collection": "user_details",
+         "filter": keyset_after, "sort": keyset_order},
+        {"name": "grid search tokens", "collection": "user_details",
+         "filter": {"paid": True, "$and": [search_filter("prak sh", ORDER_SEARCH_FIELDS)]}},
+        {"name": "grid search order id", "collection": "user_details",
+         "filter": search_filter("#1001", ORDER_SEARCH_FIELDS)},
+        {"name": "derived-field sweep", "collection": "user_details",
+         "filter": _recent_filter(end - TIMESTAMPS_LOOKBACK)},
+        {"name": "shipment orders by payment date", "collection": "user_details",
+         "filter": {"paid": True, "processed_at": {"$gte": start, "$lte": end}}},
+        {"name": "shipment orders by status", "collection": "user_details",
+         "filter": {"paid": True, "current_status": "DELIVERED"}},
+        {"name": "weekly sla iso week", "collection": "user_details",
+         "filter": {"iso_year": 2025, "iso_week": 40}, "index": "iso_year_week"},
+        {"name": "shipping by order_id", "collection": "shipping_details", "filter": {"order_id": "#1001"},
+         "index": "order_id"},
+        {"name": "shipping by awb_code", "collection": "shipping_details", "filter": {"awb_code": "AWB1"},
+         "index": "awb_code"},
+        {"name": "rollup window", "collection": "order_rollups_hourly",
+         "filter": {"hour": {"$gte": start, "$lt": end}}},
+    ]
+    if main is not None:
+        for flags in (False, True):
+            shapes.extend(_builder_shapes(main, flags))
+    return shapes
+
+
+def _plan_nodes(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    nodes: List[Dict[str, Any]] = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            nodes.append(node)
+        for key in ("inputStage", "queryPlan"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages") or [])
+    return nodes
+
+
+def _winning_plan(db: Database, shape: Dict[str, Any]) -> Dict[str, Any]:
+    cmd: Dict[str, Any] = {"find": shape["collection"], "filter": shape["filter"]}
+    if shape.get("sort"):
+        cmd["sort"] = dict(shape["sort"])
+    out = db.command("explain", cmd, verbosity="queryPlanner")
+    return out.get("queryPlanner", {}).get("winningPlan", {})
+
+
+def explain_stages(db: Database, shape: Dict[str, Any]) -> List[str]:
+    return [n["stage"] for n in _plan_nodes(_winning_plan(db, shape))]
+
+
+def check_query_plans(db: Database, main: Any = None) -> List[str]:
+    """
+    Describe every hot query whose winning plan has COLLSCAN or SORT, or does
+    not scan the shape's expected `index`.
+    """
+    problems: List[str] = []
+    for shape in query_shapes(main):
+        nodes = _plan_nodes(_winning_plan(db, shape))
+        stages = [n["stage"] for n in nodes]
+        used = sorted({n["indexName"] for n in nodes if n.get("indexName")})
+        where = f"{shape['name']} ({shape['collection']})"
+        if any(s in ("COLLSCAN", "SORT") for s in stages):
+            problems.append(f"{where}: {' <- '.join(stages)}")
+        elif shape.get("index") and used != [shape["index"]]:
+            problems.append(f"{where}: uses {', '.join(used) or 'no index'}, expected {shape['index']}")
+        else:
+            logger.info("[INDEXES] %s: %s", where, ", ".join(used) or "-")
+    return problems
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    _db = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"), tz_aware=True)[
+        os.getenv("INDEX_CHECK_DB", "candyman")]
+    ensure_indexes(_db)
+    import main as _main  # the stats shapes come from its query builders
+    _problems = check_query_plans(_db, _main)
+    for p in _problems:
+        logger.error("[INDEXES] plan regression: %s", p)
+    sys.exit(1 if _problems else 0)
@@ -0,0 +1,96 @@
+# app/keyset.py
+"""
+Keyset (cursor) pagination for the user_details list endpoints.
+
+`skip((page-1)*limit)` makes MongoDB walk and discard every earlier row, so deep
+pages get linearly slower. In cursor mode a page is instead "the next `limit`
+rows after (sort value, _id) of the last row served", answered by a range scan
+on a (sort field, _id) index – page N costs the same as page 1.
+
+Only sort columns listed in KEYSET_SORTS are allowed. Raw `created_at` /
+`processed_at` are stored as a mix of strings and datetimes, and range
+predicates in MongoDB only match within one BSON type, so the keyset runs on
+the typed copies kept by app/order_timestamps.py. Docs without a timestamp
+(null) sort first ascending / last descending, as they do in a plain sort.
+
+Cursors are opaque base64url strings bound to the sort they were issued for.
+"""
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo.collection import Collection
+
+# public sort_by -> indexed field the keyset runs on
+KEYSET_SORTS: Dict[str, str] = {
+    "created_at": "created_at_dt",
+    "processed_at": "processed_at_dt",
+}
+
+
+def keyset_sort(sort_by: Optional[str], sort_dir: Optional[str]) -> Tuple[str, int]:
+    """(indexed field, direction) for a list request; ValueError for a non-whitelisted column."""
+    key = sort_by or "created_at"
+    if key not in KEYSET_SORTS:
+        raise ValueError(
+            f"cursor pagination supports sort_by in {sorted(KEYSET_SORTS)}, not {key!r}")
+    return KEYSET_SORTS[key], 1 if sort_dir == "asc" else -1
+
+
+def encode_cursor(field: str, direction: int, doc: Dict[str, Any]) -> str:
+    raw = json_util.dumps({"f": field, "d": direction, "v": doc.get(field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, field: str, direction: int) -> Tuple[Any, ObjectId]:
+    """(sort value, _id) of the last row served; ValueError if malformed or issued for another sort."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        state = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, oid = state["v"], state["id"]
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if state.get("f") != field or state.get("d") != direction:
+        raise ValueError("cursor was issued for a different sort; restart without it")
+    return value, oid
+
+
+def keyset_filter(field: str, direction: int, value: Any, oid: ObjectId) -> Dict[str, Any]:
+    """Rows strictly after (value, oid) in (field, _id) order."""
+    past = "$gt" if direction == 1 else "$lt"
+    same_value_after = {field: value, "_id": {past: oid}}
+    if value is None:
+        # nulls come first ascending (then every non-null), last descending
+        if direction == 1:
+            return {"$or": [same_value_after, {field: {"$ne": None}}]}
+        return same_value_after
+    branches: List[Dict[str, Any]] = [{field: {past: value}}, same_value_after]
+    if direction == -1:
+        branches.append({field: None})
+    return {"$or": branches}
+
+
+def keyset_page(
+    col: Collection,
+    query: Dict[str, Any],
+    projection: Dict[str, Any],
+    sort_by: Optional[str],
+    sort_dir: Optional[str],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of `query` plus the cursor for the next page (None on the last page)."""
+    field, direction = keyset_sort(sort_by, sort_dir)
+    if cursor:
+        value, oid = decode_cursor(cursor, field, direction)
+        query = {"$and": [query, keyset_filter(field, direction, value, oid)]}
+
+    projection = {**projection, "_id": 1, field: 1}
+    docs = list(
+        col.find(query, projection)
+        .sort([(field, direction), ("_id", direction)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(field, direction, docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
@@ -0,0 +1,196 @@
+# app/kpi_counters.py
+"""
+Production KPI tiles (/api/stats/production-kpis).
+
+The KPI population is every paid Genesis/Yara order (`#1234` / `#1234_1`) that
+isn't cancelled and doesn't carry an excluded discount code. Counts are served
+either by a `$group` over user_details or, with STATS_KPI_COUNTERS=1, from one
+counter document per (printer, normalized current_status) in
+`production_kpi_counters`:
+
+  - kpi_transition()        write-path hook; `$inc`s the old/new key when an
+                            update moves an order between counters
+  - rebuild_kpi_counters()  seeds the counters from the `$group` (startup and
+                            nightly, which also corrects drift from writes made
+                            outside this backend)
+"""
+import os
+import re
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from app.order_flags import EXCLUDE_CODES, STATS_ORDER_FLAGS, flag_population_match
+
+logger = logging.getLogger(__name__)
+
+SHIPPED_STATUSES = {
+    "PICKED UP",
+    "IN TRANSIT",
+    "OUT FOR DELIVERY",
+    "DELIVERED",
+    "REACHED AT DESTINATION HUB",
+}
+KPI_PRINTERS = ("Genesis", "Yara")
+
+STATS_KPI_COUNTERS = os.getenv("STATS_KPI_COUNTERS", "0") == "1"
+
+# fields that decide whether / where an order is counted
+KPI_FIELDS = ("paid", "printer", "order_id", "discount_code", "current_status", "order_status")
+KPI_PROJECTION = {"_id": 0, **{f: 1 for f in KPI_FIELDS}}
+
+_REAL_ORDER_ID = re.compile(r"^#\d+(_\d+)?$")
+_CANCELLED = re.compile("cancelled", re.IGNORECASE)
+
+
+def kpi_population_query() -> Dict[str, Any]:
+    if STATS_ORDER_FLAGS:
+        return {
+            "paid": True,
+            "printer": {"$in": list(KPI_PRINTERS)},
+            **flag_population_match(exclude_codes=True),
+        }
+    return {
+        "$and": [
+            {"paid": True},
+            {"printer": {"$in": list(KPI_PRINTERS)}},
+            {"order_id": {"$regex": r"^#\d+(_\d+)?$"}},
+            {
+                "$or": [
+                    {"discount_code": {"$exists": False}},
+                    {"discount_code": None},
+                    {"$expr": {"$not": {"$in": [{"$toUpper": "$discount_code"}, EXCLUDE_CODES]}}},
+                ]
+            },
+            {
+                "$or": [
+                    {"current_status": {"$exists": False}},
+                    {"current_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
+                ]
+            },
+            {
+                "$or": [
+                    {"order_status": {"$exists": False}},
+                    {"order_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
+                ]
+            },
+        ]
+    }
+
+
+def _norm_status(value: Any) -> str:
+    return (value or "").strip().upper() if isinstance(value, str) else ""
+
+
+def kpi_key(doc: Optional[Dict[str, Any]]) -> Optional[Tuple[str, str]]:
+    """(printer, normalized status) the doc is counted under, or None when outside the population."""
+    if not doc or doc.get("paid") is not True or doc.get("printer") not in KPI_PRINTERS:
+        return None
+    order_id = doc.get("order_id")
+    if not isinstance(order_id, str) or not _REAL_ORDER_ID.match(order_id):
+        return None
+    code = doc.get("discount_code")
+    if code is not None and str(code).upper() in EXCLUDE_CODES:
+        return None
+    for field in ("current_status", "order_status"):
+        value = doc.get(field)
+        if isinstance(value, str) and _CANCELLED.search(value):
+            return None
+    return doc["printer"], _norm_status(doc.get("current_status"))
+
+
+def _counter_id(key: Tuple[str, str]) -> str:
+    return f"{key[0]}|{key[1]}"
+
+
+def kpi_transition(counters_col: Collection, before: Optional[Dict[str, Any]], set_ops: Dict[str, Any]) -> None:
+    """
+    Move an order between counters after `{"$set": set_ops}` was applied to the
+    doc whose pre-image is `before`. No-op unless STATS_KPI_COUNTERS is on.
+    """
+    if not STATS_KPI_COUNTERS or not before:
+        return
+    if not any(f in set_ops for f in KPI_FIELDS):
+        return
+    old_key = kpi_key(before)
+    new_key = kpi_key({**before, **{f: set_ops[f] for f in KPI_FIELDS if f in set_ops}})
+    if old_key == new_key:
+        return
+    try:
+        if old_key:
+            counters_col.update_one({"_id": _counter_id(old_key)}, {"$inc": {"count": -1}})
+        if new_key:
+            counters_col.update_one(
+                {"_id": _counter_id(new_key)},
+                {"$inc": {"count": 1}, "$setOnInsert": {"printer": new_key[0], "status": new_key[1]}},
+                upsert=True,
+            )
+    except Exception:
+        logger.exception("[KPI] counter transition failed for %s -> %s", old_key, new_key)
+
+
+def group_kpi_counts(orders_col: Collection) -> List[Dict[str, Any]]:
+    """[{printer, status, count}] for the KPI population, computed server-side."""
+    pipeline = [
+        {"$match": kpi_population_query()},
+        {"$group": {
+            "_id": {
+                "printer": "$printer",
+                "status": {"$toUpper": {"$trim": {"input": {"$ifNull": ["$current_status", ""]}}}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ]
+    return [
+        {"printer": r["_id"]["printer"], "status": r["_id"]["status"], "count": r["count"]}
+        for r in orders_col.aggregate(pipeline)
+    ]
+
+
+def counter_kpi_counts(counters_col: Collection) -> List[Dict[str, Any]]:
+    return list(counters_col.find({"printer": {"$exists": True}}, {"_id": 0, "printer": 1, "status": 1, "count": 1}))
+
+
+def rebuild_kpi_counters(orders_col: Collection, counters_col: Collection) -> Dict[str, int]:
+    run_id = uuid.uuid4().hex
+    rows = group_kpi_counts(orders_col)
+    ops = [
+        UpdateOne(
+            {"_id": _counter_id((r["printer"], r["status"]))},
+            {"$set": {**r, "run_id": run_id}},
+            upsert=True,
+        )
+        for r in rows
+    ]
+    if ops:
+        counters_col.bulk_write(ops, ordered=False)
+    removed = counters_col.delete_many({"printer": {"$exists": True}, "run_id": {"$ne": run_id}}).deleted_count
+    counters_col.update_one(
+        {"_id": "_state"}, {"$set": {"rebuilt_at": datetime.now(timezone.utc)}}, upsert=True)
+    return {"counters": len(ops), "removed": removed}
+
+
+def counters_ready(counters_col: Collection) -> bool:
+    return counters_col.find_one({"_id": "_state"}, {"_id": 1}) is not None
+
+
+def kpi_tiles(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """Fold {printer, status, count} rows into the production-kpis response."""
+    out = {
+        "in_production": {"genesis": 0, "yara": 0},
+        "shipped": {"genesis": 0, "yara": 0},
+        "total_sent": {"genesis": 0, "yara": 0},
+    }
+    for r in rows:
+        printer = (r.get("printer") or "").strip().lower()
+        if printer not in out["total_sent"]:
+            continue
+        count = int(r.get("count") or 0)
+        out["total_sent"][printer] += count
+        tile = "shipped" if r.get("status") in SHIPPED_STATUSES else "in_production"
+        out[tile][printer] += count
+    return out
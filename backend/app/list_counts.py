@@ -0,0 +1,86 @@
+# app/list_counts.py
+"""
+Total counts for the paginated order / job grids.
+
+`count_documents(query)` repeats the page filter – with a `q` regex search that
+is a second full scan on every click. Counts are cached in `list_count_cache`
+(app/stats_cache.py) per normalized filter for LIST_COUNT_TTL_SECONDS and
+dropped by `invalidate_stats_cache()` on writes.
+
+With `approx=True` a cache miss never blocks on a full count:
+
+  - an empty filter uses the collection's metadata count
+    (and warms the exact count in the background)
+  - otherwise the count stops at LIST_COUNT_APPROX_CAP; below the cap that is
+    the exact answer, at the cap the cap is returned and the exact count is
+    computed on a background thread for the next request
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, Set, Tuple
+
+from bson import json_util
+from pymongo.collection import Collection
+
+from app.stats_cache import list_count_cache
+
+logger = logging.getLogger(__name__)
+
+LIST_COUNT_APPROX_CAP = int(os.getenv("LIST_COUNT_APPROX_CAP", "10000"))
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="list-count")
+_pending: Set[Hashable] = set()
+_pending_lock = threading.Lock()
+
+
+def count_key(col: Collection, query: Dict[str, Any]) -> Hashable:
+    """Cache key for a filter: key order and compiled regexes normalized via extended JSON."""
+    return ("list_count", col.full_name, json_util.dumps(query, sort_keys=True))
+
+
+def _exact_count(col: Collection, query: Dict[str, Any], key: Hashable, generation: int) -> int:
+    total = col.count_documents(query)
+    list_count_cache.set(key, total, generation=generation)
+    return total
+
+
+def _count_in_background(col: Collection, query: Dict[str, Any], key: Hashable) -> None:
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    generation = list_count_cache.generation
+
+    def run() -> None:
+        try:
+            _exact_count(col, query, key, generation)
+        except Exception:
+            logger.exception("[LIST COUNT] background count failed")
+        finally:
+            with _pending_lock:
+                _pending.discard(key)
+
+    _executor.submit(run)
+
+
+def list_total(col: Collection, query: Dict[str, Any], approx: bool = False) -> Tuple[int, bool]:
+    """(total, exact) for `query`; `exact` is False only for an approximate answer."""
+    key = count_key(col, query)
+    hit, total = list_count_cache.get(key)
+    if hit:
+        return total, True
+    generation = list_count_cache.generation
+    if not approx:
+        return _exact_count(col, query, key, generation), True
+
+    if not query:
+        _count_in_background(col, query, key)
+        return col.estimated_document_count(), False
+    capped = col.count_documents(query, limit=LIST_COUNT_APPROX_CAP)
+    if capped < LIST_COUNT_APPROX_CAP:
+        list_count_cache.set(key, capped, generation=generation)
+        return capped, True
+    _count_in_background(col, query, key)
+    return capped, False
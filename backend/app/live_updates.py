@@ -0,0 +1,229 @@
+# app/live_updates.py
+"""
+Live dashboard deltas over Server-Sent Events.
+
+One change-stream consumer per process watches user_details (needs a replica
+set) and fans each relevant change out to every connected SSE client:
+
+  order_paid        insert of a paid doc, or `paid` flipped to true
+  status_changed    `current_status` written
+  print_dispatched  `printer` / `print_status` written
+
+The consumer is started from the app lifespan and runs whether or not anyone
+is subscribed: it resumes from its last token after errors and invalidates the
+stats caches (and bumps the watermark) so polled endpoints pick up writes made
+outside this backend. Subscribers only decide where deltas are fanned out to. Invalidation is
+coalesced: a burst of changes causes at most one `invalidate_stats_cache()`
+per LIVE_INVALIDATE_INTERVAL_SECONDS, flushed from the consumer loop. A client that falls more
+than LIVE_QUEUE_SIZE events behind gets a single `resync` event instead.
+
+Watch the feed against a local replica-set mongod:
+
+    MONGO_URI="mongodb://localhost:27017/?replicaSet=rs0" python -m app.live_updates
+"""
+import os
+import json
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from pymongo.collection import Collection
+from pymongo.errors import PyMongoError
+
+from app.stats_cache import invalidate_stats_cache
+
+logger = logging.getLogger(__name__)
+
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "200"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_INVALIDATE_INTERVAL_SECONDS = float(os.getenv("LIVE_INVALIDATE_INTERVAL_SECONDS", "2"))
+
+_DELTA_FIELDS = ("order_id", "job_id", "paid", "printer", "print_status", "current_status", "locale", "LOC")
+
+_PIPELINE = [
+    {"$match": {"$or": [
+        {"operationType": {"$in": ["insert", "replace"]}, "fullDocument.paid": True},
+        {"operationType": "update", "$or": [
+            {"updateDescription.updatedFields.paid": True},
+            {"updateDescription.updatedFields.current_status": {"$exists": True}},
+            {"updateDescription.updatedFields.printer": {"$exists": True}},
+            {"updateDescription.updatedFields.print_status": {"$exists": True}},
+        ]},
+    ]}},
+    {"$project": {
+        "operationType": 1,
+        "clusterTime": 1,
+        **{f"updateDescription.updatedFields.{f}": 1 for f in ("paid", "current_status", "printer", "print_status")},
+        **{f"fullDocument.{f}": 1 for f in _DELTA_FIELDS},
+    }},
+]
+
+
+def change_to_deltas(change: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Map one change-stream event to the dashboard deltas it implies."""
+    doc = change.get("fullDocument") or {}
+    base = {"order_id": doc.get("order_id"), "job_id": doc.get("job_id")}
+    op = change.get("operationType")
+    if op in ("insert", "replace"):
+        return [{"type": "order_paid", **base, "locale": doc.get("locale"), "LOC": doc.get("LOC")}]
+
+    updated = (change.get("updateDescription") or {}).get("updatedFields") or {}
+    deltas = []
+    if updated.get("paid") is True:
+        deltas.append({"type": "order_paid", **base, "locale": doc.get("locale"), "LOC": doc.get("LOC")})
+    if "current_status" in updated:
+        deltas.append({"type": "status_changed", **base, "current_status": updated["current_status"]})
+    if "printer" in updated or "print_status" in updated:
+        deltas.append({
+            "type": "print_dispatched", **base,
+            "printer": updated.get("printer", doc.get("printer")),
+            "print_status": updated.get("print_status", doc.get("print_status")),
+        })
+    return deltas
+
+
+class ChangeFeed:
+    """Single change-stream watcher fanned out to per-client asyncio queues."""
+
+    def __init__(self, col: Collection, queue_size: int = LIVE_QUEUE_SIZE):
+        self.col = col
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._resume_token = None
+        self._dirty = False
+        self._invalidated_at = 0.0
+        self.connected = False
+
+    # -- consumer thread -------------------------------------------------
+
+    def start(self) -> None:
+        """Start the consumer thread (idempotent); call from the event loop, i.e. the lifespan."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="live-change-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _maybe_invalidate(self, force: bool = False) -> None:
+        """Run one coalesced cache invalidation if changes arrived since the last one."""
+        if not self._dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self._invalidated_at < LIVE_INVALIDATE_INTERVAL_SECONDS:
+            return
+        self._dirty = False
+        self._invalidated_at = now
+        try:
+            invalidate_stats_cache()
+        except Exception:
+            logger.exception("[LIVE] cache invalidation failed")
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                with self.col.watch(
+                    _PIPELINE,
+                    full_document="updateLookup",
+                    resume_after=self._resume_token,
+                    max_await_time_ms=1000,
+                ) as stream:
+                    self.connected = True
+                    backoff = 1.0
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            self._maybe_invalidate()  # trailing flush of a burst
+                            continue
+                        self._resume_token = stream.resume_token
+                        deltas = change_to_deltas(change)
+                        if deltas:
+                            self._dirty = True
+                            self._maybe_invalidate()
+                            for delta in deltas:
+                                self._publish(delta)
+            except PyMongoError as exc:
+                self.connected = False
+                self._maybe_invalidate(force=True)
+                logger.warning("[LIVE] change stream error (%s); retrying in %.0fs", exc, backoff)
+                if getattr(exc, "code", None) == 286:  # ChangeStreamHistoryLost
+                    self._resume_token = None
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+        self._maybe_invalidate(force=True)
+        self.connected = False
+
+    def _publish(self, delta: Dict[str, Any]) -> None:
+        if not self._subscribers:
+            return
+        delta["at"] = datetime.now(timezone.utc).isoformat()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._fanout, delta)
+
+    # -- event loop side -------------------------------------------------
+
+    def _fanout(self, delta: Dict[str, Any]) -> None:
+        for q in list(self._subscribers):
+            try:
+                q.put_nowait(delta)
+            except asyncio.QueueFull:
+                # slow client: drop its backlog and tell it to re-query
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait({"type": "resync"})
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        self._subscribers.discard(q)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._subscribers), "connected": self.connected}
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_stream(feed: ChangeFeed, is_disconnected) -> AsyncIterator[str]:
+    """SSE body for one client; `is_disconnected` is the request's coroutine of the same name."""
+    q = feed.subscribe()
+    try:
+        yield _sse("hello", feed.stats())
+        while True:
+            try:
+                delta = await asyncio.wait_for(q.get(), timeout=LIVE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+                continue
+            yield _sse(delta["type"], delta)
+    finally:
+        feed.unsubscribe(q)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    _col = MongoClient(os.getenv("MONGO_URI"), tz_aware=True)["candyman"]["user_details"]
+    with _col.watch(_PIPELINE, full_document="updateLookup") as _stream:
+        for _change in _stream:
+            for _delta in change_to_deltas(_change):
+                print(time.strftime("%H:%M:%S"), json.dumps(_delta, default=str))
@@ -0,0 +1,98 @@
+# app/order_flags.py
+"""
+Precomputed classification flags on user_details.
+
+The stats / SLA / KPI queries used to repeat per-document predicates no index
+can serve: an `order_id` regex, `$toUpper(discount_code)` inside `$expr`,
+"cancelled" regexes on two status fields and the nested locale `$or` of
+`_build_loc_match()`. These are computed once per write instead:
+
+  is_real_order       order_id is `#1234` / `#1234_1`
+  discount_code_norm  trimmed, upper-cased discount_code ("" when missing)
+  is_excluded_code    discount_code_norm in EXCLUDE_CODES
+  is_cancelled        current_status or order_status mentions "cancelled"
+  loc_norm            normalized values of `locale` and `LOC` ("" = missing/empty),
+                      an array so the legacy either-field semantics stay exact
+
+They are maintained with the other derived fields by app/order_timestamps.py
+and indexed together (app/indexes.py). Queries switch to them with
+STATS_ORDER_FLAGS=1 once `python -m app.order_timestamps` has backfilled them
+and the rollups have been rebuilt (rollup rows carry `loc_norm` too).
+"""
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+STATS_ORDER_FLAGS = os.getenv("STATS_ORDER_FLAGS", "0") == "1"
+
+EXCLUDE_CODES = ["TEST", "REJECTED", "TINA"]
+
+FLAG_SOURCE_FIELDS = ("order_id", "discount_code", "current_status", "order_status", "locale", "LOC")
+FLAG_FIELDS = ("is_real_order", "discount_code_norm", "is_excluded_code", "is_cancelled", "loc_norm")
+
+_REAL_ORDER_ID = re.compile(r"^#\d+(_\d+)?$")
+
+
+def _norm(value: Any) -> str:
+    if value is None:
+        return ""
+    return str(value).strip().upper()
+
+
+def loc_norm(locale: Any, loc: Any) -> List[str]:
+    return sorted({_norm(locale), _norm(loc)})
+
+
+def _mentions_cancelled(value: Any) -> bool:
+    return isinstance(value, str) and "cancelled" in value.lower()
+
+
+def order_flag_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The $set payload keeping the flag fields in line with the doc."""
+    order_id = doc.get("order_id")
+    code = _norm(doc.get("discount_code"))
+    return {
+        "is_real_order": isinstance(order_id, str) and bool(_REAL_ORDER_ID.match(order_id)),
+        "discount_code_norm": code,
+        "is_excluded_code": code in EXCLUDE_CODES,
+        "is_cancelled": _mentions_cancelled(doc.get("current_status")) or _mentions_cancelled(doc.get("order_status")),
+        "loc_norm": loc_norm(doc.get("locale"), doc.get("LOC")),
+    }
+
+
+def flag_loc_match(loc: Optional[str]) -> Dict[str, Any]:
+    """`_build_loc_match()` on `loc_norm`: ALL / IN keep "IN or unknown", IN_ONLY / INDIA strict."""
+    loc = (loc or "IN").upper()
+    if loc in ("ALL", "IN"):
+        return {"loc_norm": {"$in": ["IN", ""]}}
+    if loc in ("IN_ONLY", "INDIA"):
+        return {"loc_norm": "IN"}
+    return {"loc_norm": loc}
+
+
+def flag_population_match(exclude_codes: bool = False) -> Dict[str, Any]:
+    """Real, non-cancelled orders (optionally without EXCLUDE_CODES) as equality matches."""
+    match: Dict[str, Any] = {"is_real_order": True, "is_cancelled": False}
+    if exclude_codes:
+        match["is_excluded_code"] = False
+    return match
+
+
+def discount_nin(codes: Iterable[str]) -> Dict[str, Any]:
+    return {"discount_code_norm": {"$nin": sorted({_norm(c) for c in codes})}}
+
+
+def discount_exclusion(codes: Iterable[str], normalized: bool) -> Optional[Dict[str, Any]]:
+    """
+    The one discount-code exclusion rule (trimmed, case-insensitive, missing
+    code kept), on `discount_code_norm` when the documents carry it (flag mode,
+    rollup rows) and computed from the raw `discount_code` otherwise.
+    """
+    codes = sorted({_norm(c) for c in codes})
+    if not codes:
+        return None
+    if normalized:
+        return discount_nin(codes)
+    code = {"$toUpper": {"$trim": {"input": {"$convert": {
+        "input": "$discount_code", "to": "string", "onError": "", "onNull": ""}}}}}
+    return {"$expr": {"$not": {"$in": [code, codes]}}}
@@ -0,0 +1,280 @@
+# app/order_timestamps.py
+"""
+Typed timestamp + IST calendar keys on user_details.
+
+The storefront writes `processed_at`, `created_at` and `current_timestamp_iso`
+as a mix of ISO strings and datetimes. We leave those as written and keep
+canonical BSON datetimes next to them, plus precomputed IST calendar keys:
+
+  processed_at_dt, created_at_dt, current_timestamp_dt   (UTC datetimes)
+  ist_date   "YYYY-MM-DD"        of processed_at (fallback created_at), IST
+  ist_hour   "YYYY-MM-DD HH:00"  same instant, IST
+  iso_year, iso_week             ISO calendar week of the same IST date
+
+Stats queries filter/group on these indexed fields instead of $toDate/isoparse.
+The same machinery maintains `search_tokens` (app/search.py) and the
+classification flags (app/order_flags.py). All derived fields are kept in
+sync by:
+  - sync_order_timestamps()     write-path hook for writes made by this backend
+  - ensure_timestamps_fresh()   incremental sweep of docs with a raw timestamp since
+                                the previous sweep (persisted, minus a small skew),
+                                run every minute by the scheduler (never on a request);
+                                its $or is served by the raw-field indexes
+  - backfill_order_timestamps() full migration: at startup until it has completed
+                                once (`backfill_complete()`), then nightly
+
+Until the first full backfill has completed, stats queries check
+`derived_fields_ready()` and filter on the raw fields instead (`raw_date()`,
+`raw_window_match()`).
+"""
+import os
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from dateutil import parser as date_parser
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from app.order_flags import FLAG_FIELDS, FLAG_SOURCE_FIELDS, order_flag_fields
+from app.search import SEARCH_SOURCE_FIELDS, search_token_fields
+
+logger = logging.getLogger(__name__)
+
+UTC = timezone.utc
+IST_OFFSET = timedelta(hours=5, minutes=30)
+
+TYPED_FIELDS = {
+    "processed_at": "processed_at_dt",
+    "created_at": "created_at_dt",
+    "current_timestamp_iso": "current_timestamp_dt",
+}
+
+TIMESTAMPS_LOOKBACK = timedelta(hours=int(os.getenv("ORDER_TS_LOOKBACK_HOURS", "48")))
+TIMESTAMPS_MAX_LAG_SECONDS = int(os.getenv("ORDER_TS_MAX_LAG_SECONDS", "60"))
+# overlap of consecutive sweeps (clock skew between app hosts and mongod, slow writers)
+TIMESTAMPS_SWEEP_SKEW = timedelta(seconds=int(os.getenv("ORDER_TS_SWEEP_SKEW_SECONDS", "300")))
+# extra widening of the string branches; "+05:30" / "Z" strings already sort at or
+# after their UTC instant, only negative offsets need it
+TIMESTAMPS_STRING_SKEW = timedelta(hours=int(os.getenv("ORDER_TS_STRING_SKEW_HOURS", "0")))
+TIMESTAMPS_STATE_COLLECTION = "order_timestamps_state"
+
+_ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+_sweep_lock = threading.Lock()
+_last_sweep: Optional[datetime] = None
+_derived_ready = False
+_derived_checked_at: Optional[datetime] = None
+
+
+def parse_ts(value: Any) -> Optional[datetime]:
+    """Parse a stored timestamp (datetime / ISO string) into an aware UTC datetime."""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return _to_utc_ms(value)
+    if isinstance(value, str):
+        try:
+            dt = date_parser.isoparse(value.strip())
+        except (ValueError, OverflowError):
+            try:
+                dt = datetime.strptime(value.strip(), "%d %m %Y %H:%M:%S")
+            except ValueError:
+                return None
+        return _to_utc_ms(dt)
+    return None
+
+
+def _to_utc_ms(dt: datetime) -> datetime:
+    # BSON dates hold milliseconds; truncate so re-syncs compare equal
+    dt = dt.astimezone(UTC) if dt.tzinfo else dt.replace(tzinfo=UTC)
+    return dt.replace(microsecond=dt.microsecond // 1000 * 1000)
+
+
+def calendar_keys(dt: Optional[datetime]) -> Dict[str, Any]:
+    if dt is None:
+        return {"ist_date": None, "ist_hour": None, "iso_year": None, "iso_week": None}
+    ist = dt.astimezone(UTC) + IST_OFFSET
+    iso_year, iso_week, _ = ist.date().isocalendar()
+    return {
+        "ist_date": ist.strftime("%Y-%m-%d"),
+        "ist_hour": ist.strftime("%Y-%m-%d %H:00"),
+        "iso_year": iso_year,
+        "iso_week": iso_week,
+    }
+
+
+def typed_timestamp_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The $set payload that brings `doc`'s typed/calendar fields in line with its raw timestamps."""
+    out: Dict[str, Any] = {
+        typed: parse_ts(doc.get(raw)) for raw, typed in TYPED_FIELDS.items()
+    }
+    out.update(calendar_keys(out["processed_at_dt"] or out["created_at_dt"]))
+    return out
+
+
+def derived_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Every derived field of `doc`: typed timestamps, calendar keys, search tokens, flags."""
+    return {**typed_timestamp_fields(doc), **search_token_fields(doc), **order_flag_fields(doc)}
+
+
+# top-level fields whose writes must be followed by sync_order_timestamps()
+DERIVED_SOURCE_FIELDS = tuple(dict.fromkeys(tuple(TYPED_FIELDS) + SEARCH_SOURCE_FIELDS + FLAG_SOURCE_FIELDS))
+
+
+def _needs_sync(doc: Dict[str, Any], fields: Dict[str, Any]) -> bool:
+    return any(doc.get(k) != v for k, v in fields.items())
+
+
+_PROJECTION = {
+    "_id": 1,
+    **{src: 1 for src in DERIVED_SOURCE_FIELDS},
+    **{typed: 1 for typed in TYPED_FIELDS.values()},
+    "ist_date": 1, "ist_hour": 1, "iso_year": 1, "iso_week": 1,
+    "search_tokens": 1,
+    **{flag: 1 for flag in FLAG_FIELDS},
+}
+
+
+def sync_order_timestamps(col: Collection, query: Dict[str, Any]) -> int:
+    """Write-path hook: recompute derived fields for the docs matching `query`."""
+    ops = []
+    for doc in col.find(query, _PROJECTION):
+        fields = derived_fields(doc)
+        if _needs_sync(doc, fields):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+    if ops:
+        col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def _recent_filter(since: datetime) -> Dict[str, Any]:
+    # every branch is served by a single-field index on its raw field (app/indexes.py)
+    since_iso = (since - TIMESTAMPS_STRING_SKEW).strftime(_ISO_FORMAT)
+    branches = []
+    for raw in TYPED_FIELDS:
+        branches.append({raw: {"$gte": since}})
+        branches.append({raw: {"$gte": since_iso}})
+    return {"$or": branches}
+
+
+def backfill_order_timestamps(
+    col: Collection,
+    since: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> Dict[str, int]:
+    """
+    Recompute derived fields for every doc (or only docs with a raw timestamp at/after
+    `since`) and write the ones that changed. Safe to re-run.
+    """
+    query: Dict[str, Any] = _recent_filter(since) if since is not None else {}
+    scanned = updated = 0
+    ops = []
+    for doc in col.find(query, _PROJECTION, batch_size=batch_size):
+        scanned += 1
+        fields = derived_fields(doc)
+        if not _needs_sync(doc, fields):
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if len(ops) >= batch_size:
+            updated += col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += col.bulk_write(ops, ordered=False).modified_count
+    if since is None:
+        col.database[TIMESTAMPS_STATE_COLLECTION].update_one(
+            {"_id": "backfill"},
+            {"$set": {"completed_at": datetime.now(UTC), "scanned": scanned, "updated": updated}},
+            upsert=True,
+        )
+    return {"scanned": scanned, "updated": updated}
+
+
+def backfill_complete(col: Collection) -> bool:
+    """True once a full backfill has finished, i.e. every doc carries its derived fields."""
+    return col.database[TIMESTAMPS_STATE_COLLECTION].find_one({"_id": "backfill"}, {"_id": 1}) is not None
+
+
+def derived_fields_ready(col: Collection) -> bool:
+    """
+    `backfill_complete()` for the request path: True is final, False is re-read
+    at most every TIMESTAMPS_MAX_LAG_SECONDS.
+    """
+    global _derived_ready, _derived_checked_at
+    if _derived_ready:
+        return True
+    now = datetime.now(UTC)
+    if _derived_checked_at and (now - _derived_checked_at).total_seconds() < TIMESTAMPS_MAX_LAG_SECONDS:
+        return False
+    _derived_ready = backfill_complete(col)
+    _derived_checked_at = now
+    return _derived_ready
+
+
+def raw_date(field: str) -> Dict[str, Any]:
+    """Aggregation expression: the raw mixed date/ISO-string `field` as a date (null if unparseable)."""
+    return {"$convert": {"input": f"${field}", "to": "date", "onError": None, "onNull": None}}
+
+
+def raw_window_match(field: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    """
+    `field` in [start, end) on the raw values, for queries that cannot rely on the
+    typed field yet. The string branch is widened by a day (offset-suffixed strings)
+    so it stays index-servable; the $expr re-checks the converted date.
+    """
+    return {"$and": [
+        {"$or": [
+            {field: {"$gte": start, "$lt": end}},
+            {field: {
+                "$gte": (start - timedelta(days=1)).strftime(_ISO_FORMAT),
+                "$lt": (end + timedelta(days=1)).strftime(_ISO_FORMAT),
+            }},
+        ]},
+        {"$expr": {"$and": [{"$gte": [raw_date(field), start]}, {"$lt": [raw_date(field), end]}]}},
+    ]}
+
+
+def _persisted_sweep(col: Collection) -> Optional[datetime]:
+    doc = col.database[TIMESTAMPS_STATE_COLLECTION].find_one({"_id": "sweep"}, {"swept_at": 1})
+    return doc.get("swept_at") if doc else None
+
+
+def ensure_timestamps_fresh(col: Collection, max_lag_seconds: int = TIMESTAMPS_MAX_LAG_SECONDS) -> None:
+    """
+    Sweep docs whose raw timestamps moved since the previous sweep (this process's,
+    else the persisted one; TIMESTAMPS_LOOKBACK when there is none) when this
+    process hasn't swept for `max_lag_seconds`.
+    """
+    global _last_sweep
+    started = datetime.now(UTC)
+    if _last_sweep and (started - _last_sweep).total_seconds() < max_lag_seconds:
+        return
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    try:
+        previous = _last_sweep or _persisted_sweep(col)
+        since = previous - TIMESTAMPS_SWEEP_SKEW if previous else started - TIMESTAMPS_LOOKBACK
+        backfill_order_timestamps(col, since=since)
+        col.database[TIMESTAMPS_STATE_COLLECTION].update_one(
+            {"_id": "sweep"}, {"$set": {"swept_at": started}}, upsert=True)
+        _last_sweep = started
+    except Exception:
+        logger.exception("[ORDER-TS] incremental sweep failed")
+    finally:
+        _sweep_lock.release()
+
+
+if __name__ == "__main__":
+    # one-off migration: python -m app.order_timestamps
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    from app.indexes import ensure_indexes
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    _db = MongoClient(os.getenv("MONGO_URI"), tz_aware=True)["candyman"]
+    ensure_indexes(_db)
+    _col = _db["user_details"]
+    logger.info("[ORDER-TS] backfill done: %s", backfill_order_timestamps(_col))
@@ -0,0 +1,110 @@
+# app/presign_cache.py
+"""
+Expiry-aware cache of presigned S3 GET URLs for the order / job detail views.
+
+Every detail view used to HEAD each input image (up to 9 per order) and sign it
+again. A signed URL is valid for `expires_in` seconds, so it can be served from
+memory until shortly before it expires:
+
+  key      (bucket, object key, expires_in, response-header params)
+  value    the URL, kept for expires_in - PRESIGN_REFRESH_MARGIN_SECONDS
+           (so a served URL always has at least the margin left)
+  expiry   a URL signed with temporary credentials (role / SSO / instance
+           profile) stops working when they expire, whatever expires_in says,
+           so the TTL is also capped by the signing credentials' expiry; when
+           that is unknown for a session token, by
+           PRESIGN_TEMP_CREDENTIALS_TTL_SECONDS
+  missing  objects whose HEAD said 404 / NoSuchKey / NotFound / AccessDenied
+           are remembered for PRESIGN_NEGATIVE_TTL_SECONDS
+
+The S3 client is only requested on a miss, so re-opening an order makes no S3
+calls at all. Nothing is invalidated explicitly: a signed URL names a key, not
+a version, and an object uploaded after a miss is seen once the negative entry
+expires.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from botocore.exceptions import ClientError
+
+from app.stats_cache import TTLCache
+
+PRESIGN_CACHE_MAX_ENTRIES = int(os.getenv("PRESIGN_CACHE_MAX_ENTRIES", "20000"))
+PRESIGN_REFRESH_MARGIN_SECONDS = float(os.getenv("PRESIGN_REFRESH_MARGIN_SECONDS", "300"))
+PRESIGN_NEGATIVE_TTL_SECONDS = float(os.getenv("PRESIGN_NEGATIVE_TTL_SECONDS", "60"))
+PRESIGN_TEMP_CREDENTIALS_TTL_SECONDS = float(os.getenv("PRESIGN_TEMP_CREDENTIALS_TTL_SECONDS", "900"))
+
+MISSING_CODES = ("404", "NoSuchKey", "NotFound", "AccessDenied")
+
+# per-entry TTLs are passed on set(); the cache-wide TTL is only a fallback
+presign_cache = TTLCache(PRESIGN_NEGATIVE_TTL_SECONDS, PRESIGN_CACHE_MAX_ENTRIES)
+
+
+def _url_key(bucket: str, key: str, expires_in: int, params: Optional[Dict[str, str]]) -> Hashable:
+    return ("url", bucket, key, expires_in, tuple(sorted((params or {}).items())))
+
+
+def credentials_ttl(s3) -> Optional[float]:
+    """
+    Seconds until the credentials `s3` signs with expire; None for long-term
+    keys. Reads botocore's signer, so call it right after signing.
+    """
+    creds = getattr(getattr(s3, "_request_signer", None), "_credentials", None)
+    if creds is None:
+        return None
+    expiry = getattr(creds, "_expiry_time", None)  # RefreshableCredentials
+    if expiry is not None:
+        return (expiry - datetime.now(timezone.utc)).total_seconds()
+    if getattr(creds, "token", None):  # session token of unknown lifetime
+        return PRESIGN_TEMP_CREDENTIALS_TTL_SECONDS
+    return None
+
+
+def cached_presigned_url(
+    get_client: Callable[[], Any],
+    bucket: str,
+    key: str,
+    expires_in: int = 3600,
+    params: Optional[Dict[str, str]] = None,
+    verify: bool = True,
+) -> Optional[str]:
+    """
+    Presigned get_object URL for bucket/key, or None when `verify` is set and
+    the object does not exist. Other S3 / credential errors propagate.
+    `params` are extra get_object params (ResponseContentType, ...).
+    """
+    url_key = _url_key(bucket, key, expires_in, params)
+    hit, url = presign_cache.get(url_key)
+    if hit:
+        return url
+    missing_key = ("missing", bucket, key)
+    if verify:
+        hit, _ = presign_cache.get(missing_key)
+        if hit:
+            return None
+
+    s3 = get_client()
+    if verify:
+        try:
+            s3.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code in MISSING_CODES:
+                presign_cache.set(missing_key, True, ttl=PRESIGN_NEGATIVE_TTL_SECONDS)
+                return None
+            raise
+
+    url = s3.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": bucket, "Key": key, **(params or {})},
+        ExpiresIn=expires_in,
+    )
+    valid_for = expires_in
+    creds_left = credentials_ttl(s3)
+    if creds_left is not None:
+        valid_for = min(valid_for, creds_left)
+    ttl = valid_for - PRESIGN_REFRESH_MARGIN_SECONDS
+    if ttl > 0:
+        presign_cache.set(url_key, url, ttl=ttl)
+    return url
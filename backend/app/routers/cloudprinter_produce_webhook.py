@@ -3,6 +3,7 @@ from email.message import EmailMessage
 from fastapi import APIRouter, Request, HTTPException, status, Depends, Response, BackgroundTasks
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
+from app.stats_cache import invalidate_stats_cache
 
 router = APIRouter()
 security = HTTPBasic(auto_error=False)
@@ -186,6 +187,7 @@ async def cloudprinter_itemproduce_webhook(
     if res.matched_count == 0:
         print(f"[CP PRODUCE] order not found for order_ref={data.order_reference} -> 204")
         return Response(status_code=204)
+    invalidate_stats_cache()
 
     # Idempotent email gate
     once = orders_collection.update_one(
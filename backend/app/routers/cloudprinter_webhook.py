@@ -9,6 +9,7 @@ from email.message import EmailMessage
 from fastapi import APIRouter, Request, HTTPException, status, Depends, BackgroundTasks
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
+from app.stats_cache import invalidate_stats_cache
 
 router = APIRouter()
 security = HTTPBasic(auto_error=False)
@@ -267,6 +268,7 @@ async def cloudprinter_webhook(
     }
     orders_collection.update_one({"order_id": data.order_reference}, {
                                  "$set": update_fields})
+    invalidate_stats_cache()
 
     # 2) Idempotent email: set shipped_email_sent=True only once; send email iff we flipped it now
     filter_once = {
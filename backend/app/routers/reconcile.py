@@ -1,7 +1,7 @@
 # app/routers/reconcile.py
 from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import JSONResponse
-from typing import Optional, Dict, Any, List, Tuple, Union
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional, Dict, Any, Iterator, List, Literal, Tuple, Union
 import os
 import httpx
 import re
@@ -37,6 +37,7 @@ def norm(s: str | None, *, case_insensitive: bool) -> str:
 # ---- Razorpay fetcher (reuse your existing code) ----------------------------
 from app.routers.razorpay_export import fetch_payments, _assert_keys
 # ----------------------------------------------------------------------------
+from app.order_timestamps import sync_order_timestamps
 
 # ---- Mongo connection via ENV ----------------------------------------------
 MONGO_URI = os.getenv("MONGO_URI")
@@ -184,6 +185,69 @@ def _render_na_table(title: str, wnd_from: str, wnd_to: str, rows: list[dict]) -
 
 
 # ------------------------------ KEEP: /orders --------------------------------
+RECONCILE_STREAM_BATCH_SIZE = int(os.getenv("RECONCILE_STREAM_BATCH_SIZE", "1000"))
+
+
+def _reconcile_order_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "order_id": doc.get("order_id", ""),
+        "job_id": doc.get("job_id", ""),
+        "coverPdf": doc.get("cover_url", ""),
+        "interiorPdf": doc.get("book_url", ""),
+        "previewUrl": doc.get("preview_url", ""),
+        "name": doc.get("name", ""),
+        "city": doc.get("shipping_address", {}).get("city", ""),
+        "price": doc.get("price", doc.get("total_price", doc.get("amount", doc.get("total_amount", 0)))),
+        "paymentDate": doc.get("processed_at", ""),
+        "approvalDate": doc.get("approved_at", ""),
+        "status": "Approved" if doc.get("approved") else "Uploaded",
+        "bookId": doc.get("book_id", ""),
+        "bookStyle": doc.get("book_style", ""),
+        "printStatus": doc.get("print_status", ""),
+        "feedback_email": doc.get("feedback_email", False),
+        "print_approval": doc.get("print_approval", None),
+        "discount_code": doc.get("discount_code", ""),
+        "currency": doc.get("currency", ""),
+        "locale": doc.get("locale", ""),
+    }
+
+
+def _json_default(value: Any) -> Any:
+    # same shapes FastAPI's encoder produces for the non-streamed response
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _stream_order_rows(cursor, fmt: str) -> Iterator[str]:
+    """Encode cursor rows one at a time: NDJSON lines, or the chunks of one JSON array."""
+    first = True
+    if fmt == "json":
+        yield "["
+    try:
+        for doc in cursor:
+            line = json.dumps(_reconcile_order_row(doc), default=_json_default, ensure_ascii=False)
+            if fmt == "json":
+                yield line if first else "," + line
+            else:
+                yield line + "\n"
+            first = False
+    except PyMongoError as exc:
+        # headers are gone: the error becomes the last NDJSON line / the last array element,
+        # and the JSON array is still closed so the body parses
+        logger.exception("[RECONCILE] /orders stream aborted")
+        error = json.dumps({"error": str(exc)})
+        if fmt == "json":
+            yield ("" if first else ",") + error + "]"
+        else:
+            yield error + "\n"
+        return
+    finally:
+        cursor.close()
+    if fmt == "json":
+        yield "]"
+
+
 @router.get("/orders")
 def get_orders(
     sort_by: Optional[str] = Query(None, description="Field to sort by"),
@@ -193,6 +257,9 @@ def get_orders(
     filter_print_approval: Optional[str] = Query(None),
     filter_discount_code: Optional[str] = Query(None),
     exclude_discount_code: Optional[str] = None,
+    stream: Optional[Literal["ndjson", "json"]] = Query(
+        None, description="stream rows as NDJSON or a chunked JSON array instead of one buffered list"),
+    batch_size: int = Query(RECONCILE_STREAM_BATCH_SIZE, ge=10, le=10000, description="cursor batch size when streaming"),
 ):
     # Base query: only show paid orders
     query = {"paid": True}
@@ -243,31 +310,15 @@ def get_orders(
         "currency": 1, "locale": 1, "_id": 0,
     }
 
+    if stream:
+        cursor = orders_collection.find(query, projection).sort(sort_field, sort_order).batch_size(batch_size)
+        return StreamingResponse(
+            _stream_order_rows(cursor, stream),
+            media_type="application/x-ndjson" if stream == "ndjson" else "application/json",
+        )
+
     records = list(orders_collection.find(query, projection).sort(sort_field, sort_order))
-    result = []
-    for doc in records:
-        result.append({
-            "order_id": doc.get("order_id", ""),
-            "job_id": doc.get("job_id", ""),
-            "coverPdf": doc.get("cover_url", ""),
-            "interiorPdf": doc.get("book_url", ""),
-            "previewUrl": doc.get("preview_url", ""),
-            "name": doc.get("name", ""),
-            "city": doc.get("shipping_address", {}).get("city", ""),
-            "price": doc.get("price", doc.get("total_price", doc.get("amount", doc.get("total_amount", 0)))),
-            "paymentDate": doc.get("processed_at", ""),
-            "approvalDate": doc.get("approved_at", ""),
-            "status": "Approved" if doc.get("approved") else "Uploaded",
-            "bookId": doc.get("book_id", ""),
-            "bookStyle": doc.get("book_style", ""),
-            "printStatus": doc.get("print_status", ""),
-            "feedback_email": doc.get("feedback_email", False),
-            "print_approval": doc.get("print_approval", None),
-            "discount_code": doc.get("discount_code", ""),
-            "currency": doc.get("currency", ""),
-            "locale": doc.get("locale", ""),
-        })
-    return result
+    return [_reconcile_order_row(doc) for doc in records]
 # ----------------------------------------------------------------------------
 
 async def _vlookup_core(
@@ -755,6 +806,8 @@ async def _auto_reconcile_and_sign_once() -> None:
                         "taxes": taxes,
                     }},
                 )
+                # discount_code feeds the derived flags (app/order_timestamps.py)
+                sync_order_timestamps(orders_collection, {"transaction_id": payment_id})
                 logger.info(f"[AUTO] Reconciled {payment_id} and updated pricing fields in user_details.")
 
                 # mark this row as success
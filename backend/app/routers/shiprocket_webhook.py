@@ -11,7 +11,10 @@ load_dotenv(find_dotenv(), override=False)
 
 from fastapi import APIRouter, Request, Response, BackgroundTasks
 from pydantic import BaseModel, Field, ConfigDict
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from app.kpi_counters import KPI_PROJECTION, kpi_transition
+from app.stats_cache import invalidate_stats_cache
+from app.order_timestamps import parse_ts, sync_order_timestamps
 
 router = APIRouter()
 
@@ -21,6 +24,7 @@ client = MongoClient(MONGO_URI, tz_aware=True)
 db = client["candyman"]
 orders_collection = db["shipping_details"]
 users_collection = db["user_details"]   
+kpi_counters_collection = db["production_kpi_counters"]
 
 class Scan(BaseModel):
     model_config = ConfigDict(extra="allow")
@@ -103,18 +107,26 @@ def _upsert_tracking(e: ShiprocketEvent, raw: dict) -> None:
 
     try:
         if e.order_id:
-            users_collection.update_one(
+            user_set = {
+                "current_status": e.current_status,
+                "current_timestamp_iso": _parse_ts(e.current_timestamp),
+                # typed copy used by the SLA stats (see app/order_timestamps.py)
+                "current_timestamp_dt": parse_ts(_parse_ts(e.current_timestamp)),
+            }
+            before = users_collection.find_one_and_update(
                 {"order_id": e.order_id},
-                {
-                    "$set": {
-                        "current_status": e.current_status,
-                        "current_timestamp_iso": _parse_ts(e.current_timestamp),
-                    }
-                },
+                {"$set": user_set},
+                projection=KPI_PROJECTION,
+                return_document=ReturnDocument.BEFORE,
                 upsert=False,  # keep default behaviour: do NOT create new user_documents
             )
+            kpi_transition(kpi_counters_collection, before, user_set)
+            if before:
+                # is_cancelled and the other derived flags (app/order_flags.py)
+                sync_order_timestamps(users_collection, {"order_id": e.order_id})
     except Exception as sync_exc:
         logging.exception(f"[SR WH] Failed to sync to user_details for order {e.order_id}: {sync_exc}")
+    invalidate_stats_cache()
 
 
 def _latest_scan(scans: List[dict]) -> Optional[dict]:
@@ -0,0 +1,108 @@
+# app/s3_move.py
+"""
+Concurrent S3 "folder" moves (copy + delete under a new prefix).
+
+/api/orders/unapprove moves `output/{job_id}/final_coverpage/` and
+`approved_output/` under `output/{job_id}/previous/`. It used to read a single
+`list_objects_v2` page (missing everything past 1000 keys) and copy / delete
+one key at a time. Here:
+
+  - listing is paginated
+  - copies run on a process-wide bounded pool (S3_MOVE_COPY_WORKERS), and
+    several jobs are moved at once on a second one (S3_MOVE_JOB_WORKERS);
+    both live for the life of the process, so concurrent requests share
+    the same bounds instead of each spinning up their own threads
+  - sources are removed with `delete_objects` in batches of 1000, and only
+    after their copy succeeded, so a failed copy never loses an object
+
+Each job gets a report (listed / copied / deleted / failed keys), and progress
+is logged per listing page.
+"""
+import os
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+S3_MOVE_COPY_WORKERS = int(os.getenv("S3_MOVE_COPY_WORKERS", "16"))
+S3_MOVE_JOB_WORKERS = int(os.getenv("S3_MOVE_JOB_WORKERS", "4"))
+DELETE_BATCH = 1000  # delete_objects limit
+
+# separate pools: job tasks block on copy futures and must not starve them
+_copy_pool = ThreadPoolExecutor(max_workers=S3_MOVE_COPY_WORKERS, thread_name_prefix="s3-copy")
+_job_pool = ThreadPoolExecutor(max_workers=S3_MOVE_JOB_WORKERS, thread_name_prefix="s3-move")
+
+
+def _delete_keys(s3, bucket: str, keys: List[str]) -> List[str]:
+    """Delete `keys` in batches; returns the keys S3 reported as not deleted."""
+    errors: List[str] = []
+    for start in range(0, len(keys), DELETE_BATCH):
+        batch = keys[start:start + DELETE_BATCH]
+        resp = s3.delete_objects(
+            Bucket=bucket, Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True})
+        errors.extend(e.get("Key", "") for e in resp.get("Errors", []) or [])
+    return errors
+
+
+def move_prefix(s3, bucket: str, old_prefix: str, new_prefix: str, copy_pool: Executor) -> Dict[str, Any]:
+    """Move every object under `old_prefix` to the same relative key under `new_prefix`."""
+    listed = copied = 0
+    moved: List[str] = []
+    failed: List[str] = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=old_prefix):
+        keys = [o["Key"] for o in page.get("Contents", []) or []]
+        listed += len(keys)
+        futures = [
+            (key, copy_pool.submit(
+                s3.copy_object,
+                Bucket=bucket,
+                CopySource={"Bucket": bucket, "Key": key},
+                Key=new_prefix + key[len(old_prefix):],
+            ))
+            for key in keys
+        ]
+        for key, fut in futures:
+            try:
+                fut.result()
+                moved.append(key)
+                copied += 1
+            except Exception:
+                logger.warning("[S3 MOVE] copy failed for %s", key, exc_info=True)
+                failed.append(key)
+        logger.info("[S3 MOVE] %s -> %s: %d listed, %d copied", old_prefix, new_prefix, listed, copied)
+
+    not_deleted = _delete_keys(s3, bucket, moved) if moved else []
+    return {
+        "listed": listed,
+        "copied": copied,
+        "deleted": len(moved) - len(not_deleted),
+        "failed": failed,
+        "not_deleted": not_deleted,
+    }
+
+
+def move_job_folders(
+    s3, bucket: str, job_id: str, folders: Iterable[str], copy_pool: Executor
+) -> Dict[str, Any]:
+    """Move each `output/{job_id}/{folder}` to `output/{job_id}/previous/{folder}`."""
+    prefix = f"output/{job_id}/"
+    report: Dict[str, Any] = {}
+    for folder in folders:
+        try:
+            report[folder] = move_prefix(s3, bucket, prefix + folder, prefix + "previous/" + folder, copy_pool)
+        except Exception as exc:
+            logger.exception("[S3 MOVE] job %s folder %s failed", job_id, folder)
+            report[folder] = {"error": str(exc)}
+    return report
+
+
+def move_jobs(s3, bucket: str, job_ids: Iterable[str], folders: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Per-job move reports, jobs in parallel; copies of all jobs share one bounded pool."""
+    job_ids = list(dict.fromkeys(job_ids))
+    folders = list(folders)
+    futures = {
+        job_id: _job_pool.submit(move_job_folders, s3, bucket, job_id, folders, _copy_pool)
+        for job_id in job_ids
+    }
+    return {job_id: fut.result() for job_id, fut in futures.items()}
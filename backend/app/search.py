@@ -0,0 +1,122 @@
+# app/search.py
+"""
+Indexed free-text search for the orders / shipment-orders / jobs grids.
+
+Each user_details doc carries `search_tokens`: lower-cased edge n-grams
+(prefixes of SEARCH_MIN_GRAM..SEARCH_MAX_GRAM chars) of every word of the
+searchable fields, tagged with the field they came from (`n:prak` for a name
+starting "Prak..."). The array is maintained with the other derived fields by
+app/order_timestamps.py (write-path hook, incremental sweep, backfill) and
+served by a multikey index, so a search is a handful of index point lookups
+whatever the collection size.
+
+`search_filter()` tries exact-id fast paths first:
+
+  #1234 / #1234_1      order_id (anchored, uses the order_id index)
+  UUID                 job_id
+  name@example.com     email
+
+and otherwise requires every word of `q` to be a prefix of a word in one of the
+endpoint's fields. Matching is by word prefix rather than arbitrary substring.
+Until the backfill has run, keep ORDER_SEARCH_TOKENS=0 (regex search).
+"""
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+ORDER_SEARCH_TOKENS = os.getenv("ORDER_SEARCH_TOKENS", "0") == "1"
+SEARCH_MIN_GRAM = 1
+SEARCH_MAX_GRAM = int(os.getenv("SEARCH_MAX_GRAM", "16"))
+
+# searchable field -> tag stored in the token
+SEARCH_FIELD_TAGS: Dict[str, str] = {
+    "order_id": "o",
+    "job_id": "j",
+    "email": "e",
+    "name": "n",
+    "discount_code": "d",
+    "book_id": "b",
+    "locale": "l",
+    "shipping_address.city": "c",
+}
+# top-level fields the tokens are derived from
+SEARCH_SOURCE_FIELDS = tuple(sorted({f.split(".")[0] for f in SEARCH_FIELD_TAGS}))
+
+ORDER_SEARCH_FIELDS = tuple(SEARCH_FIELD_TAGS)
+JOB_SEARCH_FIELDS = ("job_id", "order_id", "name", "book_id")
+
+_WORD_SPLIT = re.compile(r"[^0-9a-z]+")
+_ORDER_ID = re.compile(r"^#(\d+)(?:_(\d+))?$")
+_UUID = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$", re.IGNORECASE)
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _fold(value: str) -> str:
+    # lower-case and strip accents so "José" and "jose" meet
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def search_words(value: Any) -> List[str]:
+    if value is None or isinstance(value, (dict, list)):
+        return []
+    return [w for w in _WORD_SPLIT.split(_fold(str(value))) if w]
+
+
+def _get_path(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def search_tokens(doc: Dict[str, Any]) -> List[str]:
+    """Sorted, de-duplicated `tag:prefix` tokens for a user_details doc."""
+    tokens = set()
+    for field, tag in SEARCH_FIELD_TAGS.items():
+        for word in search_words(_get_path(doc, field)):
+            for n in range(SEARCH_MIN_GRAM, min(len(word), SEARCH_MAX_GRAM) + 1):
+                tokens.add(f"{tag}:{word[:n]}")
+    return sorted(tokens)
+
+
+def search_token_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """The $set payload keeping `search_tokens` in line with the doc."""
+    return {"search_tokens": search_tokens(doc)}
+
+
+def _exact_filter(term: str, fields: Sequence[str]) -> Optional[Dict[str, Any]]:
+    if "order_id" in fields:
+        m = _ORDER_ID.match(term)
+        if m:
+            if m.group(2):
+                return {"order_id": term}
+            return {"order_id": {"$regex": rf"^#{m.group(1)}(_\d+)?$"}}
+    if "job_id" in fields and _UUID.match(term):
+        return {"job_id": {"$in": sorted({term, term.lower()})}}
+    if "email" in fields and _EMAIL.match(term):
+        return {"email": {"$in": sorted({term, term.lower()})}}
+    return None
+
+
+def search_filter(q: str, fields: Iterable[str] = ORDER_SEARCH_FIELDS) -> Optional[Dict[str, Any]]:
+    """Filter for the grid search box, or None when `q` has nothing searchable."""
+    fields = tuple(fields)
+    term = (q or "").strip()
+    if not term:
+        return None
+    exact = _exact_filter(term, fields)
+    if exact is not None:
+        return exact
+
+    tags = [SEARCH_FIELD_TAGS[f] for f in fields]
+    clauses = []
+    for word in dict.fromkeys(search_words(term)):
+        prefix = word[:SEARCH_MAX_GRAM]
+        clauses.append({"search_tokens": {"$in": [f"{tag}:{prefix}" for tag in tags]}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -0,0 +1,271 @@
+# app/sla_engine.py
+"""
+Columnar SLA engine behind /api/stats/sla-cohorts, delivery-latency-cohorts,
+shipment-weekly-sla and sla-summary.
+
+The order population for a processed_at window is fetched once (timestamps as
+epoch-ms longs, converted server-side) into NumPy arrays and shared through
+`frame_cache`, so the four endpoints slice the same frame instead of looping
+over documents. Days-to-deliver, IST cohort day, ISO week and SLA buckets are
+all vectorized.
+
+bench/bench_sla.py times it against the per-document loops it replaced.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Iterable, List
+
+import numpy as np
+from pymongo.collection import Collection
+
+from app.order_timestamps import raw_date
+from app.stats_cache import frame_cache
+
+DAY_MS = 86_400_000
+IST_OFFSET_MS = 19_800_000  # +05:30
+NO_TS = np.iinfo(np.int64).min
+
+# le_3, day_4 .. day_9, day_10_plus
+LATENCY_BUCKETS = ("day_le_3", "day_4", "day_5", "day_6", "day_7", "day_8", "day_9", "day_10_plus")
+SLA_DAYS = 8
+
+_PROJECT = {
+    "_id": 0,
+    "order_id": 1,
+    "processed_at": 1,
+    "current_status": 1,
+    "current_timestamp_iso": 1,
+    "discount_code": 1,
+    "p": {"$toLong": "$processed_at_dt"},
+    "dlv": {"$toLong": "$current_timestamp_dt"},
+}
+# same columns from the raw timestamps, until the typed fields are backfilled
+_RAW_PROJECT = {
+    **_PROJECT,
+    "p": {"$toLong": raw_date("processed_at")},
+    "dlv": {"$toLong": raw_date("current_timestamp_iso")},
+}
+
+
+class SlaFrame:
+    """One row per order; all columns are equally long NumPy arrays."""
+
+    def __init__(
+        self,
+        order_id: np.ndarray,
+        processed_raw: np.ndarray,
+        status_raw: np.ndarray,
+        delivered_iso: np.ndarray,
+        discount_code: np.ndarray,
+        processed_ms: np.ndarray,
+        delivered_ms: np.ndarray,
+        exclude_codes: Iterable[str] = (),
+    ):
+        self.order_id = order_id
+        self.processed_raw = processed_raw
+        self.status_raw = status_raw
+        self.delivered_iso = delivered_iso
+        self.discount_code = discount_code
+        self.processed_ms = processed_ms
+        self.delivered_ms = delivered_ms
+        self.exclude_codes = tuple(exclude_codes)
+
+        status = np.char.upper(np.char.strip(status_raw.astype(str)))
+        self.is_delivered = status == "DELIVERED"
+        self.has_delivered_ts = delivered_ms != NO_TS
+        self.delivered_with_ts = self.is_delivered & self.has_delivered_ts
+        # floor division matches timedelta.days for negative deltas too
+        self.days_taken = np.where(
+            self.has_delivered_ts, (delivered_ms - processed_ms) // DAY_MS, 0)
+        self.cohort_day = (processed_ms + IST_OFFSET_MS) // DAY_MS
+        codes = np.char.upper(discount_code.astype(str))
+        self.excluded = np.isin(codes, [c.upper() for c in self.exclude_codes])
+
+    def __len__(self) -> int:
+        return len(self.processed_ms)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], exclude_codes: Iterable[str] = ()) -> "SlaFrame":
+        rows = [r for r in rows if r.get("p") is not None]
+        n = len(rows)
+
+        def obj(values) -> np.ndarray:
+            out = np.empty(n, dtype=object)
+            out[:] = list(values)
+            return out
+
+        return cls(
+            order_id=obj(r.get("order_id") for r in rows),
+            processed_raw=obj(r.get("processed_at") for r in rows),
+            status_raw=obj(r.get("current_status") or "" for r in rows),
+            delivered_iso=obj(r.get("current_timestamp_iso") for r in rows),
+            discount_code=obj(r.get("discount_code") or "" for r in rows),
+            processed_ms=np.fromiter((r["p"] for r in rows), dtype=np.int64, count=n),
+            delivered_ms=np.fromiter(
+                (NO_TS if r.get("dlv") is None else r["dlv"] for r in rows), dtype=np.int64, count=n),
+            exclude_codes=exclude_codes,
+        )
+
+    def select(self, mask: np.ndarray) -> "SlaFrame":
+        return SlaFrame(
+            self.order_id[mask],
+            self.processed_raw[mask],
+            self.status_raw[mask],
+            self.delivered_iso[mask],
+            self.discount_code[mask],
+            self.processed_ms[mask],
+            self.delivered_ms[mask],
+            self.exclude_codes,
+        )
+
+    def without_excluded(self) -> "SlaFrame":
+        return self.select(~self.excluded) if self.excluded.any() else self
+
+    def iso_weeks(self) -> np.ndarray:
+        """ISO (year, week) of each IST cohort day as a (n, 2) int array."""
+        weekday = (self.cohort_day + 3) % 7  # 1970-01-01 was a Thursday; Monday = 0
+        thursday = self.cohort_day - weekday + 3
+        iso_year = thursday.astype("datetime64[D]").astype("datetime64[Y]")
+        jan1 = iso_year.astype("datetime64[D]").astype(np.int64)
+        week = (thursday - jan1) // 7 + 1
+        return np.stack([iso_year.astype(np.int64) + 1970, week], axis=1)
+
+
+def load_sla_frame(
+    col: Collection,
+    query: Dict[str, Any],
+    cache_key: Hashable,
+    exclude_codes: Iterable[str] = (),
+    derived: bool = True,
+) -> SlaFrame:
+    """Fetch (or reuse from `frame_cache`) the frame for `query`; `derived=False` reads the raw timestamps."""
+    key = ("sla_frame", cache_key, tuple(exclude_codes), derived)
+    hit, frame = frame_cache.get(key)
+    if hit:
+        return frame
+    generation = frame_cache.generation
+    project = _PROJECT if derived else _RAW_PROJECT
+    rows = list(col.aggregate([{"$match": query}, {"$project": project}]))
+    frame = SlaFrame.from_rows(rows, exclude_codes)
+    frame_cache.set(key, frame, generation=generation)
+    return frame
+
+
+def _day_labels(days: np.ndarray) -> List[str]:
+    return list(np.datetime_as_string(days.astype("datetime64[D]")))
+
+
+def _pct(part, total, ndigits: int) -> float:
+    return round(float(part) * 100 / float(total), ndigits)
+
+
+def cohort_summary(frame: SlaFrame) -> List[Dict[str, Any]]:
+    """Per IST processed day: delivered / undelivered share (sla-cohorts chart)."""
+    if not len(frame):
+        return []
+    days, inv = np.unique(frame.cohort_day, return_inverse=True)
+    total = np.bincount(inv, minlength=len(days))
+    delivered = np.bincount(inv, weights=frame.is_delivered, minlength=len(days)).astype(np.int64)
+    undelivered = total - delivered
+    return [
+        {
+            "processed_date": label,
+            "delivered_pct": _pct(delivered[i], total[i], 1),
+            "undelivered_pct": _pct(undelivered[i], total[i], 1),
+            "total_orders": int(total[i]),
+        }
+        for i, label in enumerate(_day_labels(days))
+    ]
+
+
+def cohort_orders(frame: SlaFrame, cohort_date: str) -> List[Dict[str, Any]]:
+    """Drill-down rows of one IST processed day (sla-cohorts table)."""
+    try:
+        day = np.datetime64(cohort_date, "D").astype(np.int64)
+    except ValueError:
+        return []
+    idx = np.flatnonzero(frame.cohort_day == day)
+    in_sla = frame.delivered_with_ts & (frame.days_taken <= SLA_DAYS)
+    out = []
+    for i in idx:
+        delivered = bool(frame.is_delivered[i])
+        processed = frame.processed_raw[i]
+        if not processed:
+            processed = datetime.fromtimestamp(int(frame.processed_ms[i]) / 1000, tz=timezone.utc)
+        out.append({
+            "order_id": frame.order_id[i],
+            "processed_at": processed,
+            "current_status": frame.status_raw[i] or None,
+            "delivered_in_8_days": "YES" if in_sla[i] else "NO",
+            "delivered_at": frame.delivered_iso[i] if delivered else None,
+        })
+    return out
+
+
+def latency_cohorts(frame: SlaFrame) -> List[Dict[str, Any]]:
+    """Per IST processed day: share of orders delivered in each day bucket, plus a TOTAL row."""
+    nb = len(LATENCY_BUCKETS)
+    if len(frame):
+        days, inv = np.unique(frame.cohort_day, return_inverse=True)
+    else:
+        days, inv = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    ndays = len(days)
+    total = np.bincount(inv, minlength=ndays)
+    dmask = frame.delivered_with_ts
+    delivered = np.bincount(inv[dmask], minlength=ndays)
+    bucket = np.clip(frame.days_taken[dmask], 3, 10) - 3
+    counts = np.zeros((ndays, nb), dtype=np.int64)
+    np.add.at(counts, (inv[dmask], bucket), 1)
+
+    def row(label, tot, dlv, c):
+        denom = tot or 1
+        return {
+            "processed_date": label,
+            "total_orders": int(tot),
+            "delivered_orders": int(dlv),
+            **{name: _pct(c[j], denom, 1) for j, name in enumerate(LATENCY_BUCKETS)},
+        }
+
+    response = [row(label, total[i], delivered[i], counts[i]) for i, label in enumerate(_day_labels(days))]
+    response.append(row("TOTAL", total.sum(), delivered.sum(), counts.sum(axis=0)))
+    return response
+
+
+def weekly_sla_stats(frame: SlaFrame) -> Dict[str, Any]:
+    """Delivery SLA counters for one ISO week's orders (shipment-weekly-sla row body)."""
+    total_orders = len(frame)
+    days = np.maximum(frame.days_taken[frame.delivered_with_ts], 0)
+    delivered_orders = len(days)
+    le_3 = int(np.count_nonzero(days <= 3))
+    d4_8 = int(np.count_nonzero((days >= 4) & (days <= 8)))
+    ge_9 = delivered_orders - le_3 - d4_8
+
+    def pct(n):
+        return _pct(n, delivered_orders, 2) if delivered_orders else 0
+
+    return {
+        "total_orders": total_orders,
+        "total_delivered": delivered_orders,
+        "delivered_pct": _pct(delivered_orders, total_orders, 2) if total_orders else 0,
+        "avg_days": round(float(days.sum()) / delivered_orders, 2) if delivered_orders else 0,
+        "sla_counts": {"le_3": le_3, "d4_8": d4_8, "ge_9": ge_9},
+        "sla_pct": {"le_3": pct(le_3), "d4_8": pct(d4_8), "ge_9": pct(ge_9)},
+    }
+
+
+def weekly_sla_by_week(frame: SlaFrame, weeks: Iterable[tuple]) -> Dict[tuple, Dict[str, Any]]:
+    """`weekly_sla_stats` for each ISO (year, week) in `weeks`, split out of one frame."""
+    iso = frame.iso_weeks()
+    week_key = iso[:, 0] * 100 + iso[:, 1]
+    return {
+        (year, week): weekly_sla_stats(frame.select(week_key == year * 100 + week))
+        for year, week in weeks
+    }
+
+
+def sla_summary(frame: SlaFrame) -> Dict[str, int]:
+    delivered = int(np.count_nonzero(frame.delivered_with_ts & (frame.days_taken <= SLA_DAYS)))
+    return {
+        "delivered_within_8_days": delivered,
+        "not_delivered_within_8_days": len(frame) - delivered,
+        "total_orders": len(frame),
+    }
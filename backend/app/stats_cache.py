@@ -0,0 +1,134 @@
+# app/stats_cache.py
+"""
+In-process TTL + LRU cache for /api/stats/* responses.
+
+Entries are keyed on the endpoint name and its normalized query parameters.
+Any write path that changes order state calls `invalidate_stats_cache()`,
+which drops every entry (stats endpoints overlap too much for finer keys),
+clears the columnar frame cache (app/sla_engine.py, app/status_board.py) and
+the list-count cache (app/list_counts.py) and bumps the data watermark
+used for stats ETags (app/stats_watermark.py).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from app.stats_watermark import bump_watermark
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "60"))
+STATS_CACHE_MAX_ENTRIES = int(os.getenv("STATS_CACHE_MAX_ENTRIES", "256"))
+LIST_COUNT_TTL_SECONDS = float(os.getenv("LIST_COUNT_TTL_SECONDS", "30"))
+LIST_COUNT_MAX_ENTRIES = int(os.getenv("LIST_COUNT_MAX_ENTRIES", "512"))
+# NumPy frames are MBs each, so they get a few slots of their own
+STATS_FRAME_CACHE_MAX_ENTRIES = int(os.getenv("STATS_FRAME_CACHE_MAX_ENTRIES", "8"))
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # bumped on every invalidation so in-flight computations don't store stale results
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return False, None
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return False, None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        """`ttl` overrides the cache-wide TTL for this entry."""
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + (self.ttl_seconds if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+stats_cache = TTLCache(STATS_CACHE_TTL_SECONDS, STATS_CACHE_MAX_ENTRIES)
+list_count_cache = TTLCache(LIST_COUNT_TTL_SECONDS, LIST_COUNT_MAX_ENTRIES)
+frame_cache = TTLCache(STATS_CACHE_TTL_SECONDS, STATS_FRAME_CACHE_MAX_ENTRIES)
+
+
+def _normalize(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple, set)):
+        return tuple(sorted({str(v).strip() for v in value if v is not None}))
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def stats_cache_key(name: str, params: Dict[str, Any], args: Tuple[Any, ...] = ()) -> Hashable:
+    return (
+        name,
+        tuple(_normalize(a) for a in args),
+        tuple(sorted((k, _normalize(v)) for k, v in params.items())),
+    )
+
+
+def cached_stats(func: Callable) -> Callable:
+    """Cache a stats endpoint's return value on its (normalized) keyword arguments."""
+    if STATS_CACHE_TTL_SECONDS <= 0:
+        return func
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = stats_cache_key(func.__name__, kwargs, args)
+        hit, value = stats_cache.get(key)
+        if hit:
+            return value
+        generation = stats_cache.generation
+        value = func(*args, **kwargs)
+        stats_cache.set(key, value, generation=generation)
+        return value
+
+    return wrapper
+
+
+def invalidate_stats_cache() -> None:
+    stats_cache.clear()
+    frame_cache.clear()
+    list_count_cache.clear()
+    bump_watermark()
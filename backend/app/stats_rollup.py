@@ -0,0 +1,367 @@
+# app/stats_rollup.py
+"""
+Hourly order rollups for the dashboard charts.
+
+One rollup document per (IST hour, locale, LOC, discount_code, book_id) holding:
+  - jobs:    jobs with a preview, bucketed by created_at
+  - paid:    paid docs, bucketed by processed_at (fallback created_at)
+  - revenue: sum of the paid docs' amount, same bucket as `paid`
+  - orders:  real paid orders (#1234 / #1234_1), bucketed by processed_at
+
+Both `locale` and `LOC` are kept in the key (and `loc_norm` /
+`discount_code_norm` are derived from them, app/order_flags.py) so
+`_build_loc_match()` filters and `discount_exclusion()` apply to rollup
+documents exactly as they do to `user_details`.
+
+Freshness:
+  - the first build runs from the scheduler (seed job at startup, nightly
+    rebuild); until it has completed for the current ROLLUP_SCHEMA,
+    `ensure_fresh()` returns False and the endpoints use the live aggregation
+  - incremental refreshes recompute ROLLUP_LOOKBACK behind the watermark, plus
+    every hour marked dirty by `mark_rollups_dirty()` (write paths that touch
+    ROLLUP_SOURCE_FIELDS of older orders)
+"""
+import os
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+
+from app.order_flags import _norm, discount_exclusion, loc_norm
+from app.order_timestamps import parse_ts
+
+logger = logging.getLogger(__name__)
+
+UTC = timezone.utc
+IST_OFFSET = timedelta(hours=5, minutes=30)
+
+ROLLUP_STATE_ID = "order_rollups_hourly"
+ROLLUP_KEY_FIELDS = ("hour", "locale", "LOC", "discount_code", "book_id")
+ROLLUP_METRICS = ("jobs", "paid", "revenue", "orders")
+# bump when the row layout changes; rollups of another schema are rebuilt before use
+ROLLUP_SCHEMA = 2  # 2: rows carry discount_code_norm
+# order fields a rollup row is computed from; writes touching them mark hours dirty
+ROLLUP_SOURCE_FIELDS = (
+    "paid", "order_id", "processed_at", "created_at", "preview_url",
+    "total_amount", "total_price", "amount", "price",
+    "locale", "LOC", "discount_code", "book_id",
+)
+
+# How far behind the watermark an incremental refresh re-reads (late writes, tz-shifted strings)
+ROLLUP_LOOKBACK = timedelta(hours=int(os.getenv("STATS_ROLLUP_LOOKBACK_HOURS", "48")))
+# Stats reads trigger a refresh when the watermark is older than this
+ROLLUP_MAX_LAG_SECONDS = int(os.getenv("STATS_ROLLUP_MAX_LAG_SECONDS", "60"))
+
+_refresh_lock = threading.Lock()
+# last watermark this process wrote or read; lets fresh reads skip the state lookup
+_last_watermark: Optional[datetime] = None
+
+
+def ist_hour_floor(dt: datetime) -> datetime:
+    """UTC instant at which the IST hour containing `dt` starts."""
+    ist = (dt.astimezone(UTC) + IST_OFFSET).replace(minute=0, second=0, microsecond=0)
+    return (ist - IST_OFFSET).replace(tzinfo=UTC)
+
+
+def _safe_date(expr) -> dict:
+    return {"$convert": {"input": expr, "to": "date", "onError": None, "onNull": None}}
+
+
+def _iso(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _events_pipeline(since: Optional[datetime], hours: Optional[List[datetime]] = None) -> List[dict]:
+    """
+    Turn each user_details doc into up to three (time, metric) events, then group
+    them by IST hour + rollup key. Only events at/after `since` are kept, or, when
+    `hours` is given, only events inside those hours.
+    """
+    pipeline: List[dict] = []
+    event_match: Dict[str, Any] = {"_events.t": {"$ne": None}}
+
+    if hours:
+        # candidate prefilter per hour; strings are widened by a day (non-UTC offsets)
+        branches = []
+        for h in hours:
+            lo, hi = _iso(h - timedelta(days=1)), _iso(h + timedelta(hours=1, days=1))
+            for field in ("processed_at", "created_at"):
+                branches.append({field: {"$gte": h, "$lt": h + timedelta(hours=1)}})
+                branches.append({field: {"$gte": lo, "$lt": hi}})
+        pipeline.append({"$match": {"$or": branches}})
+        event_match = {"$or": [{"_events.t": {"$gte": h, "$lt": h + timedelta(hours=1)}} for h in hours]}
+    elif since is not None:
+        # candidate prefilter – each branch is servable by an index on the raw field;
+        # strings are compared a day early to tolerate non-UTC offsets.
+        since_iso = _iso(since - timedelta(days=1))
+        pipeline.append({"$match": {"$or": [
+            {"processed_at": {"$gte": since}},
+            {"processed_at": {"$gte": since_iso}},
+            {"created_at": {"$gte": since}},
+            {"created_at": {"$gte": since_iso}},
+        ]}})
+        event_match = {"_events.t": {"$ne": None, "$gte": since}}
+
+    value_expr = {
+        "$convert": {
+            "input": {"$ifNull": [
+                "$total_amount",
+                {"$ifNull": ["$total_price", {"$ifNull": ["$amount", {"$ifNull": ["$price", 0]}]}]},
+            ]},
+            "to": "double",
+            "onError": 0,
+            "onNull": 0,
+        }
+    }
+    has_preview = {"$not": [{"$in": [{"$ifNull": ["$preview_url", ""]}, [None, ""]]}]}
+    is_paid = {"$eq": ["$paid", True]}
+    is_real_order = {"$and": [
+        is_paid,
+        {"$eq": [{"$type": "$order_id"}, "string"]},
+        {"$regexMatch": {"input": "$order_id", "regex": r"^#\d+(_\d+)?$"}},
+    ]}
+
+    pipeline += [
+        {"$project": {
+            "_id": 0,
+            "locale": 1,
+            "LOC": 1,
+            "discount_code": 1,
+            "book_id": 1,
+            "_events": [
+                {"t": {"$cond": [has_preview, _safe_date("$created_at"), None]},
+                 "jobs": {"$literal": 1}, "paid": {"$literal": 0},
+                 "revenue": {"$literal": 0.0}, "orders": {"$literal": 0}},
+                {"t": {"$cond": [is_paid, _safe_date({"$ifNull": ["$processed_at", "$created_at"]}), None]},
+                 "jobs": {"$literal": 0}, "paid": {"$literal": 1},
+                 "revenue": value_expr, "orders": {"$literal": 0}},
+                {"t": {"$cond": [is_real_order, _safe_date("$processed_at"), None]},
+                 "jobs": {"$literal": 0}, "paid": {"$literal": 0},
+                 "revenue": {"$literal": 0.0}, "orders": {"$literal": 1}},
+            ],
+        }},
+        {"$unwind": "$_events"},
+        {"$match": event_match},
+        {"$group": {
+            "_id": {
+                "hour": {"$dateTrunc": {"date": "$_events.t", "unit": "hour", "timezone": "Asia/Kolkata"}},
+                "locale": "$locale",
+                "LOC": "$LOC",
+                "discount_code": "$discount_code",
+                "book_id": "$book_id",
+            },
+            "jobs": {"$sum": "$_events.jobs"},
+            "paid": {"$sum": "$_events.paid"},
+            "revenue": {"$sum": "$_events.revenue"},
+            "orders": {"$sum": "$_events.orders"},
+        }},
+    ]
+    return pipeline
+
+
+def _write_rows(src_col: Collection, rollup_col: Collection, pipeline: List[dict], run_id: str) -> None:
+    ops: List[UpdateOne] = []
+    for row in src_col.aggregate(pipeline, allowDiskUse=True):
+        key = row["_id"]
+        ops.append(UpdateOne(
+            {f: key.get(f) for f in ROLLUP_KEY_FIELDS},
+            {"$set": {
+                "jobs": int(row["jobs"]),
+                "paid": int(row["paid"]),
+                "revenue": float(row["revenue"]),
+                "orders": int(row["orders"]),
+                "loc_norm": loc_norm(key.get("locale"), key.get("LOC")),
+                "discount_code_norm": _norm(key.get("discount_code")),
+                "run_id": run_id,
+            }},
+            upsert=True,
+        ))
+        if len(ops) >= 1000:
+            rollup_col.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        rollup_col.bulk_write(ops, ordered=False)
+
+
+def refresh_rollups(
+    src_col: Collection,
+    rollup_col: Collection,
+    state_col: Collection,
+    full: bool = False,
+) -> Dict[str, object]:
+    """
+    Recompute rollup hours from (watermark - lookback) onwards plus the dirty
+    hours before that, or everything when `full` is set / no watermark exists
+    yet. Rows of recomputed hours that no longer have source docs are removed.
+    """
+    run_started = datetime.now(UTC)
+    state = state_col.find_one({"_id": ROLLUP_STATE_ID}) or {}
+    watermark = state.get("watermark")
+    dirty: List[datetime] = list(state.get("dirty_hours") or [])
+
+    since: Optional[datetime] = None
+    if not full and watermark:
+        since = ist_hour_floor(watermark - ROLLUP_LOOKBACK)
+
+    run_id = uuid.uuid4().hex
+    _write_rows(src_col, rollup_col, _events_pipeline(since), run_id)
+    stale_filter: Dict[str, object] = {"run_id": {"$ne": run_id}}
+    if since is not None:
+        stale_filter["hour"] = {"$gte": since}
+    removed = rollup_col.delete_many(stale_filter).deleted_count
+
+    older = sorted({h for h in dirty if since is not None and h.astimezone(UTC) < since})
+    if older:
+        _write_rows(src_col, rollup_col, _events_pipeline(None, hours=older), run_id)
+        removed += rollup_col.delete_many({"run_id": {"$ne": run_id}, "hour": {"$in": older}}).deleted_count
+
+    update: Dict[str, Any] = {"$set": {
+        "watermark": run_started, "refreshed_at": datetime.now(UTC), "last_full": since is None,
+    }}
+    if since is None:
+        update["$set"]["schema"] = ROLLUP_SCHEMA
+    if dirty:
+        # only what this run read; hours marked meanwhile stay for the next one
+        update["$pullAll"] = {"dirty_hours": dirty}
+    state_col.update_one({"_id": ROLLUP_STATE_ID}, update, upsert=True)
+    global _last_watermark
+    _last_watermark = run_started
+    return {"since": since, "watermark": run_started, "dirty_hours": len(older), "removed": removed}
+
+
+def rollups_ready(state_col: Collection) -> bool:
+    """True once a full build of the current ROLLUP_SCHEMA has completed."""
+    state = state_col.find_one({"_id": ROLLUP_STATE_ID}, {"watermark": 1, "schema": 1}) or {}
+    return bool(state.get("watermark")) and state.get("schema") == ROLLUP_SCHEMA
+
+
+def rollup_source_touched(fields: Iterable[str]) -> bool:
+    """Whether a $set with these (possibly dotted) keys can change rollup rows."""
+    return any(f.split(".")[0] in ROLLUP_SOURCE_FIELDS for f in fields)
+
+
+def mark_rollups_dirty(src_col: Collection, state_col: Collection, query: Dict[str, Any]) -> int:
+    """
+    Queue the rollup hours of the docs matching `query` for the next refresh.
+    Call before and after a write that may move a doc to another hour.
+    """
+    hours: Set[datetime] = set()
+    for doc in src_col.find(query, {"_id": 0, "processed_at": 1, "created_at": 1}):
+        for field in ("processed_at", "created_at"):
+            dt = parse_ts(doc.get(field))
+            if dt is not None:
+                hours.add(ist_hour_floor(dt))
+    if hours:
+        state_col.update_one(
+            {"_id": ROLLUP_STATE_ID},
+            {"$addToSet": {"dirty_hours": {"$each": sorted(hours)}}},
+            upsert=True,
+        )
+    return len(hours)
+
+
+def ensure_fresh(
+    src_col: Collection,
+    rollup_col: Collection,
+    state_col: Collection,
+    max_lag_seconds: int = ROLLUP_MAX_LAG_SECONDS,
+) -> bool:
+    """
+    Refresh incrementally when the watermark is older than `max_lag_seconds`.
+    Never builds from scratch: returns False while the rollups are not built
+    (callers fall back to the live aggregation). If another thread is already
+    refreshing, serve the current rollups as-is.
+    """
+    global _last_watermark
+    if _last_watermark and (datetime.now(UTC) - _last_watermark).total_seconds() < max_lag_seconds:
+        return True
+
+    state = state_col.find_one({"_id": ROLLUP_STATE_ID}, {"watermark": 1, "schema": 1}) or {}
+    watermark = state.get("watermark")
+    if not watermark or state.get("schema") != ROLLUP_SCHEMA:
+        return False
+    _last_watermark = watermark
+    if (datetime.now(UTC) - watermark).total_seconds() < max_lag_seconds:
+        return True
+
+    if not _refresh_lock.acquire(blocking=False):
+        return True
+    try:
+        refresh_rollups(src_col, rollup_col, state_col)
+    except Exception:
+        logger.exception("[ROLLUP] incremental refresh failed")
+    finally:
+        _refresh_lock.release()
+    return True
+
+
+def rebuild_rollups(src_col: Collection, rollup_col: Collection, state_col: Collection) -> None:
+    """Full recompute (picks up edits to old orders that the lookback window misses)."""
+    with _refresh_lock:
+        try:
+            refresh_rollups(src_col, rollup_col, state_col, full=True)
+        except Exception:
+            logger.exception("[ROLLUP] full rebuild failed")
+
+
+def window_switch(date_expr, windows: Dict[str, Tuple[datetime, datetime]]) -> dict:
+    """Aggregation expression naming the window ({name: (start, end)}) `date_expr` falls in, else null."""
+    return {"$switch": {
+        "branches": [
+            {"case": {"$and": [{"$gte": [date_expr, start]}, {"$lt": [date_expr, end]}]}, "then": name}
+            for name, (start, end) in windows.items()
+        ],
+        "default": None,
+    }}
+
+
+def rollup_match(
+    windows: Dict[str, Tuple[datetime, datetime]],
+    loc_match: Optional[dict] = None,
+    exclude_codes: Optional[List[str]] = None,
+) -> dict:
+    ands: List[dict] = [{"$or": [{"hour": {"$gte": start, "$lt": end}} for start, end in windows.values()]}]
+    exclusion = discount_exclusion(exclude_codes or [], normalized=True)
+    if exclusion:
+        ands.append(exclusion)
+    if loc_match:
+        ands.append(loc_match)
+    return {"$and": ands}
+
+
+def fetch_rollup_windows(
+    rollup_col: Collection,
+    windows: Dict[str, Tuple[datetime, datetime]],
+    granularity: str,
+    metrics: List[str],
+    loc_match: Optional[dict] = None,
+    exclude_codes: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Return {window: {bucket_label: {metric: value}}} for all windows in a single
+    aggregation. Labels are formatted like `_labels_for()`.
+    """
+    pipeline = [
+        {"$match": rollup_match(windows, loc_match, exclude_codes)},
+        {"$group": {
+            "_id": {
+                "w": window_switch("$hour", windows),
+                "b": {"$dateToString": {
+                    "format": "%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d",
+                    "date": "$hour",
+                    "timezone": "Asia/Kolkata",
+                }},
+            },
+            **{m: {"$sum": f"${m}"} for m in metrics},
+        }},
+    ]
+    out: Dict[str, Dict[str, Dict[str, float]]] = {name: {} for name in windows}
+    for r in rollup_col.aggregate(pipeline):
+        w = r["_id"].get("w")
+        if w in out:
+            out[w][r["_id"]["b"]] = {m: r[m] for m in metrics}
+    return out
@@ -0,0 +1,179 @@
+# app/stats_watermark.py
+"""
+Data watermark + conditional GET for /api/stats/*.
+
+The watermark combines
+  - `seq`: a change counter in `stats_watermark`, bumped by every write path of
+    this backend through `invalidate_stats_cache()`
+  - the newest `_id` of user_details / shipping_details (catches inserts made
+    by the storefront and other writers that don't go through this backend)
+  - a coarse time bucket of STATS_ETAG_MAX_AGE_SECONDS, so external *updates*
+    show up within the same bound as the response cache TTL
+
+main.py hands the database in with `configure_watermark(db)`. Bumps are counted
+in-process and persisted by a background thread, so `bump_watermark()` never
+waits on Mongo (it runs inside async webhook handlers); unpersisted bumps are
+part of this process's watermark until they land.
+
+`StatsETagMiddleware` (plain ASGI, so streamed responses pass through
+untouched) derives an ETag from (path, query, watermark) and answers a
+matching If-None-Match with 304 before the endpoint runs. The watermark
+itself is re-read at most every STATS_WATERMARK_POLL_SECONDS per process.
+"""
+import os
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Optional, Tuple
+
+from pymongo import DESCENDING
+from pymongo.collection import Collection
+from pymongo.database import Database
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+STATS_ETAG_MAX_AGE_SECONDS = int(os.getenv(
+    "STATS_ETAG_MAX_AGE_SECONDS", os.getenv("STATS_CACHE_TTL_SECONDS", "60")))
+STATS_WATERMARK_POLL_SECONDS = float(os.getenv("STATS_WATERMARK_POLL_SECONDS", "2"))
+WATERMARK_ID = "orders"
+
+watermark_collection: Optional[Collection] = None
+_WATCHED: Tuple[Collection, ...] = ()
+
+_lock = threading.Lock()
+_cached: Tuple[float, str, Optional[datetime]] = (0.0, "", None)
+# bumps not yet persisted, and whether a flush is queued
+_pending = 0
+_pending_since: Optional[datetime] = None
+_flush_queued = False
+_flush_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats-watermark")
+
+
+def configure_watermark(db: Database) -> None:
+    """Point the watermark at `db` (its stats_watermark, user_details and shipping_details)."""
+    global watermark_collection, _WATCHED, _cached
+    watermark_collection = db["stats_watermark"]
+    _WATCHED = (db["user_details"], db["shipping_details"])
+    with _lock:
+        _cached = (0.0, "", None)
+
+
+def bump_watermark() -> None:
+    """Record a write; called from `invalidate_stats_cache()`. Never blocks on Mongo."""
+    global _cached, _pending, _pending_since, _flush_queued
+    with _lock:
+        _pending += 1
+        _pending_since = _pending_since or datetime.now(timezone.utc)
+        _cached = (0.0, "", None)
+        queue, _flush_queued = not _flush_queued, True
+    if queue:
+        _flush_pool.submit(_flush)
+
+
+def _flush() -> None:
+    """Persist the pending bumps as one $inc; they stay pending (and counted) on failure."""
+    global _cached, _pending, _pending_since, _flush_queued
+    with _lock:
+        _flush_queued = False
+        n = _pending
+    if not n or watermark_collection is None:
+        return
+    try:
+        watermark_collection.update_one(
+            {"_id": WATERMARK_ID},
+            {"$inc": {"seq": n}, "$currentDate": {"updated_at": True}},
+            upsert=True,
+        )
+    except Exception:
+        # retried with the next bump; the time bucket bounds how long other processes lag
+        logger.exception("[WATERMARK] bump failed")
+        return
+    with _lock:
+        _pending -= n
+        if not _pending:
+            _pending_since = None
+        _cached = (0.0, "", None)
+
+
+def current_watermark() -> Tuple[str, Optional[datetime]]:
+    """(watermark string, last recorded write time) – cheap, re-read every few seconds."""
+    global _cached
+    now = time.monotonic()
+    read_at, value, updated_at = _cached
+    if value and now - read_at < STATS_WATERMARK_POLL_SECONDS:
+        return value, updated_at
+
+    with _lock:
+        pending, pending_since = _pending, _pending_since
+    parts = [str(int(time.time()) // max(STATS_ETAG_MAX_AGE_SECONDS, 1))]
+    updated_at = pending_since
+    try:
+        if watermark_collection is None:
+            raise RuntimeError("configure_watermark() has not been called")
+        doc = watermark_collection.find_one({"_id": WATERMARK_ID}) or {}
+        parts.append(str(doc.get("seq", 0) + pending))
+        updated_at = max(filter(None, (doc.get("updated_at"), pending_since)), default=None)
+        for col in _WATCHED:
+            newest = col.find_one({}, {"_id": 1}, sort=[("_id", DESCENDING)])
+            parts.append(str(newest["_id"]) if newest else "-")
+    except Exception:
+        logger.exception("[WATERMARK] read failed")
+        parts.append(str(now))  # never produce a matching ETag on errors
+
+    value = ":".join(parts)
+    with _lock:
+        _cached = (now, value, updated_at)
+    return value, updated_at
+
+
+def stats_etag(path: str, query: str, watermark: str) -> str:
+    params = "&".join(sorted(query.split("&"))) if query else ""
+    digest = hashlib.sha1(f"{path}?{params}|{watermark}".encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = {c.strip() for c in header.split(",")}
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+class StatsETagMiddleware:
+    """Conditional GET for the /api/stats/* routes."""
+
+    def __init__(self, app: ASGIApp, prefix: str = "/api/stats/", exclude: Tuple[str, ...] = ("/api/stats/cache",)):
+        self.app = app
+        self.prefix = prefix
+        self.exclude = exclude
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if (scope["type"] != "http" or scope["method"] != "GET"
+                or not path.startswith(self.prefix) or path in self.exclude):
+            await self.app(scope, receive, send)
+            return
+
+        watermark, updated_at = await run_in_threadpool(current_watermark)
+        etag = stats_etag(path, scope.get("query_string", b"").decode("latin-1"), watermark)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if updated_at:
+            headers["Last-Modified"] = format_datetime(updated_at.astimezone(timezone.utc), usegmt=True)
+
+        if _etag_matches(Headers(scope=scope).get("if-none-match", ""), etag):
+            await Response(status_code=304, headers=headers)(scope, receive, send)
+            return
+
+        async def send_with_etag(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] == 200:
+                message.setdefault("headers", [])
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
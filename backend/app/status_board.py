@@ -0,0 +1,292 @@
+# app/status_board.py
+"""
+Columnar engine behind /api/stats/ship-status-v2 and /api/stats/order-status.
+
+Both boards bucket the paid orders of a processed_at window by IST day and
+classify `current_status`. The window is fetched once into NumPy arrays
+(`StatusFrame`, cached in `frame_cache` per window + loc) and both endpoints
+slice it; printer / cancelled filters are masks on the cached frame.
+
+Status strings are classified through a lookup table built over the distinct
+normalized values of the frame, so the substring rules run once per distinct
+status rather than once per order.
+"""
+import base64
+import json
+import zlib
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo.collection import Collection
+
+from app.order_timestamps import raw_date
+from app.stats_cache import frame_cache
+
+DAY_MS = 86_400_000
+IST_OFFSET_MS = 19_800_000  # +05:30
+
+BOARD_EXCLUDE_CODES = ("TEST", "COLLAB", "REJECTED", "TINA")
+PRINT_PARTNERS = ("genesis", "yara")
+
+SHIP_COLUMNS = ("new", "pickup_exception", "out_for_pickup", "delivered", "issue", "shipped")
+ORDER_COLUMNS = ("new", "delivered", "shipped")
+TERMINAL_ORDER_STATUSES = ("cancelled", "rejected", "refunded", "reprint")
+
+_PROJECT = {
+    "_id": 0,
+    "order_id": 1,
+    "printer": 1,
+    "discount_code": 1,
+    "current_status": 1,
+    "order_status": 1,
+    "p": {"$toLong": "$processed_at_dt"},
+}
+# until processed_at_dt is backfilled
+_RAW_PROJECT = {**_PROJECT, "p": {"$toLong": raw_date("processed_at")}}
+
+
+def classify_ship_status(status: str) -> str:
+    if not status:
+        return "new"
+    if "pickup exception" in status:
+        return "pickup_exception"
+    if "out for pickup" in status:
+        return "out_for_pickup"
+    if "delivered" in status:
+        return "delivered"
+    if "issue" in status or "rto" in status or "undelivered" in status:
+        return "issue"
+    return "shipped"
+
+
+def classify_order_status(status: str) -> str:
+    if not status:
+        return "new"
+    if "delivered" in status:
+        return "delivered"
+    return "shipped"
+
+
+def _norm(values: np.ndarray) -> np.ndarray:
+    return np.char.lower(np.char.strip(values.astype(str)))
+
+
+def status_codes(statuses: np.ndarray, classify: Callable[[str], str], columns: Sequence[str]) -> np.ndarray:
+    """Column index of each status, via a lookup table over the distinct values."""
+    distinct, inverse = np.unique(statuses, return_inverse=True)
+    table = np.array([columns.index(classify(str(s))) for s in distinct], dtype=np.int64)
+    return table[inverse] if len(statuses) else np.empty(0, dtype=np.int64)
+
+
+class StatusFrame:
+    """One row per order in the window; columns are NumPy arrays of equal length."""
+
+    def __init__(self, order_id: np.ndarray, day: np.ndarray, printer: np.ndarray,
+                 status: np.ndarray, order_status: np.ndarray):
+        self.order_id = order_id
+        self.day = day
+        self.printer = printer
+        self.status = status
+        self.order_status = order_status
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], exclude_codes: Sequence[str] = BOARD_EXCLUDE_CODES) -> "StatusFrame":
+        rows = [r for r in rows if r.get("p") is not None]
+        n = len(rows)
+
+        def col(field: str) -> np.ndarray:
+            out = np.empty(n, dtype=object)
+            out[:] = [r.get(field) or "" for r in rows]
+            return out
+
+        order_id = np.empty(n, dtype=object)
+        order_id[:] = [r.get("order_id") for r in rows]
+        codes = np.char.upper(np.char.strip(col("discount_code").astype(str)))
+        keep = ~np.isin(codes, list(exclude_codes))
+        p = np.fromiter((r["p"] for r in rows), dtype=np.int64, count=n)
+        return cls(
+            order_id=order_id[keep],
+            day=((p + IST_OFFSET_MS) // DAY_MS)[keep],
+            printer=_norm(col("printer"))[keep],
+            status=_norm(col("current_status"))[keep],
+            order_status=_norm(col("order_status"))[keep],
+        )
+
+    def select(self, mask: np.ndarray) -> "StatusFrame":
+        return StatusFrame(self.order_id[mask], self.day[mask], self.printer[mask],
+                           self.status[mask], self.order_status[mask])
+
+    def for_printer(self, printer: Optional[str]) -> "StatusFrame":
+        if not printer or printer.lower() in ("all", ""):
+            return self
+        return self.select(self.printer == printer.lower())
+
+    def without_cancelled_or_refunded(self) -> "StatusFrame":
+        """ship-status-v2 population: neither status mentions cancelled/refunded."""
+        drop = np.zeros(len(self), dtype=bool)
+        for values in (self.status, self.order_status):
+            for word in ("cancelled", "refunded"):
+                drop |= np.char.find(values.astype(str), word) >= 0
+        return self.select(~drop) if drop.any() else self
+
+
+def load_status_frame(
+    col: Collection, match: Dict[str, Any], cache_key: Hashable, derived: bool = True,
+) -> StatusFrame:
+    """Fetch (or reuse from `frame_cache`) the frame for `match`; `derived=False` reads raw processed_at."""
+    key = ("status_frame", cache_key, derived)
+    hit, frame = frame_cache.get(key)
+    if hit:
+        return frame
+    generation = frame_cache.generation
+    project = _PROJECT if derived else _RAW_PROJECT
+    rows = list(col.aggregate([{"$match": match}, {"$project": project}]))
+    frame = StatusFrame.from_rows(rows)
+    frame_cache.set(key, frame, generation=generation)
+    return frame
+
+
+def _label_day(label: str) -> int:
+    return int(np.datetime64(label.split(" ")[0], "D").astype(np.int64))
+
+
+def _rows_by_day(frame: StatusFrame, labels: Sequence[str]) -> Tuple[StatusFrame, Dict[int, np.ndarray]]:
+    """Restrict to label days; return positions of each day (cursor order kept)."""
+    label_days = np.array([_label_day(lbl) for lbl in labels], dtype=np.int64)
+    frame = frame.select(np.isin(frame.day, label_days))
+    order = np.argsort(frame.day, kind="stable")
+    days, starts = np.unique(frame.day[order], return_index=True)
+    groups = np.split(order, starts[1:]) if len(order) else []
+    return frame, dict(zip(days.tolist(), groups))
+
+
+SHIP_ROW_COLUMNS = ("unapproved", "sent_to_print", "new", "out_for_pickup",
+                    "pickup_exception", "shipped", "delivered", "issue")
+ORDER_ROW_COLUMNS = ("unapproved", "sent_to_print", "new", "shipped", "delivered",
+                     "cancelled", "rejected", "refunded", "reprint")
+BOARD_COLUMNS = {"ship": SHIP_ROW_COLUMNS, "order": ORDER_ROW_COLUMNS}
+
+
+def _column_masks(frame: StatusFrame, board: str) -> Dict[str, np.ndarray]:
+    """Boolean mask per row column over the whole frame."""
+    printer = frame.printer
+    if board == "ship":
+        codes = status_codes(frame.status, classify_ship_status, SHIP_COLUMNS)
+        return {
+            "unapproved": printer == "",
+            "sent_to_print": np.isin(printer, PRINT_PARTNERS),
+            **{name: codes == j for j, name in enumerate(SHIP_COLUMNS)},
+        }
+    # order-status: terminal order_status first, then the shipping columns
+    codes = status_codes(frame.status, classify_order_status, ORDER_COLUMNS)
+    live = ~np.isin(frame.order_status, TERMINAL_ORDER_STATUSES)
+    return {
+        "unapproved": live & (printer == ""),
+        "sent_to_print": live & np.isin(printer, PRINT_PARTNERS),
+        **{name: live & (codes == j) for j, name in enumerate(ORDER_COLUMNS)},
+        **{name: frame.order_status == name for name in TERMINAL_ORDER_STATUSES},
+    }
+
+
+def _board_rows(frame: StatusFrame, labels: Sequence[str], board: str, include_ids: bool) -> List[Dict[str, Any]]:
+    frame, by_day = _rows_by_day(frame, labels)
+    masks = _column_masks(frame, board)
+    empty = np.empty(0, dtype=np.int64)
+
+    rows = []
+    for lbl in labels:
+        idx = by_day.get(_label_day(lbl), empty)
+        row: Dict[str, Any] = {"date": lbl.split(" ")[0], "total": len(idx)}
+        for name in BOARD_COLUMNS[board]:
+            hit = idx[masks[name][idx]]
+            row[name] = len(hit)
+            if include_ids:
+                row[f"{name}_ids"] = frame.order_id[hit].tolist()
+        rows.append(row)
+    return rows
+
+
+def _pending_by_age(frame: StatusFrame, labels: Sequence[str], today_day: int) -> Tuple[np.ndarray, np.ndarray]:
+    """(ages, order_ids) of pending orders sorted by age: not (exactly) delivered, not on Cloudprinter."""
+    frame, _ = _rows_by_day(frame, labels)
+    age = today_day - frame.day
+    pending = (frame.status != "delivered") & (frame.printer != "cloudprinter") & (age >= 0)
+    ages, ids = age[pending], frame.order_id[pending]
+    order = np.argsort(ages, kind="stable")
+    return ages[order], ids[order]
+
+
+def ship_status_board(
+    frame: StatusFrame, labels: Sequence[str], today_day: int, include_ids: bool = False,
+) -> Dict[str, Any]:
+    """rows + pending_age_chart for ship-status-v2."""
+    rows = _board_rows(frame, labels, "ship", include_ids)
+
+    ages, ids = _pending_by_age(frame, labels, today_day)
+    chart = []
+    lo_age, hi_age = (int(ages.min()), int(ages.max())) if len(ages) else (0, 0)
+    for a in range(lo_age, hi_age + 1):
+        lo, hi = np.searchsorted(ages, [a, a + 1])
+        entry: Dict[str, Any] = {"label": f"{a} days", "age": a, "value": int(hi - lo)}
+        if include_ids:
+            entry["order_ids"] = ids[lo:hi].tolist()
+        chart.append(entry)
+
+    return {"rows": rows, "pending_age_chart": chart}
+
+
+def order_status_board(frame: StatusFrame, labels: Sequence[str], include_ids: bool = False) -> List[Dict[str, Any]]:
+    """rows for order-status."""
+    return _board_rows(frame, labels, "order", include_ids)
+
+
+def board_column_ids(
+    frame: StatusFrame,
+    board: str,
+    labels: Sequence[str],
+    column: str,
+    date: Optional[str] = None,
+    age: Optional[int] = None,
+    today_day: Optional[int] = None,
+) -> List[Any]:
+    """Order ids behind one cell: (date, column) of a row, or the `pending_age` bucket `age`."""
+    if column == "pending_age":
+        if board != "ship" or age is None or today_day is None:
+            raise ValueError("pending_age needs a ship-status token and an age")
+        ages, ids = _pending_by_age(frame, labels, today_day)
+        lo, hi = np.searchsorted(ages, [age, age + 1])
+        return ids[lo:hi].tolist()
+    if column not in BOARD_COLUMNS[board]:
+        raise ValueError(f"unknown column {column!r}")
+    if not date:
+        raise ValueError("date is required")
+    day_labels = [lbl for lbl in labels if lbl.split(" ")[0] == date]
+    if not day_labels:
+        return []
+    frame, by_day = _rows_by_day(frame, day_labels)
+    idx = by_day.get(_label_day(date), np.empty(0, dtype=np.int64))
+    return frame.order_id[idx[_column_masks(frame, board)[column][idx]]].tolist()
+
+
+# ---------------------------------------------------------------------------
+# drill-down tokens
+# ---------------------------------------------------------------------------
+
+def encode_drilldown_token(params: Dict[str, Any]) -> str:
+    """Opaque, URL-safe handle for the board parameters a drill-down needs to rebuild its frame."""
+    raw = json.dumps(params, separators=(",", ":"), sort_keys=True, default=str).encode()
+    return base64.urlsafe_b64encode(zlib.compress(raw)).decode().rstrip("=")
+
+
+def decode_drilldown_token(token: str) -> Dict[str, Any]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        params = json.loads(zlib.decompress(base64.urlsafe_b64decode(padded.encode())))
+    except Exception as exc:
+        raise ValueError("invalid drill-down token") from exc
+    if not isinstance(params, dict) or params.get("board") not in BOARD_COLUMNS:
+        raise ValueError("invalid drill-down token")
+    return params
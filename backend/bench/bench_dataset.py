@@ -0,0 +1,275 @@
+# bench/bench_dataset.py
+"""
+Synthetic user_details / shipping_details for performance work.
+
+Produces documents shaped like the storefront's at a configurable scale:
+
+  - unpaid preview jobs next to paid orders (`#1234`, split books `#1234_1`)
+  - processed_at / created_at / current_timestamp_iso written as a mix of ISO
+    strings (IST and Z offsets) and BSON datetimes
+  - locales (incl. missing / empty `locale` and legacy `LOC`), discount codes
+    (incl. the excluded TEST / REJECTED / TINA / COLLAB), printers, statuses
+  - reprints (`reprint_order_id` + `reprint_meta`)
+  - shipping_details with Shiprocket scan arrays ending in the current label
+
+Names, emails and addresses come from Faker through a fixed-size pool, so 1M
+orders don't pay for 1M Faker calls; the same seed gives the same dataset.
+
+Only ever writes to a local mongod unless --allow-remote is passed:
+
+    MONGO_URI=mongodb://localhost:27017 python -m bench.bench_dataset 100000
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from faker import Faker
+from pymongo.database import Database
+
+logger = logging.getLogger(__name__)
+
+UTC = timezone.utc
+IST = timezone(timedelta(hours=5, minutes=30))
+
+DATASET_DAYS = 180
+ORDER_ID_BASE = 100000
+POOL_SIZE = 5000
+BATCH_SIZE = 5000
+
+LOCALES = (("IN", 70), ("US", 8), ("GB", 5), ("AE", 4), ("CA", 3), ("", 4), (None, 6))
+DISCOUNT_CODES = (
+    (None, 60), ("", 10), ("WELCOME10", 8), ("DIWALI20", 6), ("FIRSTBOOK", 5),
+    ("TEST", 4), ("COLLAB", 3), ("REJECTED", 2), ("TINA", 2),
+)
+PRINTERS = (("Genesis", 55), ("Yara", 30), ("Cloudprinter", 5), (None, 10))
+BOOK_STYLES = ("hardcover", "paperback", "premium")
+
+# (current_status, weight, scan labels leading up to it)
+STATUS_FLOW = (
+    ("", 12, ()),
+    ("PICKUP EXCEPTION", 2, ("NEW", "PICKUP EXCEPTION")),
+    ("OUT FOR PICKUP", 4, ("NEW", "OUT FOR PICKUP")),
+    ("PICKED UP", 6, ("NEW", "OUT FOR PICKUP", "PICKED UP")),
+    ("IN TRANSIT", 14, ("NEW", "OUT FOR PICKUP", "PICKED UP", "IN TRANSIT")),
+    ("REACHED AT DESTINATION HUB", 5, ("NEW", "PICKED UP", "IN TRANSIT", "REACHED AT DESTINATION HUB")),
+    ("OUT FOR DELIVERY", 6, ("NEW", "PICKED UP", "IN TRANSIT", "OUT FOR DELIVERY")),
+    ("DELIVERED", 42, ("NEW", "PICKED UP", "IN TRANSIT", "OUT FOR DELIVERY", "DELIVERED")),
+    ("Delivered", 3, ("NEW", "PICKED UP", "IN TRANSIT", "Delivered")),
+    ("UNDELIVERED", 2, ("NEW", "PICKED UP", "IN TRANSIT", "UNDELIVERED")),
+    ("RTO INITIATED", 2, ("NEW", "PICKED UP", "IN TRANSIT", "UNDELIVERED", "RTO INITIATED")),
+    ("Cancelled", 2, ()),
+)
+ORDER_STATUSES = ((None, 90), ("cancelled", 3), ("rejected", 2), ("refunded", 2), ("reprint", 3))
+
+PAID_RATIO = 0.85
+SPLIT_RATIO = 0.04
+REPRINT_RATIO = 0.02
+
+
+def _weighted(rng: random.Random, table) -> Any:
+    values = [row[0] for row in table]
+    weights = [row[1] for row in table]
+    return rng.choices(values, weights=weights, k=1)[0]
+
+
+def _as_stored(rng: random.Random, dt: datetime) -> Any:
+    """The same instant the way the storefront might have written it."""
+    r = rng.random()
+    if r < 0.4:
+        return dt
+    if r < 0.85:
+        return dt.astimezone(IST).isoformat()
+    return dt.astimezone(UTC).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class _Pool:
+    """Faker values drawn once and reused."""
+
+    def __init__(self, seed: int, size: int = POOL_SIZE):
+        fake = Faker(["en_IN", "en_US", "en_GB"])
+        fake.seed_instance(seed)
+        self.people: List[Tuple[str, str, Dict[str, Any]]] = []
+        for _ in range(size):
+            name = fake.name()
+            email = fake.email()
+            address = {
+                "address1": fake.street_address(),
+                "city": fake.city(),
+                "province": fake.state() if hasattr(fake, "state") else "",
+                "zip": fake.postcode(),
+                "phone": fake.phone_number(),
+            }
+            self.people.append((name, email, address))
+
+
+def _order_docs(
+    i: int, rng: random.Random, pool: _Pool, now: datetime,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """user_details (1 job, or 2 for a split order) and shipping_details for order number i."""
+    name, email, address = pool.people[rng.randrange(len(pool.people))]
+    created = now - timedelta(seconds=rng.randrange(DATASET_DAYS * 86400))
+    locale = _weighted(rng, LOCALES)
+    base: Dict[str, Any] = {
+        "job_id": str(uuid.UUID(int=rng.getrandbits(128))),
+        "email": email,
+        "name": name,
+        "user_name": name,
+        "book_id": f"book-{rng.randrange(1, 40)}",
+        "book_style": rng.choice(BOOK_STYLES),
+        "preview_url": f"https://example.invalid/previews/{i}.pdf",
+        "created_at": _as_stored(rng, created),
+    }
+    if locale is not None:
+        # older docs only carry the legacy LOC field
+        base["locale" if rng.random() < 0.8 else "LOC"] = locale
+
+    if rng.random() >= PAID_RATIO:
+        return [{**base, "paid": False}], []
+
+    processed = created + timedelta(minutes=rng.randrange(5, 3 * 24 * 60))
+    if processed > now:
+        processed = now
+    status, _, labels = STATUS_FLOW[
+        rng.choices(range(len(STATUS_FLOW)), weights=[s[1] for s in STATUS_FLOW], k=1)[0]
+    ]
+    printer = _weighted(rng, PRINTERS)
+    if printer is None:
+        status, labels = "", ()
+    order_id = f"#{ORDER_ID_BASE + i}"
+    price = rng.choice((1499, 1999, 2499, 2999))
+
+    # each scan a few hours to a couple of days after the previous one
+    # (recent orders haven't got that far yet: stop at `now`)
+    scans, at, last_scan_at = [], processed + timedelta(hours=rng.randrange(12, 72)), None
+    for label in labels:
+        at += timedelta(hours=rng.randrange(2, 48))
+        if at > now:
+            break
+        scans.append({"sr-status-label": label, "date": at.astimezone(IST).strftime("%Y-%m-%d %H:%M:%S")})
+        last_scan_at = at
+    if labels and len(scans) < len(labels):
+        status = scans[-1]["sr-status-label"] if scans else ""
+        labels = labels[:len(scans)]
+
+    order: Dict[str, Any] = {
+        **base,
+        "paid": True,
+        "order_id": order_id,
+        "processed_at": _as_stored(rng, processed),
+        "discount_code": _weighted(rng, DISCOUNT_CODES),
+        "total_price": str(price) if rng.random() < 0.5 else price,
+        "printer": printer,
+        "print_status": f"sent_to_{printer.lower()}" if printer else None,
+        "current_status": status,
+        "shipping_address": address,
+    }
+    order_status = _weighted(rng, ORDER_STATUSES)
+    if order_status:
+        order["order_status"] = order_status
+    if last_scan_at:
+        order["current_timestamp_iso"] = _as_stored(rng, last_scan_at)
+    if rng.random() < REPRINT_RATIO:
+        order["reprint_order_id"] = f"{order_id}_RP1"
+        order["reprint_meta"] = {"RP1": {"printer": printer or "Genesis", "reason": "print defect"}}
+
+    orders = [order]
+    if rng.random() < SPLIT_RATIO:
+        orders.append({
+            **order,
+            "job_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "order_id": f"{order_id}_1",
+            "book_id": f"book-{rng.randrange(1, 40)}",
+        })
+
+    shipments = []
+    if scans:
+        for o in orders:
+            shipments.append({
+                "order_id": o["order_id"],
+                "awb_code": str(rng.randrange(10**11, 10**12)),
+                "shiprocket_data": {
+                    "sr_order_id": rng.randrange(10**8, 10**9),
+                    "current_status": labels[-1],
+                    "current_timestamp_iso": last_scan_at.isoformat(),
+                    "scans": scans,
+                },
+            })
+    return orders, shipments
+
+
+def generate(n: int, seed: int = 7, now: Optional[datetime] = None) -> Iterator[Tuple[List[dict], List[dict]]]:
+    """Yield (user_details, shipping_details) batches for `n` order numbers."""
+    rng = random.Random(seed)
+    pool = _Pool(seed)
+    now = now or datetime.now(UTC).replace(microsecond=0)
+    users: List[dict] = []
+    ships: List[dict] = []
+    for i in range(n):
+        u, s = _order_docs(i, rng, pool, now)
+        users.extend(u)
+        ships.extend(s)
+        if len(users) >= BATCH_SIZE:
+            yield users, ships
+            users, ships = [], []
+    if users or ships:
+        yield users, ships
+
+
+def populate(db: Database, n: int, seed: int = 7, drop: bool = True) -> Dict[str, int]:
+    """
+    Load `n` order numbers into db.user_details / db.shipping_details, then build
+    what the stats endpoints expect to exist: indexes, typed timestamps, rollups.
+    """
+    from app.indexes import ensure_indexes
+    from app.order_timestamps import backfill_order_timestamps
+    from app.stats_rollup import rebuild_rollups
+
+    users_col, ships_col = db["user_details"], db["shipping_details"]
+    if drop:
+        for name in ("user_details", "shipping_details", "order_rollups_hourly",
+                     "stats_rollup_state", "production_kpi_counters"):
+            db.drop_collection(name)
+
+    counts = {"user_details": 0, "shipping_details": 0}
+    for users, ships in generate(n, seed):
+        if users:
+            counts["user_details"] += len(users_col.insert_many(users, ordered=False).inserted_ids)
+        if ships:
+            counts["shipping_details"] += len(ships_col.insert_many(ships, ordered=False).inserted_ids)
+
+    ensure_indexes(db)
+    backfill_order_timestamps(users_col)
+    rebuild_rollups(users_col, db["order_rollups_hourly"], db["stats_rollup_state"])
+    return counts
+
+
+def assert_local(uri: str) -> None:
+    host = urlparse(uri).hostname or ""
+    if host not in ("localhost", "127.0.0.1", "::1") and not host.endswith(".local"):
+        raise SystemExit(f"refusing to write a benchmark dataset to {host!r}; pass --allow-remote")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("orders", type=int, nargs="?", default=100000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--append", action="store_true", help="keep existing documents")
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    uri = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+    if not args.allow_remote:
+        assert_local(uri)
+    _db = MongoClient(uri, tz_aware=True)["candyman"]
+    print(populate(_db, args.orders, seed=args.seed, drop=not args.append), file=sys.stderr)
@@ -0,0 +1,125 @@
+# bench/bench_detail.py
+"""
+Per-order detail latency benchmark (`_build_order_response`) against the
+configured MongoDB and S3.
+
+It samples `--orders` paid orders with a job_id and times the whole sample
+`--repeat` times in four modes:
+
+  cold_clients   AWS client registry and presign cache cleared before every
+                 sample – a lower bound of the per-call client builds of old
+                 (up to four clients per detail)
+  warm_clients   clients reused, presign cache cleared – HEAD + local signing
+  warm_cache     nothing cleared – repeat opens of the same orders
+  stored_cover   as warm_clients, but the docs carry `cover_image_key`, so the
+                 generations listing is skipped
+
+The first three run on docs without `cover_image_key` (the listing fallback).
+The benchmark is read-only: storing discovered cover keys is disabled for
+the run. It refuses a non-local MONGO_URI unless --allow-remote is passed.
+It reports p50 / p95 per order, plus the cost of building one S3 client:
+
+    python -m bench.bench_detail --orders 20 --repeat 5
+"""
+import os
+import time
+import logging
+import argparse
+from typing import Any, Dict, List
+
+from app.aws_clients import aws_client, clear_aws_clients
+from app.cover_keys import COVER_KEY_FIELD, find_cover_key, generations_bucket
+from app.presign_cache import presign_cache
+from bench.bench_dataset import assert_local
+from bench.bench_stats import time_case
+
+logger = logging.getLogger(__name__)
+
+
+def sample_orders(col, n: int) -> List[Dict[str, Any]]:
+    return list(col.aggregate([
+        {"$match": {"paid": True, "job_id": {"$nin": [None, ""]}}},
+        {"$sample": {"size": n}},
+    ]))
+
+
+def client_construction_ms(repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        clear_aws_clients()
+        t0 = time.perf_counter()
+        aws_client("s3")
+        samples.append(1000 * (time.perf_counter() - t0))
+    return round(sorted(samples)[len(samples) // 2], 2)
+
+
+def with_cover_keys(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of `docs` with `cover_image_key` filled in from one listing per job."""
+    bucket = generations_bucket()
+    s3 = aws_client("s3")
+    keys: Dict[str, Any] = {}
+    for doc in docs:
+        if doc["job_id"] not in keys:
+            keys[doc["job_id"]] = find_cover_key(s3, bucket, doc["job_id"]) if bucket else None
+    return [{**doc, COVER_KEY_FIELD: keys[doc["job_id"]]} if keys[doc["job_id"]] else doc for doc in docs]
+
+
+def run(orders: int, repeat: int) -> Dict[str, Any]:
+    import main
+
+    # read-only: the listing fallback would otherwise persist cover keys
+    main.remember_cover_key = lambda *a, **k: None
+
+    sampled = sample_orders(main.orders_collection, orders)
+    if not sampled:
+        raise SystemExit("no paid orders with a job_id to sample")
+    listing_docs = [{k: v for k, v in doc.items() if k != COVER_KEY_FIELD} for doc in sampled]
+    stored_docs = with_cover_keys(listing_docs)
+
+    def detail_all(docs):
+        def go():
+            for doc in docs:
+                main._build_order_response(doc)
+        return go
+
+    def cold():
+        clear_aws_clients()
+        presign_cache.clear()
+
+    modes = {
+        "cold_clients": (listing_docs, cold),
+        "warm_clients": (listing_docs, presign_cache.clear),
+        "warm_cache": (listing_docs, lambda: None),
+        "stored_cover": (stored_docs, presign_cache.clear),
+    }
+    detail_all(listing_docs)()  # warm-up: Mongo pool, lazy imports, credential resolution
+    results: Dict[str, Any] = {
+        "orders": len(sampled),
+        "with_cover_key": sum(COVER_KEY_FIELD in d for d in stored_docs),
+        "s3_client_build_ms": client_construction_ms(repeat),
+    }
+    for name, (docs, clear) in modes.items():
+        r = time_case(detail_all(docs), repeat, clear)
+        results[name] = {
+            "p50_ms_per_order": round(r["p50_ms"] / len(docs), 2),
+            "p95_ms_per_order": round(r["p95_ms"] / len(docs), 2),
+        }
+        logger.info("[BENCH] %-13s %s", name, results[name])
+    return results
+
+
+if __name__ == "__main__":
+    import json
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--orders", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+    if not args.allow_remote:
+        assert_local(os.getenv("MONGO_URI", ""))
+    print(json.dumps(run(args.orders, args.repeat), indent=2))
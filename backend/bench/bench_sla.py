@@ -0,0 +1,106 @@
+# bench/bench_sla.py
+"""
+Offline benchmark of the columnar SLA engine (app/sla_engine.py) against the
+per-document loops it replaced, on synthetic rows shaped like its $project
+output. Both sides must agree on the summary and latency totals:
+
+    python -m bench.bench_sla 100000 1000000
+"""
+import sys
+import time
+import resource
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.sla_engine import (
+    DAY_MS,
+    LATENCY_BUCKETS,
+    SLA_DAYS,
+    SlaFrame,
+    cohort_summary,
+    latency_cohorts,
+    sla_summary,
+    weekly_sla_stats,
+)
+
+
+def synthetic_rows(n: int, seed: int = 7) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    start = 1_735_689_600_000  # 2025-01-01T00:00Z
+    processed = start + rng.integers(0, 90 * DAY_MS, n)
+    lag = rng.integers(1 * DAY_MS, 14 * DAY_MS, n)
+    statuses = np.array(["DELIVERED", "IN TRANSIT", "OUT FOR DELIVERY", "NEW", "Delivered"])
+    status = statuses[rng.integers(0, len(statuses), n)]
+    codes = np.array(["", "", "", "WELCOME10", "TEST"])
+    code = codes[rng.integers(0, len(codes), n)]
+    has_ts = rng.random(n) < 0.9
+    return [
+        {
+            "order_id": f"#{100000 + i}",
+            "current_status": str(status[i]),
+            "discount_code": str(code[i]),
+            "p": int(processed[i]),
+            "dlv": int(processed[i] + lag[i]) if has_ts[i] else None,
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_summary_and_latency(rows: List[Dict[str, Any]], exclude: set) -> tuple:
+    # the per-document loops the endpoints used before app/sla_engine.py
+    ist = timezone(timedelta(hours=5, minutes=30))
+    delivered = undelivered = 0
+    buckets: Dict[str, Dict[str, int]] = {}
+    for r in rows:
+        if (r.get("discount_code") or "").upper() in exclude:
+            continue
+        p = datetime.fromtimestamp(r["p"] / 1000, tz=timezone.utc)
+        dlv = datetime.fromtimestamp(r["dlv"] / 1000, tz=timezone.utc) if r.get("dlv") is not None else None
+        day = p.astimezone(ist).strftime("%Y-%m-%d")
+        c = buckets.setdefault(day, {"total": 0, "delivered": 0, **{b: 0 for b in LATENCY_BUCKETS}})
+        c["total"] += 1
+        status = (r.get("current_status") or "").strip().upper()
+        if status == "DELIVERED" and dlv:
+            days = (dlv - p).days
+            c["delivered"] += 1
+            c[LATENCY_BUCKETS[min(max(days, 3), 10) - 3]] += 1
+            if days <= SLA_DAYS:
+                delivered += 1
+                continue
+        undelivered += 1
+    return {"delivered_within_8_days": delivered, "total_orders": delivered + undelivered}, buckets
+
+
+def bench(n: int) -> None:
+    rows = synthetic_rows(n)
+    exclude = ("TEST", "REJECTED", "TINA")
+
+    t0 = time.perf_counter()
+    frame = SlaFrame.from_rows(rows, exclude).without_excluded()
+    t1 = time.perf_counter()
+    summary = sla_summary(frame)
+    latency = latency_cohorts(frame)
+    cohort_summary(frame)
+    weekly_sla_stats(frame)
+    frame.iso_weeks()
+    t2 = time.perf_counter()
+    legacy_summary, legacy_buckets = legacy_summary_and_latency(rows, set(exclude))
+    t3 = time.perf_counter()
+
+    assert summary["delivered_within_8_days"] == legacy_summary["delivered_within_8_days"]
+    assert summary["total_orders"] == legacy_summary["total_orders"]
+    assert latency[-1]["delivered_orders"] == sum(b["delivered"] for b in legacy_buckets.values())
+
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(
+        f"n={n:>9,}  frame build {1000 * (t1 - t0):8.1f} ms  "
+        f"vectorized stats {1000 * (t2 - t1):7.1f} ms  "
+        f"legacy loops {1000 * (t3 - t2):8.1f} ms  max RSS {rss_mb:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    for arg in sys.argv[1:] or ["100000", "1000000"]:
+        bench(int(arg))
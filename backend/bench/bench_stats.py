@@ -0,0 +1,201 @@
+# bench/bench_stats.py
+"""
+Benchmark runner for the /api/stats/* handlers and their shared helpers.
+
+For every scale (default 10k / 100k / 1M order numbers) it loads a fresh
+dataset from `bench.bench_dataset` into a local mongod, then times each case
+`--repeat` times with the stats cache cleared before every call, so each
+sample is a full recomputation (ETag middleware and response cache excluded).
+
+Per case it records p50 / p95 wall time and the process' peak RSS (high-water
+mark, plus how much the case itself grew it), writes the results as JSON and
+compares them with a stored baseline:
+
+    MONGO_URI=mongodb://localhost:27017 python -m bench.bench_stats --save-baseline
+    MONGO_URI=mongodb://localhost:27017 python -m bench.bench_stats --scales 10000 100000
+
+A case regresses when its p95 exceeds the baseline by more than --threshold
+(and by more than STATS_BENCH_NOISE_MS); the exit status is 1 if any did.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import inspect
+import logging
+import argparse
+import resource
+import statistics
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bench.bench_dataset import assert_local
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+STATS_BENCH_BASELINE = os.getenv("STATS_BENCH_BASELINE", "stats_bench_baseline.json")
+STATS_BENCH_NOISE_MS = float(os.getenv("STATS_BENCH_NOISE_MS", "5"))
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _endpoint(fn: Callable, **kwargs) -> Callable[[], Any]:
+    """
+    Call an endpoint outside FastAPI: unwrap `@cached_stats` and fill every
+    parameter not given in `kwargs` with its Query(...) default.
+    """
+    target = getattr(fn, "__wrapped__", fn)
+    for name, param in inspect.signature(target).parameters.items():
+        if name in kwargs:
+            continue
+        default = param.default
+        if default is inspect.Parameter.empty or getattr(default, "is_required", lambda: False)():
+            raise TypeError(f"{target.__name__}: required parameter {name!r} not given")
+        kwargs[name] = getattr(default, "default", default)
+    return lambda: target(**kwargs)
+
+
+def stats_cases(main) -> List[Case]:
+    """(name, thunk) for every stats endpoint and the helpers behind them."""
+    today = main._now_ist().date()
+    start, end = (today - timedelta(days=29)).isoformat(), today.isoformat()
+    weeks_start = (today - timedelta(weeks=8)).isoformat()
+    cs, ce, _, _, gran = main._periods("1m", datetime.now(tz=main.UTC))
+    loc_match = main._build_loc_match("IN")
+    exclude = ["TEST", "COLLAB", "REJECTED"]
+
+    return [
+        # endpoints
+        ("stats_orders", _endpoint(main.stats_orders, range="1m", loc=["IN"])),
+        ("stats_revenue", _endpoint(main.stats_revenue, range="1m", loc=["IN"])),
+        ("stats_preview_vs_orders", _endpoint(main.stats_preview_vs_orders, range="1m", loc=["IN"])),
+        ("stats_ship_status", _endpoint(main.stats_ship_status, range="1m")),
+        ("stats_ship_status_v2", _endpoint(main.stats_ship_status_v2, range="1m")),
+        ("stats_order_status", _endpoint(main.stats_order_status, range="1m")),
+        ("stats_sla_cohorts", _endpoint(main.stats_sla_cohorts, start_date=start, end_date=end)),
+        ("stats_sla_cohorts_drilldown",
+         _endpoint(main.stats_sla_cohorts, start_date=start, end_date=end, cohort_date=start)),
+        ("delivery_latency_cohorts", _endpoint(main.delivery_latency_cohorts, start_date=start, end_date=end)),
+        ("shipment_weekly_sla", _endpoint(main.shipment_weekly_sla)),
+        ("shipment_weekly_sla_custom",
+         _endpoint(main.shipment_weekly_sla, start_date=weeks_start, end_date=end)),
+        ("stats_sla_summary", _endpoint(main.stats_sla_summary, start_date=start, end_date=end)),
+        ("production_kpis", _endpoint(main.production_kpis)),
+        ("production_kpis_graph", _endpoint(main.production_kpis_graph, start_date=start, end_date=end)),
+        # helpers
+        ("_fetch_counts", lambda: main._fetch_counts(main.orders_collection, cs, ce, exclude, gran, loc_match)),
+        ("_sla_frame", lambda: main._sla_frame(cs, ce)),
+        ("_status_board_frame", lambda: main._status_board_frame(cs, ce, "IN", loc_match)),
+    ]
+
+
+def time_case(fn: Callable[[], Any], repeat: int, clear: Callable[[], None]) -> Dict[str, float]:
+    samples = []
+    rss_before = _rss_mb()
+    for _ in range(repeat):
+        clear()
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        samples.append(1000 * (time.perf_counter() - t0))
+    samples.sort()
+    rss = _rss_mb()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, round(0.95 * (len(samples) - 1)))], 2),
+        "peak_rss_mb": round(rss, 1),
+        "rss_growth_mb": round(rss - rss_before, 1),
+    }
+
+
+def run(scales: List[int], repeat: int, seed: int, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    import main
+    from bench.bench_dataset import populate
+    from app.stats_cache import invalidate_stats_cache
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for n in scales:
+        t0 = time.perf_counter()
+        counts = populate(main.db, n, seed=seed)
+        logger.info("[BENCH] %s orders loaded in %.1fs: %s", f"{n:,}", time.perf_counter() - t0, counts)
+
+        cases = [c for c in stats_cases(main) if not only or c[0] in only]
+        for name, fn in cases:
+            fn()  # warm-up: connection pool, lazy imports, first freshness sweep
+        by_case = {}
+        for name, fn in cases:
+            by_case[name] = time_case(fn, repeat, invalidate_stats_cache)
+            logger.info("[BENCH] n=%s %-28s %s", f"{n:,}", name, by_case[name])
+        results[str(n)] = by_case
+    return results
+
+
+def compare(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Print current vs baseline; return the regressed `scale/case` names."""
+    regressed = []
+    print(f"{'scale':>9} {'case':<28} {'p50 ms':>9} {'p95 ms':>9} {'base p95':>9} {'ratio':>6} {'RSS MB':>7}")
+    for scale, cases in current.items():
+        for name, r in cases.items():
+            base = (baseline.get(scale) or {}).get(name)
+            ratio = r["p95_ms"] / base["p95_ms"] if base and base["p95_ms"] else None
+            flag = ""
+            if base and ratio and ratio > 1 + threshold and r["p95_ms"] - base["p95_ms"] > STATS_BENCH_NOISE_MS:
+                regressed.append(f"{scale}/{name}")
+                flag = "  REGRESSED"
+            print(
+                f"{int(scale):>9,} {name:<28} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} "
+                f"{base['p95_ms'] if base else float('nan'):>9.1f} "
+                f"{ratio if ratio else float('nan'):>6.2f} {r['peak_rss_mb']:>7.0f}{flag}"
+            )
+    return regressed
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--case", action="append", help="only run this case (repeatable)")
+    parser.add_argument("--baseline", default=STATS_BENCH_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed p95 slowdown (0.25 = +25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="merge these results into the baseline")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    if not args.allow_remote:
+        assert_local(os.environ["MONGO_URI"])
+
+    results = run(args.scales, args.repeat, args.seed, args.case)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+    baseline: Dict[str, Dict[str, Any]] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+    regressed = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        for scale, cases in results.items():
+            baseline.setdefault(scale, {}).update(cases)
+        with open(args.baseline, "w") as fh:
+            json.dump(baseline, fh, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+    elif regressed:
+        print("regressions: " + ", ".join(regressed))
+        sys.exit(1)
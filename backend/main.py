@@ -20,7 +20,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from jwt import PyJWKClient
 import re
 import boto3
-from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
 from google.oauth2.service_account import Credentials as _GoogleCredentials
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
@@ -42,6 +41,7 @@ import openpyxl
 from botocore.exceptions import BotoCoreError, ClientError
 import httpx
 import html
+from concurrent.futures import ThreadPoolExecutor
 from email.message import EmailMessage
 import smtplib
 from app.routers.reconcile import router as vlookup_router
@@ -52,12 +52,62 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from contextlib import asynccontextmanager
 from app.routers.cloudprinter_produce_webhook import router as cp_produce_router
 from app.routers.shiprocket_webhook import router as shiprocket_router
+from app.stats_rollup import (
+    ensure_fresh as _ensure_rollups_fresh,
+    fetch_rollup_windows,
+    mark_rollups_dirty,
+    rebuild_rollups,
+    rollup_source_touched,
+    rollups_ready,
+    window_switch,
+)
+from app.stats_cache import cached_stats, frame_cache, invalidate_stats_cache, list_count_cache, stats_cache
+from app.indexes import ensure_indexes
+from app.stats_watermark import StatsETagMiddleware, configure_watermark
+from app.live_updates import ChangeFeed, sse_stream
+from app.keyset import keyset_page
+from app.list_counts import list_total
+from app.presign_cache import cached_presigned_url, presign_cache
+from app.aws_clients import aws_client
+from app.s3_move import move_jobs
+from app.cover_keys import (
+    COVER_KEY_FIELD, backfill_cover_keys, find_cover_key, generations_bucket, is_final_cover_key, remember_cover_key,
+)
+from app.fieldsets import (
+    ORDERS_LIST_FIELDS, SHIPMENT_ORDERS_LIST_FIELDS, fieldset_projection, render_rows, select_fields,
+)
+from app.order_flags import STATS_ORDER_FLAGS, discount_exclusion, flag_loc_match, flag_population_match
+from app.search import JOB_SEARCH_FIELDS, ORDER_SEARCH_FIELDS, ORDER_SEARCH_TOKENS, search_filter
+from app import sla_engine, status_board
+from app.kpi_counters import (
+    EXCLUDE_CODES,
+    SHIPPED_STATUSES,
+    STATS_KPI_COUNTERS,
+    counter_kpi_counts,
+    counters_ready,
+    group_kpi_counts,
+    kpi_tiles,
+    kpi_transition,
+    rebuild_kpi_counters,
+)
+from app.order_timestamps import (
+    DERIVED_SOURCE_FIELDS,
+    backfill_complete,
+    backfill_order_timestamps,
+    derived_fields_ready,
+    ensure_timestamps_fresh,
+    raw_date,
+    raw_window_match,
+    sync_order_timestamps,
+)
 import asyncio
+import threading
 from apscheduler.triggers.cron import CronTrigger
 from io import BytesIO
 from collections import defaultdict
 import builtins
 from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
 import hashlib
 import PyPDF2
 
@@ -82,10 +132,16 @@ client = MongoClient(MONGO_URI, tz_aware=True)
 db = client["candyman"]
 shipping_collection = db["shipping_details"]
 orders_collection = db["user_details"]
+rollups_collection = db["order_rollups_hourly"]
+rollup_state_collection = db["stats_rollup_state"]
+kpi_counters_collection = db["production_kpi_counters"]
+configure_watermark(db)
+live_feed = ChangeFeed(orders_collection)
+STATS_USE_ROLLUPS = os.getenv("STATS_USE_ROLLUPS", "1").strip().lower() not in ("0", "false", "no")
 PREVIEW_URL_FIELD = "preview_url"
 JOBS_CREATED_AT_FIELD = "created_at"
 PAID_FIELD = "paid"
-s3 = boto3.client('s3')
+s3 = aws_client("s3")
 
 BUCKET_NAME = "replicacomfy"
 ALLOWED_EMAILS = {
@@ -148,13 +204,6 @@ EMAIL_TO = [e.strip() for e in EMAIL_TO_RAW.split(",") if e.strip()]
 SMTP_USER = os.getenv("SMTP_USER", EMAIL_USER)
 SMTP_PASS = os.getenv("SMTP_PASS", EMAIL_PASS)
 NUDGE_MIN_WORKFLOWS = int(os.getenv("NUDGE_MIN_WORKFLOWS", "13"))
-SHIPPED_STATUSES = {
-    "PICKED UP",
-    "IN TRANSIT",
-    "OUT FOR DELIVERY",
-    "DELIVERED",
-    "REACHED AT DESTINATION HUB",
-}
 COUNTRY_CODES = {
     "India": "IN",
     "United States": "US",
@@ -286,6 +335,14 @@ class OrderStatusUpdatePayload(BaseModel):
 class IssueOriginUpdatePayload(BaseModel):
     issue_origin: str
 
+def _ensure_indexes_once() -> None:
+    try:
+        failed = ensure_indexes(db)
+        if failed:
+            logger.warning("Indexes not created: %s", ", ".join(failed))
+    except Exception:
+        logger.exception("Failed to ensure indexes")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
@@ -335,6 +392,95 @@ async def lifespan(app: FastAPI):
             max_instances=1,
         )
 
+        # index builds on large collections take minutes; don't hold up startup
+        threading.Thread(target=_ensure_indexes_once, name="ensure-indexes", daemon=True).start()
+        # change-stream consumer: cache invalidation for external writes + SSE fan-out
+        live_feed.start()
+
+        if STATS_USE_ROLLUPS:
+            scheduler.add_job(
+                _ensure_rollups_fresh,
+                args=[orders_collection, rollups_collection, rollup_state_collection, 0],
+                trigger=CronTrigger(minute="*/5", timezone=IST_TZ),
+                id="stats_rollup_refresh_every_5m",
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+            )
+
+            scheduler.add_job(
+                rebuild_rollups,
+                args=[orders_collection, rollups_collection, rollup_state_collection],
+                trigger=CronTrigger(hour="3", minute="30", timezone=IST_TZ),
+                id="stats_rollup_nightly_rebuild",
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+            )
+            # first build (or a new ROLLUP_SCHEMA) off the request path; stats read live until done
+            if not rollups_ready(rollup_state_collection):
+                scheduler.add_job(
+                    rebuild_rollups,
+                    args=[orders_collection, rollups_collection, rollup_state_collection],
+                    id="stats_rollup_seed",
+                    replace_existing=True,
+                )
+
+        if STATS_KPI_COUNTERS:
+            scheduler.add_job(
+                rebuild_kpi_counters,
+                args=[orders_collection, kpi_counters_collection],
+                trigger=CronTrigger(hour="3", minute="45", timezone=IST_TZ),
+                id="kpi_counters_nightly_rebuild",
+                replace_existing=True,
+                coalesce=True,
+                max_instances=1,
+            )
+            if not counters_ready(kpi_counters_collection):
+                scheduler.add_job(
+                    rebuild_kpi_counters,
+                    args=[orders_collection, kpi_counters_collection],
+                    id="kpi_counters_seed",
+                    replace_existing=True,
+                )
+
+        scheduler.add_job(
+            backfill_order_timestamps,
+            args=[orders_collection],
+            trigger=CronTrigger(hour="3", minute="0", timezone=IST_TZ),
+            id="order_timestamps_nightly_backfill",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+        )
+        # derived fields of docs written outside this backend (storefront)
+        scheduler.add_job(
+            ensure_timestamps_fresh,
+            args=[orders_collection, 0],
+            trigger=CronTrigger(minute="*", timezone=IST_TZ),
+            id="order_timestamps_sweep_every_1m",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+        )
+        if not backfill_complete(orders_collection):
+            scheduler.add_job(
+                backfill_order_timestamps,
+                args=[orders_collection],
+                id="order_timestamps_seed",
+                replace_existing=True,
+            )
+
+        scheduler.add_job(
+            backfill_cover_keys,
+            args=[orders_collection, _get_s3_client_generic],
+            trigger=CronTrigger(hour="4", minute="0", timezone=IST_TZ),
+            id="cover_keys_nightly_backfill",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1,
+        )
+
         def _kick_send_nudges():
             asyncio.run_coroutine_threadsafe(
                 send_nudge_batches(batch_size=200, days_window=7), loop
@@ -357,6 +503,7 @@ async def lifespan(app: FastAPI):
     try:
         if scheduler.running:
             scheduler.shutdown(wait=False)
+        live_feed.stop()
     except Exception:
         logger.exception("Failed to stop APScheduler")
 
@@ -373,6 +520,8 @@ origins = [
     "https://admin.diffrun.com", # Allow requests from production frontend
 ]
 
+# registered first = inner layer, so CORS headers also go on its 304s
+app.add_middleware(StatsETagMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://127.0.0.1:3000","https://admin.diffrun.com"],  # Allows frontend domains to send requests
@@ -393,6 +542,9 @@ class OrderStatusUpdatePayload(BaseModel):
 class GoogleReviewReceivedRequest(BaseModel):
     order_ids: List[str]
 
+class OrderDetailsBatchRequest(BaseModel):
+    order_ids: List[str]
+
 
 from fastapi import Header
 
@@ -1624,7 +1776,14 @@ def _export_xlsx_bytes(from_dt_utc: datetime, to_dt_utc: datetime) -> Tuple[byte
     return buf.read(), filename
 
 
+def _derived_ready() -> bool:
+    """Typed timestamps / calendar keys / flags are backfilled; until then stats filter the raw fields."""
+    return derived_fields_ready(orders_collection)
+
 def _build_loc_match(loc: str) -> dict:
+    if STATS_ORDER_FLAGS and _derived_ready():
+        # same semantics as below on the precomputed loc_norm (app/order_flags.py)
+        return flag_loc_match(loc)
     loc = (loc or "IN").upper()
 
     # CURRENT BEHAVIOUR (your existing India behaviour) → use this for "ALL"
@@ -1756,121 +1915,166 @@ def _fetch_counts(
     granularity: str,
     loc_match: dict,                      # <-- NEW
 ) -> Dict[str, int]:
-    discount_ne = [{"discount_code": {"$ne": code}} for code in exclude_codes]
+    # ist_hour / ist_date are precomputed from processed_at (see app/order_timestamps.py)
+    bucket: Any = "$ist_hour" if granularity == "hour" else "$ist_date"
+    if not _derived_ready():
+        bucket = {
+            "$dateToString": {
+                "format": "%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d",
+                "date": raw_date("processed_at"),
+                "timezone": "Asia/Kolkata",
+            }
+        }
+    pipeline = [
+        {"$match": _fetch_counts_match(start_utc, end_utc, exclude_codes, loc_match)},
+        {"$group": {"_id": bucket, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    rows = list(col.aggregate(pipeline))
+    return {r["_id"]: int(r["count"]) for r in rows}
+
+def _fetch_counts_match(
+    start_utc: datetime,
+    end_utc: datetime,
+    exclude_codes: List[str],
+    loc_match: dict,
+) -> dict:
+    """$match of `_fetch_counts` (also explained by `python -m app.indexes`)."""
+    derived = _derived_ready()
+    flags = STATS_ORDER_FLAGS and derived
+    exclusion = discount_exclusion(exclude_codes, normalized=flags)
     base_match = {
         "paid": True,
         "order_id": {"$regex": r"^#\d+(_\d+)?$"},
-        "processed_at": {"$exists": True, "$ne": None},
+        "processed_at_dt": {"$gte": start_utc, "$lt": end_utc},
     }
+    if not derived:
+        base_match = {
+            "paid": True,
+            "order_id": {"$regex": r"^#\d+(_\d+)?$"},
+            **raw_window_match("processed_at", start_utc, end_utc),
+        }
+    elif flags:
+        # every field of paid_order_flags_processed_at_dt ahead of the window is
+        # pinned (both booleans where the query takes either) so the range is a seek
+        base_match = {
+            "paid": True,
+            "is_real_order": True,
+            "is_cancelled": {"$in": [False, True]},
+            "is_excluded_code": {"$in": [False, True]},
+            "processed_at_dt": {"$gte": start_utc, "$lt": end_utc},
+        }
 
     # merge AND conditions safely
-    ands = []
-    if discount_ne:
-        ands.extend(discount_ne)
+    ands = base_match.pop("$and", [])
+    if exclusion:
+        ands.append(exclusion)
     if loc_match:
         ands.append(loc_match)
     if ands:
         base_match["$and"] = ands
-
-    pipeline = [
-        {"$match": base_match},
-        {"$addFields": {"processed_dt": {"$toDate": "$processed_at"}}},
-        {"$match": {"processed_dt": {"$gte": start_utc, "$lt": end_utc}}},
-        {
-            "$group": {
-                "_id": {
-                    "$dateToString": {
-                        "format": "%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d",
-                        "date": "$processed_dt",
-                        "timezone": "Asia/Kolkata",
-                    }
-                },
-                "count": {"$sum": 1},
-            }
-        },
-        {"$sort": {"_id": 1}},
-    ]
-    rows = list(col.aggregate(pipeline))
-    return {r["_id"]: int(r["count"]) for r in rows}
+    return base_match
 
 def _now_ist():
     return datetime.now(IST_TZ)
 
-def _fetch_jobs_created_with_preview_per_bucket(
+def _date_range_prefilter(field: str, start_utc: datetime, end_utc: datetime) -> dict:
+    """
+    Index-servable range on a mixed date/ISO-string field. The string branch is
+    widened by a day (offset-suffixed strings); callers re-check the converted date.
+    """
+    return {"$or": [
+        {field: {"$gte": start_utc, "$lt": end_utc}},
+        {field: {
+            "$gte": (start_utc - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+            "$lt": (end_utc + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+        }},
+    ]}
+
+def _fetch_preview_vs_orders_per_bucket(
     col: Collection,
-    start_utc: datetime,
-    end_utc: datetime,
+    windows: Dict[str, Tuple[datetime, datetime]],
     granularity: str,
-    loc_match: dict,                      # <-- NEW
-) -> Dict[str, int]:
-    base_match = {
-        PREVIEW_URL_FIELD: {"$exists": True, "$nin": [None, ""]},
-        JOBS_CREATED_AT_FIELD: {"$exists": True, "$ne": None},
+    loc_match: dict,
+) -> Dict[str, Dict[str, Dict[str, int]]]:
+    """
+    Jobs-with-preview (by created_at) and paid orders (by processed_at, fallback
+    created_at) per bucket for every window, in one aggregation / one collection pass.
+    Returns {"jobs": {window: {label: n}}, "paid": {window: {label: n}}}.
+    """
+    lo = min(start for start, _ in windows.values())
+    hi = max(end for _, end in windows.values())
+
+    jobs_branch = {
+        "$and": [
+            {PREVIEW_URL_FIELD: {"$exists": True, "$nin": [None, ""]}},
+            _date_range_prefilter(JOBS_CREATED_AT_FIELD, lo, hi),
+        ]
+    }
+    paid_branch = {
+        "$and": [
+            {PAID_FIELD: True},
+            {"$or": [
+                _date_range_prefilter("processed_at", lo, hi),
+                {"$and": [
+                    {"processed_at": None},
+                    _date_range_prefilter("created_at", lo, hi),
+                ]},
+            ]},
+        ]
     }
+    base_match = {"$or": [jobs_branch, paid_branch]}
     if loc_match:
         base_match = {"$and": [base_match, loc_match]}
 
+    def safe_date(expr):
+        return {"$convert": {"input": expr, "to": "date", "onError": None, "onNull": None}}
+
+    job_dt = {"$cond": [
+        {"$in": [{"$ifNull": [f"${PREVIEW_URL_FIELD}", ""]}, [None, ""]]},
+        None,
+        safe_date(f"${JOBS_CREATED_AT_FIELD}"),
+    ]}
+    paid_dt = {"$cond": [
+        {"$eq": [f"${PAID_FIELD}", True]},
+        safe_date({"$ifNull": ["$processed_at", "$created_at"]}),
+        None,
+    ]}
+    label_fmt = "%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d"
+
+    def _facet(dt_field: str, w_field: str) -> List[dict]:
+        return [
+            {"$match": {w_field: {"$ne": None}}},
+            {"$group": {
+                "_id": {
+                    "w": f"${w_field}",
+                    "b": {"$dateToString": {"format": label_fmt, "date": f"${dt_field}", "timezone": "Asia/Kolkata"}},
+                },
+                "count": {"$sum": 1},
+            }},
+        ]
+
     pipeline = [
         {"$match": base_match},
+        {"$project": {"_id": 0, "_job_dt": job_dt, "_paid_dt": paid_dt}},
         {"$addFields": {
-            "_dt": {
-                "$cond": [
-                    {"$eq": [{"$type": f"${JOBS_CREATED_AT_FIELD}"}, "date"]},
-                    f"${JOBS_CREATED_AT_FIELD}",
-                    {"$toDate": f"${JOBS_CREATED_AT_FIELD}"},
-                ]
-            }
+            "_job_w": window_switch("$_job_dt", windows),
+            "_paid_w": window_switch("$_paid_dt", windows),
         }},
-        {"$match": {"_dt": {"$gte": start_utc, "$lt": end_utc}}},
-        {"$group": {
-            "_id": {
-                "$dateToString": {
-                    "format": "%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d",
-                    "date": "$_dt",
-                    "timezone": "Asia/Kolkata",
-                }
-            },
-            "count": {"$sum": 1},
+        {"$facet": {
+            "jobs": _facet("_job_dt", "_job_w"),
+            "paid": _facet("_paid_dt", "_paid_w"),
         }},
-        {"$sort": {"_id": 1}},
     ]
-    return {r["_id"]: int(r["count"]) for r in col.aggregate(pipeline)}
 
-def _fetch_paid_orders_per_bucket(
-    col: Collection,
-    start_utc: datetime,
-    end_utc: datetime,
-    granularity: str,
-    loc_match: dict,                      # <-- NEW
-) -> Dict[str, int]:
-    base_match = {
-        PAID_FIELD: True,
-        "$or": [
-            {"processed_at": {"$exists": True, "$ne": None}},
-            {"created_at": {"$exists": True, "$ne": None}},
-        ],
+    out: Dict[str, Dict[str, Dict[str, int]]] = {
+        metric: {name: {} for name in windows} for metric in ("jobs", "paid")
     }
-    if loc_match:
-        base_match = {"$and": [base_match, loc_match]}
-
-    pipeline = [
-        {"$match": base_match},
-        {"$addFields": {
-            "_dt": {"$toDate": {"$ifNull": ["$processed_at", "$created_at"]}}}},
-        {"$match": {"_dt": {"$gte": start_utc, "$lt": end_utc}}},
-        {"$group": {
-            "_id": {
-                "$dateToString": {
-                    "format": "%Y-%m-%d %H:00" if granularity == "hour" else "%Y-%m-%d",
-                    "date": "$_dt",
-                    "timezone": "Asia/Kolkata",
-                }
-            },
-            "count": {"$sum": 1},
-        }},
-        {"$sort": {"_id": 1}},
-    ]
-    return {r["_id"]: int(r["count"]) for r in col.aggregate(pipeline)}
+    for facets in col.aggregate(pipeline):
+        for metric in ("jobs", "paid"):
+            for r in facets.get(metric, []):
+                out[metric][r["_id"]["w"]][r["_id"]["b"]] = int(r["count"])
+    return out
 
 def _fetch_revenue_per_bucket(
     col: Collection,
@@ -1918,8 +2122,48 @@ def _fetch_revenue_per_bucket(
     rows = list(col.aggregate(pipeline))
     return {r["_id"]: float(r["revenue"]) for r in rows}
 
+def _rollup_windows(
+    windows: Dict[str, Tuple[datetime, datetime]],
+    granularity: str,
+    metrics: List[str],
+    loc_match: dict,
+    exclude_codes: Optional[List[str]] = None,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Per-window, per-bucket metrics from the hourly rollup collection (see `_use_rollups`)."""
+    return fetch_rollup_windows(
+        rollups_collection, windows, granularity, metrics,
+        loc_match=loc_match, exclude_codes=exclude_codes,
+    )
+
+def _use_rollups() -> bool:
+    """Rollups are enabled and built (refreshed on demand); else stats use the live aggregation."""
+    return STATS_USE_ROLLUPS and _ensure_rollups_fresh(orders_collection, rollups_collection, rollup_state_collection)
+
+def _metric_map(buckets: Dict[str, Dict[str, float]], metric: str) -> Dict[str, float]:
+    return {k: v.get(metric, 0) for k, v in buckets.items()}
+
+
+@app.get("/api/stats/cache", tags=["stats"])
+def stats_cache_info():
+    return {
+        **stats_cache.stats(),
+        "list_counts": list_count_cache.stats(),
+        "frames": frame_cache.stats(),
+        "presigned_urls": presign_cache.stats(),
+        "live_feed": live_feed.stats(),
+    }
+
+@app.get("/api/live/orders", tags=["stats"])
+async def live_orders(request: Request):
+    """SSE feed of order_paid / status_changed / print_dispatched deltas (one change stream per process)."""
+    return StreamingResponse(
+        sse_stream(live_feed, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/api/stats/orders")
+@cached_stats
 def stats_orders(
     range: RangeKey = Query(
         "1w", description="1d | 1w | 1m | 6m | this_month"),
@@ -1945,10 +2189,17 @@ def stats_orders(
 
     loc_match = {"$or": [_build_loc_match(l) for l in loc]}
 
-    curr_map = _fetch_counts(
-        orders_collection, curr_start_utc, curr_end_utc,  exclude_codes, gran, loc_match)
-    prev_map = _fetch_counts(
-        orders_collection, prev_start_utc, prev_end_utc, exclude_codes, gran, loc_match)
+    if _use_rollups():
+        by_window = _rollup_windows(
+            {"curr": (curr_start_utc, curr_end_utc), "prev": (prev_start_utc, prev_end_utc)},
+            gran, ["orders"], loc_match, exclude_codes)
+        curr_map = _metric_map(by_window["curr"], "orders")
+        prev_map = _metric_map(by_window["prev"], "orders")
+    else:
+        curr_map = _fetch_counts(
+            orders_collection, curr_start_utc, curr_end_utc,  exclude_codes, gran, loc_match)
+        prev_map = _fetch_counts(
+            orders_collection, prev_start_utc, prev_end_utc, exclude_codes, gran, loc_match)
 
     current = [int(curr_map.get(k, 0)) for k in labels]
     previous = [int(prev_map.get(k, 0)) for k in prev_labels]
@@ -1962,6 +2213,7 @@ def stats_orders(
     }
 
 @app.get("/api/stats/revenue", tags=["stats"])
+@cached_stats
 def stats_revenue(
     range: RangeKey = Query("1w"),
     start_date: Optional[str] = Query(None),
@@ -1979,10 +2231,16 @@ def stats_revenue(
 
     loc_match = {"$or": [_build_loc_match(l) for l in loc]}
 
-    rev_curr = _fetch_revenue_per_bucket(
-        orders_collection, cs, ce, gran, loc_match)
-    rev_prev = _fetch_revenue_per_bucket(
-        orders_collection, ps, pe, gran, loc_match)
+    if _use_rollups():
+        by_window = _rollup_windows(
+            {"curr": (cs, ce), "prev": (ps, pe)}, gran, ["revenue"], loc_match)
+        rev_curr = _metric_map(by_window["curr"], "revenue")
+        rev_prev = _metric_map(by_window["prev"], "revenue")
+    else:
+        rev_curr = _fetch_revenue_per_bucket(
+            orders_collection, cs, ce, gran, loc_match)
+        rev_prev = _fetch_revenue_per_bucket(
+            orders_collection, ps, pe, gran, loc_match)
 
     current = [float(rev_curr.get(k, 0.0)) for k in labels]
     previous = [float(rev_prev.get(k, 0.0)) for k in prev_labels]
@@ -1997,7 +2255,23 @@ def stats_revenue(
 
 
 
+def _last_scan_lookup(shipping_collection_name: str) -> dict:
+    """$lookup of the last shiprocket scan as `_ship.last`, from the newest shipping doc of the order."""
+    return {"$lookup": {
+        "from": shipping_collection_name,
+        "localField": "order_id",
+        "foreignField": "order_id",
+        "pipeline": [
+            # an order can have several shipping docs (re-shipments); the newest one wins
+            {"$sort": {"_id": -1}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "last": {"$arrayElemAt": ["$shiprocket_data.scans", -1]}}},
+        ],
+        "as": "_ship",
+    }}
+
 @app.get("/api/stats/ship-status")
+@cached_stats
 def stats_ship_status(
     range: str = Query(
         "1w", description="range key like 1d, 1w, 1m, 6m, this_month, custom"),
@@ -2007,14 +2281,14 @@ def stats_ship_status(
     loc: Optional[str] = Query("IN", description="country code"),
 ):
     """
-    Dynamic-activity version (batched, STRICT) – **always day-level**:
+    Dynamic-activity version (server-side, STRICT) – **always day-level**:
 
     - For each date (labels) we take paid orders whose processed_at (IST) falls into the date.
     - We select only orders routed to 'genesis' or 'yara' (or filtered by top-level printer param).
-    - total = number of genesis|yara orders for that date.
-    - We fetch shipping docs in a single batched query for all candidate orders.
-    - For each order we look ONLY at shiprocket_data.scans and take the LAST element's 'activity' field.
-    - We count occurrences of each distinct activity string per date.
+    - total = number of real orders for that date (same as the Orders graph).
+    - One aggregation: bounded $match on processed_at, $lookup of the LAST
+      shiprocket_data.scans element's 'sr-status-label', $group by IST date + label.
+    - Orders without shipping doc / scans are counted as NEW.
     """
     order_totals_by_date: Dict[str, int] = {}
 
@@ -2029,6 +2303,7 @@ def stats_ship_status(
     # We **never** want hourly buckets for this endpoint.
     # Treat '1d' as '1w' for shipment status.
     effective_range = "1w" if range == "1d" else range
+    exclude_codes = ["TEST", "COLLAB", "REJECTED"]
 
     try:
         if start_date and end_date:
@@ -2041,9 +2316,20 @@ def stats_ship_status(
             # gran from _periods may be "hour" for 1d, but we have already
             # normalised 1d -> 1w above, so this is always day-level here.
             labels = _labels_for(effective_range, cs, ce)
+    except Exception:
+        # Fallback: last 7 calendar days in IST
+        ce = _ist_midnight(_now_ist()) + timedelta(days=1)
+        cs = ce - timedelta(days=7)
+        labels = [(cs + timedelta(days=i)).strftime("%Y-%m-%d") for i in builtins.range(7)]
+        cs, ce = cs.astimezone(UTC), ce.astimezone(UTC)
 
-        exclude_codes = ["TEST", "COLLAB", "REJECTED"]
-        if cs and ce:
+    try:
+        if _use_rollups():
+            order_totals_by_date = _metric_map(
+                _rollup_windows({"curr": (cs, ce)}, "day", ["orders"], loc_match, exclude_codes)["curr"],
+                "orders",
+            )
+        else:
             order_totals_by_date = _fetch_counts(
                 orders_collection,
                 cs,
@@ -2052,146 +2338,73 @@ def stats_ship_status(
                 "day",        # ship-status is always day-level
                 loc_match or {},  # may be None if _build_loc_match failed
             )
-
     except Exception:
-        # Fallback: last 7 calendar days in IST
-        today = datetime.now(timezone.utc)
-        labels = []
-        for i in range(6, -1, -1):
-            d = (today - timedelta(days=i)).astimezone(IST_TZ)
-            labels.append(d.strftime("%Y-%m-%d"))
-
-        # ---- 2) Base order query (unchanged apart from loc filter reuse) ----
-    base_match = {"paid": True, "processed_at": {"$exists": True, "$ne": None}}
-    if loc_match:
-        base_match = {"$and": [base_match, loc_match]}
-
-    projection = {"order_id": 1, "processed_at": 1, "printer": 1, "_id": 0}
-    cursor = orders_collection.find(base_match, projection)
-
-    # group orders by IST date and remember printer
-    orders_by_date = {k.split(" ")[0]: [] for k in labels}
-    order_printer_map: dict = {}
-    all_printer_candidates: set = set()
-
-    for doc in cursor:
-        try:
-            dt = doc.get("processed_at")
-            if isinstance(dt, str):
-                dt = date_parser.isoparse(dt)
-            if not dt:
-                continue
-
-            ist_d = dt.astimezone(IST_TZ).strftime("%Y-%m-%d")
-            if ist_d not in orders_by_date:
-                continue
-
-            oid = doc.get("order_id")
-            doc_printer = (doc.get("printer") or "").strip().lower()
-            order_printer_map[oid] = doc_printer
-
-            # respect top-level printer filter if provided
-            if printer and printer.lower() not in ("all", ""):
-                if doc_printer != printer.lower():
-                    continue
+        logger.exception("[SHIP-STATUS] failed to load order totals")
 
-            orders_by_date[ist_d].append(oid)
+    # ---- 2) Genesis/Yara orders in the window, last scan label, grouped by day ----
+    printer_norm = (printer or "").strip().lower()
+    if printer_norm in ("all", ""):
+        printers = ["genesis", "yara"]
+    else:
+        printers = [p for p in ("genesis", "yara") if p == printer_norm]
 
-            # only genesis / yara to be considered for shipment status
-            if doc_printer in ("genesis", "yara"):
-                all_printer_candidates.add(oid)
-        except Exception:
-            continue
+    base_match: Dict[str, Any] = {"$and": [
+        {"paid": True},
+        _date_range_prefilter("processed_at", cs, ce),
+    ]}
+    if loc_match:
+        base_match["$and"].append(loc_match)
 
-        # no printer candidates at all
-    if not all_printer_candidates:
-        rows = []
-        for lbl in labels:
-            date_key = lbl.split(" ")[0]
-            total_orders = int(order_totals_by_date.get(date_key, 0))
-            rows.append({
-                "date": date_key,
-                # NEW: total orders for the day (loc-filtered)
-                "total": total_orders,
-                "sent_to_print": 0,      # no genesis/yara orders
-                "counts": {},
-            })
-        return {
-            "labels": labels,
-            "activities": [],
-            "rows": rows,
-            "printer": printer or "all",
-        }
+    last_label = {"$convert": {
+        "input": {"$first": "$_ship.last.sr-status-label"},
+        "to": "string",
+        "onError": None,
+        "onNull": None,
+    }}
 
-    # ---- 3) Fetch shiprocket scans for all candidate orders ----
-    shipping_docs = list(
-        shipping_collection.find(
-            {"order_id": {"$in": list(all_printer_candidates)}},
-            {"order_id": 1, "shiprocket_data.scans": 1},
-        )
-    )
-    sh_map = {s.get("order_id"): s for s in shipping_docs}
+    pipeline = [
+        {"$match": base_match},
+        {"$project": {
+            "_id": 0,
+            "order_id": 1,
+            "_dt": {"$convert": {"input": "$processed_at", "to": "date", "onError": None, "onNull": None}},
+            "_printer": {"$toLower": {"$trim": {"input": {"$ifNull": ["$printer", ""]}}}},
+        }},
+        {"$match": {"_dt": {"$gte": cs, "$lt": ce}, "_printer": {"$in": printers}}},
+        _last_scan_lookup(shipping_collection.name),
+        {"$project": {
+            "_date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$_dt", "timezone": "Asia/Kolkata"}},
+            "_label": {"$cond": [
+                {"$in": [{"$ifNull": [last_label, ""]}, ["", None]]},
+                "NEW",
+                {"$trim": {"input": last_label}},
+            ]},
+        }},
+        {"$group": {"_id": {"d": "$_date", "a": "$_label"}, "n": {"$sum": 1}}},
+    ]
 
+    counts_by_date: Dict[str, Counter] = defaultdict(Counter)
     global_activity_set = set()
-    rows = []
+    if printers:
+        for r in orders_collection.aggregate(pipeline):
+            act_label = r["_id"].get("a")
+            counts_by_date[r["_id"].get("d")][act_label] += int(r["n"])
+            global_activity_set.add(act_label)
 
-    # ---- 4) Build per-day rows ----
+    # ---- 3) Build per-day rows ----
+    rows = []
     for lbl in labels:
         date_key = lbl.split(" ")[0]
-        order_ids = orders_by_date.get(date_key, [])
-
-        # total orders for that day (Orders graph style, loc-filtered)
-        total_orders = int(order_totals_by_date.get(date_key, 0))
-
-        if not order_ids:
-            rows.append({
-                "date": date_key,
-                "total": total_orders,
-                "sent_to_print": 0,
-                "counts": {},
-            })
-            continue
-
-        # only genesis|yara for this date (sent to print)
-        printer_candidates = [
-            oid
-            for oid in order_ids
-            if (order_printer_map.get(oid) or "").lower() in ("genesis", "yara")
-        ]
-
-        sent_to_print_count = len(printer_candidates)
-        counts = Counter()
-
-        if printer_candidates:
-            for oid in printer_candidates:
-                s = sh_map.get(oid)
-                last_activity_str = None
-
-                if s:
-                    sr_data = s.get("shiprocket_data")
-                    scans = sr_data.get("scans") if isinstance(
-                        sr_data, dict) else None
-
-                    if isinstance(scans, list) and scans:
-                        last = scans[-1]
-                        # STRICT: only activity field
-                        last_activity_str = last.get("sr-status-label")
-
-                # if no activity or no scans/doc → mark as NEW
-                act_label = str(last_activity_str).strip(
-                ) if last_activity_str else "NEW"
-
-                counts[act_label] += 1
-                global_activity_set.add(act_label)
-
+        counts = counts_by_date.get(date_key, Counter())
         rows.append({
             "date": date_key,
-            "total": total_orders,               # NEW column value
-            "sent_to_print": sent_to_print_count,
+            # total orders for that day (Orders graph style, loc-filtered)
+            "total": int(order_totals_by_date.get(date_key, 0)),
+            "sent_to_print": sum(counts.values()),
             "counts": dict(counts),
         })
 
-    # sorted list of activity labels (NO_SCAN last)
+    # sorted list of activity labels (NEW last)
     activities = sorted(global_activity_set,
                         key=lambda s: (s == "NEW", s.lower()))
 
@@ -2203,6 +2416,7 @@ def stats_ship_status(
     }
 
 @app.get("/api/stats/preview-vs-orders", tags=["stats"])
+@cached_stats
 def stats_preview_vs_orders(
     range: RangeKey = Query("1w"),
     start_date: Optional[str] = Query(None),
@@ -2220,14 +2434,16 @@ def stats_preview_vs_orders(
 
     loc_match = {"$or": [_build_loc_match(l) for l in loc]}
 
-    jobs_map_curr = _fetch_jobs_created_with_preview_per_bucket(
-        orders_collection, cs, ce, granularity=gran, loc_match=loc_match)
-    paid_map_curr = _fetch_paid_orders_per_bucket(
-        orders_collection, cs, ce, granularity=gran, loc_match=loc_match)
-    jobs_map_prev = _fetch_jobs_created_with_preview_per_bucket(
-        orders_collection, ps, pe, granularity=gran, loc_match=loc_match)
-    paid_map_prev = _fetch_paid_orders_per_bucket(
-        orders_collection, ps, pe, granularity=gran, loc_match=loc_match)
+    windows = {"curr": (cs, ce), "prev": (ps, pe)}
+    if _use_rollups():
+        by_window = _rollup_windows(windows, gran, ["jobs", "paid"], loc_match)
+        jobs_map_curr, paid_map_curr = _metric_map(by_window["curr"], "jobs"), _metric_map(by_window["curr"], "paid")
+        jobs_map_prev, paid_map_prev = _metric_map(by_window["prev"], "jobs"), _metric_map(by_window["prev"], "paid")
+    else:
+        by_metric = _fetch_preview_vs_orders_per_bucket(
+            orders_collection, windows, granularity=gran, loc_match=loc_match)
+        jobs_map_curr, paid_map_curr = by_metric["jobs"]["curr"], by_metric["paid"]["curr"]
+        jobs_map_prev, paid_map_prev = by_metric["jobs"]["prev"], by_metric["paid"]["prev"]
 
     current_jobs = [int(jobs_map_curr.get(k, 0)) for k in labels]
     current_orders = [int(paid_map_curr.get(k, 0)) for k in labels]
@@ -2250,6 +2466,61 @@ def stats_preview_vs_orders(
         "granularity": gran,
     }
 
+def _add_search(query: dict, q: Optional[str], fields: Tuple[str, ...]) -> None:
+    """Append the grid search for `q` to `query`: token index when enabled, else the regex $or."""
+    term = (q or "").strip()
+    if not term:
+        return
+    if ORDER_SEARCH_TOKENS:
+        flt = search_filter(term, fields)
+        if flt:
+            query.setdefault("$and", []).append(flt)
+        return
+    rx = re.compile(re.escape(term), re.IGNORECASE)
+    query.setdefault("$and", []).append({"$or": [{f: {"$regex": rx}} for f in fields]})
+
+PaginationMode = Literal["page", "cursor"]
+
+def _list_page(
+    query: dict,
+    projection: dict,
+    sort_by: Optional[str],
+    sort_dir: Optional[str],
+    page: int,
+    limit: int,
+    pagination: str,
+    cursor: Optional[str],
+    approx: bool = False,
+) -> Tuple[List[dict], dict]:
+    """
+    (docs, pagination envelope) for the user_details list endpoints.
+    `pagination=cursor` (or any `cursor`) switches to keyset paging on an indexed sort;
+    `approx` allows an estimated total (`total_exact: false`) instead of a full count.
+    """
+    total_count, total_exact = list_total(orders_collection, query, approx=approx)
+    pages = (total_count + limit - 1) // limit
+
+    if pagination == "cursor" or cursor:
+        try:
+            docs, next_cursor = keyset_page(
+                orders_collection, query, projection, sort_by, sort_dir, limit, cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return docs, {
+            "mode": "cursor",
+            "limit": limit,
+            "total": total_count,
+            "total_exact": total_exact,
+            "pages": pages,
+            "next_cursor": next_cursor,
+        }
+
+    skip = (page - 1) * limit
+    sort_field = sort_by if sort_by else "created_at"
+    sort_order = 1 if sort_dir == "asc" else -1
+    docs = list(orders_collection.find(query, projection).sort(sort_field, sort_order).skip(skip).limit(limit))
+    return docs, {"page": page, "limit": limit, "total": total_count, "total_exact": total_exact, "pages": pages}
+
 @app.get("/api/orders_api")
 def get_orders(
     sort_by: Optional[str] = Query(None, description="Field to sort by"),
@@ -2264,6 +2535,11 @@ def get_orders(
         None, description="Search by job_id, order_id, email, name, discount_code, city, locale, book_id"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=1000),
+    pagination: PaginationMode = Query("page", description="page (offset) | cursor (keyset; sort_by created_at or processed_at)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (cursor mode)"),
+    approx: bool = Query(False, description="allow an estimated total; exact count is computed in the background"),
+    fields: Optional[List[str]] = Query(
+        None, description="response keys to return (comma-separated or repeated); default is the full row"),
 ):
     # Base query
     query = {"paid": True}
@@ -2321,113 +2597,22 @@ def get_orders(
         })
 
     # --- Extended free-text search ---
-    if q:
-        term = q.strip()
-        if term:
-            rx = re.compile(re.escape(term), re.IGNORECASE)
-            query.setdefault("$and", []).append({
-                "$or": [
-                    {"order_id": {"$regex": rx}},
-                    {"job_id": {"$regex": rx}},
-                    {"email": {"$regex": rx}},
-                    {"name": {"$regex": rx}},
-                    {"discount_code": {"$regex": rx}},
-                    {"book_id": {"$regex": rx}},
-                    {"locale": {"$regex": rx}},
-                    {"shipping_address.city": {"$regex": rx}},
-                ]
-            })
+    _add_search(query, q, ORDER_SEARCH_FIELDS)
 
-    skip = (page - 1) * limit
-    total_count = orders_collection.count_documents(query)
+    # Projection
+    try:
+        keys = select_fields(fields, ORDERS_LIST_FIELDS)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    projection = fieldset_projection(keys)
 
-    # Sorting
-    sort_field = sort_by if sort_by else "created_at"
-    sort_order = 1 if sort_dir == "asc" else -1
-
-    # Projection
-    projection = {
-        "order_id": 1,
-        "job_id": 1,
-        "cover_url": 1,
-        "book_url": 1,
-        "preview_url": 1,
-        "name": 1,
-        "shipping_address": 1,
-        "created_at": 1,
-        "processed_at": 1,
-        "approved_at": 1,
-        "approved": 1,
-        "book_id": 1,
-        "book_style": 1,
-        "print_status": 1,
-        "price": 1,
-        "total_price": 1,
-        "amount": 1,
-        "total_amount": 1,
-        "feedback_email": 1,
-        "print_approval": 1,
-        "discount_code": 1,
-        "currency": 1,
-        "locale": 1,
-        "quantity": 1,
-        "_id": 0,
-        "shipped_at": 1,
-        "cust_status": 1,
-        "printer": 1,
-        "locked": 1,
-        "locked_by": 1,
-        "unlock_by": 1,
-        "print_sent_by": 1,
-        "google_review_received": 1,
-    }
-
-    cursor = orders_collection.find(query, projection).sort(
-        sort_field, sort_order).skip(skip).limit(limit)
-    records = list(cursor)
-    result = []
-
-    for doc in records:
-        result.append({
-            "order_id": doc.get("order_id", ""),
-            "job_id": doc.get("job_id", ""),
-            "coverPdf": doc.get("cover_url", ""),
-            "interiorPdf": doc.get("book_url", ""),
-            "previewUrl": doc.get("preview_url", ""),
-            "name": doc.get("name", ""),
-            "city": doc.get("shipping_address", {}).get("city", ""),
-            "price": doc.get("price", doc.get("total_price", doc.get("amount", doc.get("total_amount", 0)))),
-            "paymentDate": doc.get("processed_at", ""),
-            "approvalDate": doc.get("approved_at", ""),
-            "status": "Approved" if doc.get("approved") else "Uploaded",
-            "bookId": doc.get("book_id", ""),
-            "bookStyle": doc.get("book_style", ""),
-            "printStatus": doc.get("print_status", ""),
-            "feedback_email": doc.get("feedback_email", False),
-            "print_approval": doc.get("print_approval", None),
-            "discount_code": doc.get("discount_code", ""),
-            "currency": doc.get("currency", ""),
-            "locale": doc.get("locale", ""),
-            "shippedAt": doc.get("shipped_at"),
-            "quantity": doc.get("quantity", 1),
-            "cust_status": doc.get("cust_status", ""),
-            "printer": doc.get("printer", ""),
-            "locked": bool(doc.get("locked", False)),
-            "locked_by": doc.get("locked_by", ""),
-            "unlock_by": doc.get("unlock_by", ""),
-            "print_sent_by": doc.get("print_sent_by", ""),
-            "google_review_received": bool(doc.get("google_review_received", False)),
-
-        })
+    records, page_info = _list_page(
+        query, projection, sort_by, sort_dir, page, limit, pagination, cursor, approx)
+    result = render_rows(records, keys)
 
     return {
         "orders": result,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total_count,
-            "pages": (total_count + limit - 1) // limit
-        }
+        "pagination": page_info,
     }
 
 def _first_non_empty(d: Dict[str, Any], keys: List[str], default=None):
@@ -2480,15 +2665,8 @@ def get_aws_region() -> str:
 
 
 def _get_s3_client() -> Tuple[boto3.client, str]:
-    bucket = os.getenv("REPLICACOMFY_BUCKET", "").strip()
     region = get_aws_region()
-    return boto3.client(
-        "s3",
-        region_name=region,
-        config=Config(
-            retries={"max_attempts": 3, "mode": "standard"}
-        )
-    )
+    return aws_client("s3", region)
 
 def _s3_key_for_input(filename: str) -> str:
     base = os.path.basename(filename).strip()
@@ -2504,31 +2682,25 @@ def _generate_presigned_url(s3, bucket: str, key: str, expires_in: int = 3600) -
 def _presigned_urls_for_saved_files(files: List[str], expires_in: int = 3600) -> List[str]:
     if not files:
         return []
-    try:
-        bucket = os.getenv("REPLICACOMFY_BUCKET")
-        s3 = _get_s3_client()
-    except HTTPException:
-        raise
+    bucket = os.getenv("REPLICACOMFY_BUCKET")
 
     urls: List[str] = []
     for f in files[:3]:
         key = _s3_key_for_input(f)
         try:
-            # Verify the object exists before signing
-            s3.head_object(Bucket=bucket, Key=key)
-            urls.append(_generate_presigned_url(
-                s3, bucket, key, expires_in=expires_in))
+            # HEAD (existence) + sign, both cached; missing objects are skipped
+            url = cached_presigned_url(_get_s3_client, bucket, key, expires_in=expires_in)
+            if url:
+                urls.append(url)
+        except HTTPException:
+            raise
         except NoCredentialsError:
             raise HTTPException(
                 status_code=500, detail="AWS credentials not available")
         except PartialCredentialsError:
             raise HTTPException(
                 status_code=500, detail="AWS credentials are incomplete")
-        except ClientError as e:
-            code = getattr(e, "response", {}).get("Error", {}).get("Code")
-            if code in ("404", "NoSuchKey", "NotFound", "AccessDenied"):
-                # Skip silently—don’t break the whole order response
-                continue
+        except ClientError:
             raise HTTPException(
                 status_code=502, detail="S3 error while generating image URLs")
         except Exception:
@@ -2556,61 +2728,43 @@ def _get_s3_client_generic():
             detail="AWS region not configured"
         )
 
-    return boto3.client(
-        "s3",
-        region_name=region,
-        config=Config(
-            retries={"max_attempts": 3, "mode": "standard"}
-        ),
-    )
-
-def _list_objects_with_prefix(s3, bucket: str, prefix: str, max_collect: int = 1000) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    token: Optional[str] = None
-    while True:
-        kwargs = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": 1000}
-        if token:
-            kwargs["ContinuationToken"] = token
-        resp = s3.list_objects_v2(**kwargs)
-        out.extend(resp.get("Contents", []) or [])
-        if not resp.get("IsTruncated") or len(out) >= max_collect:
-            break
-        token = resp.get("NextContinuationToken")
-    return out
-
-
+    return aws_client("s3", region)
 
-def _find_cover_image_url_from_generations(job_id: str, expires_in: int = 3600) -> Optional[str]:
-    bucket = (os.getenv("DIFFRUN_GENERATIONS_BUCKET") or "").strip()
+def _find_cover_image_url_from_generations(
+    job_id: str, expires_in: int = 3600, order: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    Signed URL of the job's cover page. Reads `cover_image_key` from `order` when
+    present; otherwise lists the generations bucket, and stores the key it finds
+    once it is the final `_001.jpg` page.
+    """
+    bucket = generations_bucket()
     if not bucket or not job_id:
         return None
 
     s3 = _get_s3_client_generic()
-    prefix = f"jpg_output/{job_id}_pg0_"
-
-    try:
-        objs = _list_objects_with_prefix(s3, bucket, prefix, max_collect=2000)
-    except ClientError:
-        return None
-
-    if not objs:
-        return None
-
-    preferred = [o for o in objs if str(
-        o.get("Key", "")).lower().endswith("_001.jpg")]
-    chosen = min(preferred or objs, key=lambda o: o.get("LastModified"))
+    key = (order or {}).get(COVER_KEY_FIELD)
+    if not is_final_cover_key(key):
+        try:
+            key = find_cover_key(s3, bucket, job_id)
+        except ClientError:
+            return None
+        if not key:
+            return None
+        try:
+            remember_cover_key(orders_collection, job_id, key)
+        except PyMongoError:
+            logger.warning("[COVER-KEYS] could not store cover key for job %s", job_id, exc_info=True)
 
     try:
-        return s3.generate_presigned_url(
-            "get_object",
-            Params={
-                "Bucket": bucket,
-                "Key": chosen["Key"],
-                # Force browser-friendly headers for inline display
-                "ResponseContentType": "image/jpeg",
-                "ResponseContentDisposition": "inline",
-            },
-            ExpiresIn=expires_in,
+        return cached_presigned_url(
+            lambda: s3,
+            bucket,
+            key,
+            expires_in=expires_in,
+            # Force browser-friendly headers for inline display
+            params={"ResponseContentType": "image/jpeg", "ResponseContentDisposition": "inline"},
+            verify=False,
         )
     except ClientError:
         return None
@@ -2627,16 +2781,18 @@ def _iso(dt: Any) -> Optional[str]:
     except Exception:
         return str(dt)
 
-def _build_order_response(order: Dict[str, Any]) -> Dict[str, Any]:
+def _build_order_response(order: Dict[str, Any], user_doc: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """`user_doc` is the job doc when the caller already fetched it (batch path)."""
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
     job_id = _first_non_empty(order, ["job_id", "JobId", "jobID"], default="")
     current_status = order.get("current_status") 
 
-    user_doc = {}
-    if job_id:
-        user_doc = orders_collection.find_one({"job_id": job_id}) or {}
+    if user_doc is None:
+        user_doc = {}
+        if job_id:
+            user_doc = orders_collection.find_one({"job_id": job_id}) or {}
 
     child_name = _first_non_empty(
         order, ["name"],   default=_first_non_empty(user_doc, ["name"]))
@@ -2701,7 +2857,7 @@ def _build_order_response(order: Dict[str, Any]) -> Dict[str, Any]:
     }
 
     cover_url_from_gen = _find_cover_image_url_from_generations(
-        job_id, expires_in=3600)
+        job_id, expires_in=3600, order=order)
 
     # order financials/ids
     order_details = {
@@ -3112,7 +3268,7 @@ def _pick_excel_engine():
         
 def get_ec2_client():
     region = get_aws_region()
-    return boto3.client("ec2", region_name=region)
+    return aws_client("ec2", region)
 
 def _fmt_ist(dt):
     try:
@@ -3399,6 +3555,10 @@ async def send_to_google_sheet(
             lock_update
         )
 
+        if lock_result.modified_count:
+            kpi_transition(kpi_counters_collection, order, lock_update["$set"])
+            invalidate_stats_cache()
+
         if lock_result.modified_count == 0:
 
             results.append({
@@ -3715,6 +3875,10 @@ async def send_to_yara(payload: BulkPrintRequest, background_tasks: BackgroundTa
 
         lock_result = orders_collection.update_one(lock_filter, lock_update)
 
+        if lock_result.modified_count:
+            kpi_transition(kpi_counters_collection, order, lock_update["$set"])
+            invalidate_stats_cache()
+
         if lock_result.modified_count == 0:
             results.append({
                 "order_id": order_id,
@@ -4218,18 +4382,21 @@ async def approve_printing(payload: BulkPrintRequest, background_tasks: Backgrou
             if response.status_code in [200, 201]:
                 print(f"Updating order status in database for {order_id}...")
                 # mark that Cloudprinter was used and save reference + timestamp
-                orders_collection.update_one(
+                set_ops = {
+                    "print_status": "sent_to_printer",
+                    "printer": "Cloudprinter",                                   # NEW
+                    "cloudprinter_reference": response_data.get("reference", ""),
+                    "print_sent_at": datetime.now().isoformat(),
+                    "print_sent_by": print_sent_by
+                }
+                before = orders_collection.find_one_and_update(
                     {"order_id": order_id},
-                    {
-                        "$set": {
-                            "print_status": "sent_to_printer",
-                            "printer": "Cloudprinter",                                   # NEW
-                            "cloudprinter_reference": response_data.get("reference", ""),
-                            "print_sent_at": datetime.now().isoformat(),
-                            "print_sent_by": print_sent_by
-                        }
-                    }
+                    {"$set": set_ops},
+                    return_document=ReturnDocument.BEFORE,
                 )
+                # a Genesis/Yara order re-sent via Cloudprinter leaves the KPI population
+                kpi_transition(kpi_counters_collection, before, set_ops)
+                invalidate_stats_cache()
 
                 # send the production email ONCE, idempotent
                 once = orders_collection.update_one(
@@ -4314,6 +4481,64 @@ def get_order_detail(order_id: str):
         raise HTTPException(status_code=404, detail="Order not found")
     return _build_order_response(order)
 
+ORDER_DETAILS_BATCH_MAX = int(os.getenv("ORDER_DETAILS_BATCH_MAX", "50"))
+ORDER_DETAILS_BATCH_WORKERS = int(os.getenv("ORDER_DETAILS_BATCH_WORKERS", "8"))
+# bounds the S3 HEAD / list / presign work of all batch requests together
+_order_details_pool = ThreadPoolExecutor(
+    max_workers=ORDER_DETAILS_BATCH_WORKERS, thread_name_prefix="order-details")
+
+@app.post("/api/orders/details:batch")
+def get_order_details_batch(payload: OrderDetailsBatchRequest):
+    """
+    `_build_order_response` for up to ORDER_DETAILS_BATCH_MAX orders: orders and
+    their job docs come from one `$in` query each, the per-order S3 work
+    (input image HEAD + presign, cover listing) runs on a bounded pool.
+    Results are keyed by order_id; unknown ids are listed in `missing`, and an
+    order whose assets failed to resolve is reported in `errors` without
+    failing the rest.
+    """
+    order_ids = list(dict.fromkeys(i.strip() for i in payload.order_ids if i and i.strip()))
+    if not order_ids:
+        raise HTTPException(status_code=400, detail="order_ids is required")
+    if len(order_ids) > ORDER_DETAILS_BATCH_MAX:
+        raise HTTPException(
+            status_code=400, detail=f"at most {ORDER_DETAILS_BATCH_MAX} order_ids per request")
+
+    orders: Dict[str, Dict[str, Any]] = {}
+    for doc in orders_collection.find({"order_id": {"$in": order_ids}}):
+        orders.setdefault(doc["order_id"], doc)
+
+    job_ids = {
+        jid for jid in (_first_non_empty(o, ["job_id", "JobId", "jobID"], default="") for o in orders.values())
+        if jid
+    }
+    job_docs: Dict[str, Dict[str, Any]] = {}
+    if job_ids:
+        for doc in orders_collection.find({"job_id": {"$in": sorted(job_ids)}}):
+            job_docs.setdefault(doc["job_id"], doc)
+
+    def build(order: Dict[str, Any]) -> Dict[str, Any]:
+        job_id = _first_non_empty(order, ["job_id", "JobId", "jobID"], default="")
+        return _build_order_response(order, user_doc=job_docs.get(job_id, {}) if job_id else {})
+
+    futures = {oid: _order_details_pool.submit(build, orders[oid]) for oid in order_ids if oid in orders}
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for oid, fut in futures.items():
+        try:
+            results[oid] = fut.result()
+        except HTTPException as exc:
+            errors[oid] = str(exc.detail)
+        except Exception as exc:
+            logger.exception("[ORDER DETAILS BATCH] %s failed", oid)
+            errors[oid] = str(exc)
+
+    return {
+        "orders": results,
+        "missing": [oid for oid in order_ids if oid not in orders],
+        "errors": errors,
+    }
+
 @app.get("/api/shipping/{order_id}")
 def get_shipping_detail(order_id: str):
     # debug
@@ -4353,6 +4578,11 @@ def get_shipment_orders(
 
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=1000),
+    pagination: PaginationMode = Query("page", description="page (offset) | cursor (keyset; sort_by created_at or processed_at)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (cursor mode)"),
+    approx: bool = Query(False, description="allow an estimated total; exact count is computed in the background"),
+    fields: Optional[List[str]] = Query(
+        None, description="response keys to return (comma-separated or repeated); default is the full row"),
 ):
     """
     Shipment Orders API
@@ -4422,22 +4652,7 @@ def get_shipment_orders(
     # -------------------------
     # Search Query
     # -------------------------
-    if q:
-        term = q.strip()
-        if term:
-            rx = re.compile(re.escape(term), re.IGNORECASE)
-            query.setdefault("$and", []).append({
-                "$or": [
-                    {"order_id": {"$regex": rx}},
-                    {"job_id": {"$regex": rx}},
-                    {"email": {"$regex": rx}},
-                    {"name": {"$regex": rx}},
-                    {"discount_code": {"$regex": rx}},
-                    {"book_id": {"$regex": rx}},
-                    {"locale": {"$regex": rx}},
-                    {"shipping_address.city": {"$regex": rx}},
-                ]
-            })
+    _add_search(query, q, ORDER_SEARCH_FIELDS)
     
    
 
@@ -4497,114 +4712,22 @@ def get_shipment_orders(
     # -------------------------
     # Pagination + Sorting
     # -------------------------
-    skip = (page - 1) * limit
-    total_count = orders_collection.count_documents(query)
-
-    sort_field = sort_by if sort_by else "created_at"
-    sort_order = 1 if sort_dir == "asc" else -1
-
     # -------------------------
     # Projection
     # -------------------------
-    projection = {
-        "order_id": 1,
-        "job_id": 1,
-        "cover_url": 1,
-        "book_url": 1,
-        "preview_url": 1,
-        "name": 1,
-        "shipping_address": 1,
-        "created_at": 1,
-        "processed_at": 1,
-        "approved_at": 1,
-        "approved": 1,
-        "book_id": 1,
-        "book_style": 1,
-        "print_status": 1,
-        "price": 1,
-        "total_price": 1,
-        "amount": 1,
-        "total_amount": 1,
-        "feedback_email": 1,
-        "print_approval": 1,
-        "discount_code": 1,
-        "currency": 1,
-        "locale": 1,
-        "quantity": 1,
-        "_id": 0,
-        "shipped_at": 1,
-        "cust_status": 1,
-        "printer": 1,
-        "locked": 1,
-        "locked_by": 1,
-        "unlock_by": 1,
-        "print_sent_by": 1,
-        "current_status": 1,
-    }
-
-    cursor = (
-        orders_collection
-        .find(query, projection)
-        .sort(sort_field, sort_order)
-        .skip(skip)
-        .limit(limit)
-    )
-
-    # -------------------------
-    # Format Output
-    # -------------------------
-    result = []
-    for doc in list(cursor):
-        result.append({
-            "order_id": doc.get("order_id", ""),
-            "job_id": doc.get("job_id", ""),
-            "coverPdf": doc.get("cover_url", ""),
-            "interiorPdf": doc.get("book_url", ""),
-            "previewUrl": doc.get("preview_url", ""),
-
-            "name": doc.get("name", ""),
-            "city": doc.get("shipping_address", {}).get("city", ""),
-
-            "price": doc.get(
-                "price",
-                doc.get("total_price", doc.get("amount", doc.get("total_amount", 0)))
-            ),
-
-            "paymentDate": doc.get("processed_at", ""),
-            "approvalDate": doc.get("approved_at", ""),
-            "status": "Approved" if doc.get("approved") else "Uploaded",
-
-            "bookId": doc.get("book_id", ""),
-            "bookStyle": doc.get("book_style", ""),
-            "printStatus": doc.get("print_status", ""),
-            "print_approval": doc.get("print_approval", None),
-
-            "discount_code": doc.get("discount_code", ""),
-            "currency": doc.get("currency", ""),
-            "locale": doc.get("locale", ""),
-
-            "shippedAt": doc.get("shipped_at"),
-            "quantity": doc.get("quantity", 1),
-            "cust_status": doc.get("cust_status", ""),
-            "printer": doc.get("printer", ""),
-
-            "locked": bool(doc.get("locked", False)),
-            "locked_by": doc.get("locked_by", ""),
-            "unlock_by": doc.get("unlock_by", ""),
-            "print_sent_by": doc.get("print_sent_by", ""),
+    try:
+        keys = select_fields(fields, SHIPMENT_ORDERS_LIST_FIELDS)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    projection = fieldset_projection(keys)
 
-            # NEW FIELD
-            "shippingStatus": doc.get("current_status", ""),
-        })
+    records, page_info = _list_page(
+        query, projection, sort_by, sort_dir, page, limit, pagination, cursor, approx)
+    result = render_rows(records, keys)
 
     return {
         "orders": result,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total_count,
-            "pages": (total_count + limit - 1) // limit,
-        }
+        "pagination": page_info,
     }
 
 def _sr_login_token() -> str:
@@ -4891,13 +5014,106 @@ def _render_na_table(title: str, wnd_from: str, wnd_to: str, rows: list[dict]) -
 
     return header + table
 
+def _status_board_query(cs, ce, loc_match) -> dict:
+    ands: List[dict] = [{"paid": True}]
+    if not _derived_ready():
+        ands.append(raw_window_match("processed_at", cs, ce) if cs and ce
+                    else {"processed_at": {"$exists": True, "$nin": [None, ""]}})
+    elif cs and ce:
+        ands.append({"processed_at_dt": {"$gte": cs, "$lt": ce}})
+    else:
+        ands.append({"processed_at_dt": {"$ne": None}})
+    if loc_match:
+        ands.append(loc_match)
+    return {"$and": ands}
+
+def _status_board_frame(cs, ce, loc, loc_match) -> status_board.StatusFrame:
+    """Paid orders processed in [cs, ce) (all time if no window), shared by ship-status-v2 and order-status."""
+    return status_board.load_status_frame(
+        orders_collection, _status_board_query(cs, ce, loc_match),
+        cache_key=(cs, ce, (loc or "").strip().upper()), derived=_derived_ready())
+
+def _status_board_token(board, cs, ce, loc, printer, labels, today_day=None) -> str:
+    return status_board.encode_drilldown_token({
+        "board": board,
+        "cs": cs.isoformat() if cs else None,
+        "ce": ce.isoformat() if ce else None,
+        "loc": loc,
+        "printer": printer,
+        "from": labels[0].split(" ")[0] if labels else None,
+        "to": labels[-1].split(" ")[0] if labels else None,
+        "today": today_day,
+    })
+
+
+@app.get("/api/stats/status-board/drilldown")
+@cached_stats
+def stats_status_board_drilldown(
+    token: str = Query(..., description="drilldown_token from ship-status-v2 / order-status"),
+    column: str = Query(..., description="row column (e.g. shipped, unapproved) or pending_age"),
+    date: Optional[str] = Query(None, description="YYYY-MM-DD row date"),
+    age: Optional[int] = Query(None, ge=0, description="pending_age bucket (days)"),
+    page: int = Query(1, ge=1),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Resolve one cell of a status board into its order ids, a page at a time."""
+    try:
+        params = status_board.decode_drilldown_token(token)
+        cs = datetime.fromisoformat(params["cs"]) if params.get("cs") else None
+        ce = datetime.fromisoformat(params["ce"]) if params.get("ce") else None
+        labels = []
+        if params.get("from") and params.get("to"):
+            cur = datetime.strptime(params["from"], "%Y-%m-%d")
+            last = datetime.strptime(params["to"], "%Y-%m-%d")
+            while cur <= last:
+                labels.append(cur.strftime("%Y-%m-%d"))
+                cur += timedelta(days=1)
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e) or "invalid drill-down token")
+
+    loc = params.get("loc")
+    try:
+        loc_match = _build_loc_match(loc)
+    except Exception:
+        loc_match = None
+
+    frame = _status_board_frame(cs, ce, loc, loc_match).for_printer(params.get("printer"))
+    if params["board"] == "ship":
+        frame = frame.without_cancelled_or_refunded()
+
+    try:
+        ids = status_board.board_column_ids(
+            frame, params["board"], labels, column,
+            date=date, age=age, today_day=params.get("today"),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total = len(ids)
+    skip = (page - 1) * limit
+    return {
+        "column": column,
+        "date": date,
+        "age": age,
+        "order_ids": ids[skip:skip + limit],
+        "pagination": {
+            "page": page,
+            "limit": limit,
+            "total": total,
+            "pages": (total + limit - 1) // limit,
+        },
+    }
+
+
 @app.get("/api/stats/order-status")
+@cached_stats
 def stats_order_status(
     range: str = Query("1w", description="1d, 1w, 1m, 6m, this_month, custom"),
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     printer: Optional[str] = Query("all", description="genesis | yara"),
     loc: Optional[str] = Query("IN", description="country code"),
+    include_ids: bool = Query(False, description="embed *_ids lists (legacy); the UI drills down via drilldown_token"),
 ):
     """
     Order Status
@@ -4906,9 +5122,6 @@ def stats_order_status(
     WITH cancelled, rejected, refunded, reprint
     """
 
-    exclude_codes = ["TEST", "COLLAB", "REJECTED", "TINA"]
-    exclude_set = {c.upper() for c in exclude_codes}
-
     # --------------------------------------------------
     # Location match
     # --------------------------------------------------
@@ -4940,187 +5153,16 @@ def stats_order_status(
         cs = ce = None
 
     # --------------------------------------------------
-    # 2) Base order query
-    # --------------------------------------------------
-    base_match = {
-        "paid": True,
-        "processed_at": {"$exists": True, "$ne": None},
-    }
-
-    if loc_match:
-        base_match = {"$and": [base_match, loc_match]}
-
-    if cs and ce:
-        date_filter = {"processed_at": {"$gte": cs, "$lt": ce}}
-        if "$and" in base_match:
-            base_match["$and"].append(date_filter)
-        else:
-            base_match = {"$and": [base_match, date_filter]}
-
-    projection = {
-        "order_id": 1,
-        "processed_at": 1,
-        "printer": 1,
-        "discount_code": 1,
-        "current_status": 1,
-        "_id": 0,
-    }
-
-    cursor = orders_collection.find(base_match, projection)
-
-    # --------------------------------------------------
-    # 3) Organize orders
-    # --------------------------------------------------
-    orders_by_date = {k.split(" ")[0]: [] for k in labels}
-
-    for doc in cursor:
-        try:
-            raw_code = (doc.get("discount_code") or "").strip().upper()
-            if raw_code in exclude_set:
-                continue
-
-            dt = doc.get("processed_at")
-            if isinstance(dt, str):
-                dt = date_parser.isoparse(dt)
-
-            if not dt:
-                continue
-
-            dt_ist = dt.astimezone(IST_TZ)
-            ist_date = dt_ist.strftime("%Y-%m-%d")
-
-            if ist_date not in orders_by_date:
-                continue
-
-            printer_val = (doc.get("printer") or "").strip().lower()
-            if printer and printer.lower() not in ("all", ""):
-                if printer_val != printer.lower():
-                    continue
-
-            status = (doc.get("current_status") or "").strip().lower()
-            order_status = (doc.get("order_status") or "").strip().lower()
-            oid = doc.get("order_id")
-
-            orders_by_date[ist_date].append({
-                "order_id": oid,
-                "current_status": status,
-                "order_status": order_status,
-                "printer": printer_val,
-            })
-
-        except Exception:
-            continue
-
-    # --------------------------------------------------
-    # 4) Build rows per day
+    # 2) Shared window frame → per-day rows
     # --------------------------------------------------
-    rows = []
-
-    for lbl in labels:
-        date_key = lbl.split(" ")[0]
-        day_orders = orders_by_date.get(date_key, [])
-
-        unapproved_ids = []
-        new_ids = []
-        sent_to_print_ids = []
-        shipped_ids = []
-        delivered_ids = []
-
-        cancelled_ids = []
-        rejected_ids = []
-        refunded_ids = []
-        reprint_ids = []
-
-        for od in day_orders:
-            oid = od["order_id"]
-            printer_val = od["printer"]
-            status = od["current_status"]
-            order_status = od["order_status"]
-
-            # ------------------------------
-            # BUSINESS TERMINAL STATES FIRST
-            # ------------------------------
-            if order_status == "cancelled":
-                cancelled_ids.append(oid)
-                continue
-
-            if order_status == "rejected":
-                rejected_ids.append(oid)
-                continue
-
-            if order_status == "refunded":
-                refunded_ids.append(oid)
-                continue
-
-            if order_status == "reprint":
-                reprint_ids.append(oid)
-                continue
-
-            # ------------------------------
-            # NORMAL FLOW
-            # ------------------------------
-            if not printer_val:
-                unapproved_ids.append(oid)
-
-            if printer_val in ("genesis", "yara"):
-                sent_to_print_ids.append(oid)
-
-            if not status:
-                new_ids.append(oid)
-                continue
-
-            if "delivered" in status:
-                delivered_ids.append(oid)
-                continue
-
-            if (
-                "picked up" in status
-                or "pickup done" in status
-                or "in transit" in status
-                or "transit" in status
-            ):
-                shipped_ids.append(oid)
-                continue
-
-            shipped_ids.append(oid)
-
-        rows.append({
-            "date": date_key,
-            "total": len(day_orders),
-
-            "unapproved": len(unapproved_ids),
-            "unapproved_ids": unapproved_ids,
-
-            "sent_to_print": len(sent_to_print_ids),
-            "sent_to_print_ids": sent_to_print_ids,
-
-            "new": len(new_ids),
-            "new_ids": new_ids,
-
-            "shipped": len(shipped_ids),
-            "shipped_ids": shipped_ids,
-
-            "delivered": len(delivered_ids),
-            "delivered_ids": delivered_ids,
-
-            # ✅ NEW FIELDS
-            "cancelled": len(cancelled_ids),
-            "cancelled_ids": cancelled_ids,
-
-            "rejected": len(rejected_ids),
-            "rejected_ids": rejected_ids,
-
-            "refunded": len(refunded_ids),
-            "refunded_ids": refunded_ids,
-
-            "reprint": len(reprint_ids),
-            "reprint_ids": reprint_ids,
-        })
+    frame = _status_board_frame(cs, ce, loc, loc_match).for_printer(printer)
+    rows = status_board.order_status_board(frame, labels, include_ids=include_ids)
 
     return {
         "labels": labels,
         "rows": rows,
         "printer": printer or "all",
+        "drilldown_token": _status_board_token("order", cs, ce, loc, printer, labels),
     }
 
 
@@ -5458,6 +5500,9 @@ def get_jobs(
         None, description="Search by job_id, order_id, name"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=1000),
+    pagination: PaginationMode = Query("page", description="page (offset) | cursor (keyset; sort_by created_at or processed_at)"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (cursor mode)"),
+    approx: bool = Query(False, description="allow an estimated total; exact count is computed in the background"),
 ):
 
     query = {}
@@ -5471,20 +5516,7 @@ def get_jobs(
         query["book_id"] = filter_book_style
 
     # NEW: Search functionality
-    if q and q.strip():
-        term = q.strip()
-        rx = re.compile(re.escape(term), re.IGNORECASE)
-        query.setdefault("$and", []).append({
-            "$or": [
-                {"job_id": {"$regex": rx}},
-                {"order_id": {"$regex": rx}},
-                {"name": {"$regex": rx}},
-                {"book_id": {"$regex": rx}},
-            ]
-        })
-
-    sort_field = sort_by if sort_by else "created_at"
-    sort_order = 1 if sort_dir == "asc" else -1
+    _add_search(query, q, JOB_SEARCH_FIELDS)
 
     projection = {
         "order_id": 1,
@@ -5516,11 +5548,8 @@ def get_jobs(
         "error_reason": 1,
     }
 
-    skip = (page - 1) * limit
-    total_count = orders_collection.count_documents(query)
-
-    records = list(orders_collection.find(
-        query, projection).sort(sort_field, sort_order).skip(skip).limit(limit))
+    records, page_info = _list_page(
+        query, projection, sort_by, sort_dir, page, limit, pagination, cursor, approx)
 
     result = []
 
@@ -5557,12 +5586,7 @@ def get_jobs(
 
     return {
         "jobs": result,
-        "pagination": {
-            "page": page,
-            "limit": limit,
-            "total": total_count,
-            "pages": (total_count + limit - 1) // limit
-        }
+        "pagination": page_info,
     }
 
 @app.get("/api/export-orders-csv")
@@ -6084,39 +6108,32 @@ def _hourly_reconcile_and_email():
     except Exception as e:
         logger.exception("[RECONCILE-HOURLY] Email send failed: %s", e)
 
-def _parse_iso_utc(dt):
-    """
-    Safely parse ISO datetime string or datetime to UTC-aware datetime.
-    Returns None if invalid.
-    """
-    if not dt:
-        return None
-
-    if isinstance(dt, datetime):
-        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
-
-    if isinstance(dt, str):
-        try:
-            parsed = datetime.fromisoformat(dt)
-            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
-        except Exception:
-            return None
-
-    return None
-
 def _last_iso_week(year: int) -> int:
     return datetime(year, 12, 28).isocalendar()[1]
 
 def _iso_week_bounds(year: int, week: int):
-    start_ist = datetime.fromisocalendar(year, week, 1).replace(tzinfo=IST_TZ)
+    # ZoneInfo, not pytz: replace(tzinfo=<pytz tz>) picks the LMT offset (+05:53)
+    start_ist = datetime.fromisocalendar(year, week, 1).replace(tzinfo=TZ_IST)
     end_ist = start_ist + timedelta(days=7)
     return start_ist.astimezone(timezone.utc), end_ist.astimezone(timezone.utc)
 
 def _sla_base_query(start_utc, end_utc):
+    derived = _derived_ready()
+    if STATS_ORDER_FLAGS and derived:
+        return {
+            "paid": True,
+            "processed_at_dt": {"$gte": start_utc, "$lt": end_utc},
+            "printer": {"$in": ["Genesis", "Yara"]},
+            **flag_population_match(),
+        }
+    window = (
+        {"processed_at_dt": {"$gte": start_utc, "$lt": end_utc}} if derived
+        else raw_window_match("processed_at", start_utc, end_utc)
+    )
     return {
         "$and": [
             {"paid": True},
-            {"processed_at": {"$gte": start_utc, "$lt": end_utc}},
+            window,
             {"printer": {"$in": ["Genesis", "Yara"]}},
             {"order_id": {"$regex": r"^#\d+(_\d+)?$"}},
             {
@@ -6444,15 +6461,36 @@ def debug_run_export_email():
         logger.exception("Manual export failed")
         return {"status": "error", "message": str(e)}
 
+@app.post("/debug/backfill-order-timestamps")
+def debug_backfill_order_timestamps(background_tasks: BackgroundTasks):
+    background_tasks.add_task(backfill_order_timestamps, orders_collection)
+    return {"ok": True, "queued": "backfill_order_timestamps"}
+
+@app.post("/debug/backfill-cover-keys")
+def debug_backfill_cover_keys(background_tasks: BackgroundTasks):
+    background_tasks.add_task(backfill_cover_keys, orders_collection, _get_s3_client_generic)
+    return {"ok": True, "queued": "backfill_cover_keys"}
+
 @app.post("/debug/run-reconcile-now")
 def debug_run_reconcile_now():
     _hourly_reconcile_and_email()
     return {"ok": True}
 
-EXCLUDE_CODES = ["TEST", "REJECTED", "TINA"]
 EXCLUDE_SET = {c.upper() for c in EXCLUDE_CODES}
 
+
+def _sla_frame(start_utc: datetime, end_utc: datetime) -> sla_engine.SlaFrame:
+    """Shared columnar frame of the SLA population processed in [start_utc, end_utc)."""
+    return sla_engine.load_sla_frame(
+        orders_collection,
+        _sla_base_query(start_utc, end_utc),
+        cache_key=(start_utc, end_utc),
+        exclude_codes=EXCLUDE_CODES,
+        derived=_derived_ready(),
+    )
+
 @app.get("/api/stats/sla-cohorts") #Delivery vs Undelivered in 8 days
+@cached_stats
 def stats_sla_cohorts(
     start_date: str = Query(..., description="YYYY-MM-DD (processed_at cohort)"),
     end_date: str = Query(..., description="YYYY-MM-DD (processed_at cohort)"),
@@ -6463,339 +6501,32 @@ def stats_sla_cohorts(
     start_ist = _ist_midnight(_parse_ymd_ist(start_date))
     end_ist = _ist_midnight(_parse_ymd_ist(end_date)) + timedelta(days=1)
 
-    start_utc = start_ist.astimezone(timezone.utc)
-    end_utc = end_ist.astimezone(timezone.utc)
-
-    # -------------------------------------------------
-    # Mongo query
-    # -------------------------------------------------
-    base_query = {
-        "$and": [
-            {"paid": True},
-            {"processed_at": {"$gte": start_utc, "$lt": end_utc}},
-            {"printer": {"$in": ["Genesis", "Yara"]}},
-            {"order_id": {"$regex": r"^#\d+(_\d+)?$"}},
-            {
-                "$or": [
-                    {"discount_code": {"$exists": False}},
-                    {"discount_code": None},
-                    {
-                        "$expr": {
-                            "$not": {
-                                "$in": [
-                                    {"$toUpper": "$discount_code"},
-                                    EXCLUDE_CODES
-                                ]
-                            }
-                        }
-                    }
-                ]
-            },
-            {
-                "$or": [
-                    {"current_status": {"$exists": False}},
-                    {"current_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-            {
-                "$or": [
-                    {"order_status": {"$exists": False}},
-                    {"order_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-        ]
-    }
-
-
-    projection = {
-        "_id": 0,
-        "order_id": 1,
-        "processed_at": 1,
-        "current_status": 1,
-        "current_timestamp_iso": 1,  # used ONLY if DELIVERED
-    }
-
-    docs = list(orders_collection.find(base_query, projection))
-
-    cohorts: Dict[str, Dict[str, Any]] = {}
-
-    # -------------------------------------------------
-    # Core processing
-    # -------------------------------------------------
-    for d in docs:
-        processed_at = d.get("processed_at")
-        if not processed_at:
-            continue
-
-        # Cohort key = processed_at date (IST)
-        proc_date_ist = processed_at.astimezone(IST_TZ).date()
-        cohort_key = proc_date_ist.isoformat()
-
-        status = (d.get("current_status") or "").upper()
-        is_delivered = status == "DELIVERED"
+    frame = _sla_frame(start_ist.astimezone(timezone.utc), end_ist.astimezone(timezone.utc))
+    frame = frame.without_excluded()
 
-        # -----------------------------
-        # SLA check (strict & safe)
-        # -----------------------------
-        delivered_in_8_days = "NO"
-
-        if is_delivered:
-            delivered_at = _parse_iso_utc(d.get("current_timestamp_iso"))
-
-            if delivered_at:
-                delta_days = (delivered_at - processed_at).days
-                if delta_days <= 8:
-                    delivered_in_8_days = "YES"
-
-        cohorts.setdefault(
-            cohort_key,
-            {
-                "total": 0,
-                "delivered": 0,
-                "undelivered": 0,
-                "orders": [],
-            },
-        )
-
-        c = cohorts[cohort_key]
-        c["total"] += 1
-
-        if is_delivered:
-            c["delivered"] += 1
-        else:
-            c["undelivered"] += 1
-
-        c["orders"].append(
-            {
-                "order_id": d["order_id"],
-                "processed_at": processed_at,
-                "current_status": d.get("current_status"),
-                "delivered_in_8_days": delivered_in_8_days,
-                "delivered_at": d.get("current_timestamp_iso") if is_delivered else None,
-            }
-        )
-
-    # -------------------------------------------------
     # Drill-down table (date click)
-    # -------------------------------------------------
     if cohort_date:
-        bucket = cohorts.get(cohort_date)
-        if not bucket:
-            return []
-        return bucket["orders"]
+        return sla_engine.cohort_orders(frame, cohort_date)
 
-    # -------------------------------------------------
     # Summary for bar chart
-    # -------------------------------------------------
-    response = []
-
-    for day in sorted(cohorts.keys()):
-        c = cohorts[day]
-        total = c["total"]
-
-        response.append(
-            {
-                "processed_date": day,
-                "delivered_pct": round(c["delivered"] * 100 / total, 1),
-                "undelivered_pct": round(c["undelivered"] * 100 / total, 1),
-                "total_orders": total,
-            }
-        )
-
-    return response
+    return sla_engine.cohort_summary(frame)
 
 @app.get("/api/stats/delivery-latency-cohorts") #Delivery Time Cohort table
+@cached_stats
 def delivery_latency_cohorts(
     start_date: str = Query(..., description="YYYY-MM-DD"),
     end_date: str = Query(..., description="YYYY-MM-DD"),
 ):
-    # -----------------------------
-    # Date range (IST → UTC)
-    # -----------------------------
     start_ist = _ist_midnight(_parse_ymd_ist(start_date))
     end_ist = _ist_midnight(_parse_ymd_ist(end_date)) + timedelta(days=1)
 
-    start_utc = start_ist.astimezone(timezone.utc)
-    end_utc = end_ist.astimezone(timezone.utc)
-
-    # -----------------------------
-    # Mongo query — ALL orders
-    # -----------------------------
-    query = {
-        "$and": [
-            {"paid": True},
-            {"processed_at": {"$gte": start_utc, "$lt": end_utc}},
-            {"printer": {"$in": ["Genesis", "Yara"]}},
-            {"order_id": {"$regex": r"^#\d+(_\d+)?$"}},
-            {
-                "$or": [
-                    {"discount_code": {"$exists": False}},
-                    {"discount_code": None},
-                    {
-                        "$expr": {
-                            "$not": {
-                                "$in": [
-                                    {"$toUpper": "$discount_code"},
-                                    EXCLUDE_CODES
-                                ]
-                            }
-                        }
-                    }
-                ]
-            },
-            {
-                "$or": [
-                    {"current_status": {"$exists": False}},
-                    {"current_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-            {
-                "$or": [
-                    {"order_status": {"$exists": False}},
-                    {"order_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-        ]
-    }
-
-    projection = {
-        "_id": 0,
-        "processed_at": 1,
-        "current_status": 1,
-        "current_timestamp_iso": 1,
-    }
-
-    docs = list(orders_collection.find(query, projection))
-
-    # -----------------------------
-    # Buckets by processed date
-    # -----------------------------
-    buckets_by_day: Dict[str, Dict[str, Any]] = {}
-
-    for d in docs:
-        processed_at = d.get("processed_at")
-        if not processed_at:
-            continue
-
-        cohort_day = processed_at.astimezone(IST_TZ).date().isoformat()
-
-        buckets_by_day.setdefault(
-            cohort_day,
-            {
-                "total_orders": 0,
-                "delivered_orders": 0,
-                "day_le_3": 0,   # 👈 NEW
-                "day_4": 0,
-                "day_5": 0,
-                "day_6": 0,
-                "day_7": 0,
-                "day_8": 0,
-                "day_9": 0,
-                "day_10_plus": 0,
-            },
-        )
-
-        c = buckets_by_day[cohort_day]
-
-        # ✅ Count ALL orders
-        c["total_orders"] += 1
-
-        # Only delivered orders go into buckets
-        status = (d.get("current_status") or "").strip().upper()
-        if status != "DELIVERED":
-            continue
-
-        delivered_at = _parse_iso_utc(d.get("current_timestamp_iso"))
-        if not delivered_at:
-            continue
-
-        c["delivered_orders"] += 1
-
-        days_taken = (delivered_at - processed_at).days
-
-        # -----------------------------
-        # NEW BUCKET LOGIC
-        # -----------------------------
-        if days_taken <= 3:
-            c["day_le_3"] += 1
-        elif days_taken == 4:
-            c["day_4"] += 1
-        elif days_taken == 5:
-            c["day_5"] += 1
-        elif days_taken == 6:
-            c["day_6"] += 1
-        elif days_taken == 7:
-            c["day_7"] += 1
-        elif days_taken == 8:
-            c["day_8"] += 1
-        elif days_taken == 9:
-            c["day_9"] += 1
-        elif days_taken >= 10:
-            c["day_10_plus"] += 1
+    frame = _sla_frame(start_ist.astimezone(timezone.utc), end_ist.astimezone(timezone.utc))
 
-    # -----------------------------
-    # Build response + TOTAL row
-    # -----------------------------
-    response = []
-
-    total_acc = {
-        "total_orders": 0,
-        "delivered_orders": 0,
-        "day_le_3": 0,
-        "day_4": 0,
-        "day_5": 0,
-        "day_6": 0,
-        "day_7": 0,
-        "day_8": 0,
-        "day_9": 0,
-        "day_10_plus": 0,
-    }
-
-    for day in sorted(buckets_by_day.keys()):
-        c = buckets_by_day[day]
-        total = c["total_orders"] or 1
-
-        # accumulate raw counts
-        for k in total_acc:
-            total_acc[k] += c.get(k, 0)
-
-        response.append(
-            {
-                "processed_date": day,
-                "total_orders": c["total_orders"],
-                "delivered_orders": c["delivered_orders"],
-                "day_le_3": round(c["day_le_3"] * 100 / total, 1),
-                "day_4": round(c["day_4"] * 100 / total, 1),
-                "day_5": round(c["day_5"] * 100 / total, 1),
-                "day_6": round(c["day_6"] * 100 / total, 1),
-                "day_7": round(c["day_7"] * 100 / total, 1),
-                "day_8": round(c["day_8"] * 100 / total, 1),
-                "day_9": round(c["day_9"] * 100 / total, 1),
-                "day_10_plus": round(c["day_10_plus"] * 100 / total, 1),
-            }
-        )
-
-    grand_total = total_acc["total_orders"] or 1
-
-    response.append(
-        {
-            "processed_date": "TOTAL",
-            "total_orders": total_acc["total_orders"],
-            "delivered_orders": total_acc["delivered_orders"],
-            "day_le_3": round(total_acc["day_le_3"] * 100 / grand_total, 1),
-            "day_4": round(total_acc["day_4"] * 100 / grand_total, 1),
-            "day_5": round(total_acc["day_5"] * 100 / grand_total, 1),
-            "day_6": round(total_acc["day_6"] * 100 / grand_total, 1),
-            "day_7": round(total_acc["day_7"] * 100 / grand_total, 1),
-            "day_8": round(total_acc["day_8"] * 100 / grand_total, 1),
-            "day_9": round(total_acc["day_9"] * 100 / grand_total, 1),
-            "day_10_plus": round(total_acc["day_10_plus"] * 100 / grand_total, 1),
-        }
-    )
-
-    return response
+    # per-day bucket shares + TOTAL row
+    return sla_engine.latency_cohorts(frame.without_excluded())
 
 @app.get("/api/stats/shipment-weekly-sla")
+@cached_stats
 def shipment_weekly_sla(
     weeks: int = Query(6, ge=1, le=12),
     exclude_weeks: int = Query(2, ge=0, le=4),
@@ -6871,74 +6602,25 @@ def shipment_weekly_sla(
     rows = []
 
     # --------------------------------------------------
-    # 2) Process each week (UNCHANGED SLA LOGIC)
+    # 2) One fetch for the whole span, split per ISO week
     # --------------------------------------------------
+    span_start, _ = _iso_week_bounds(*target_weeks[0])
+    _, span_end = _iso_week_bounds(*target_weeks[-1])
+    per_week = sla_engine.weekly_sla_by_week(_sla_frame(span_start, span_end), target_weeks)
+
     for year, week in target_weeks:
         timeline.append(week)
 
         start_utc, end_utc = _iso_week_bounds(year, week)
-        start_ist = start_utc.astimezone(IST_TZ)
-        end_ist = (end_utc - timedelta(seconds=1)).astimezone(IST_TZ)
-
-        query = _sla_base_query(start_utc, end_utc)
-
-        projection = {
-            "_id": 0,
-            "processed_at": 1,
-            "current_status": 1,
-            "current_timestamp_iso": 1,
-        }
-
-        docs = list(orders_collection.find(query, projection))
-
-        total_orders = len(docs)
-        delivered_orders = 0
-        le_3 = d4_8 = ge_9 = 0
-        delivery_days = []
-
-        for d in docs:
-            if (d.get("current_status") or "").upper() != "DELIVERED":
-                continue
-
-            delivered_at = _parse_iso_utc(d.get("current_timestamp_iso"))
-            if not delivered_at:
-                continue
-
-            processed_at = d["processed_at"]
-            days = max((delivered_at - processed_at).days, 0)
-
-            delivered_orders += 1
-            delivery_days.append(days)
-
-            if days <= 3:
-                le_3 += 1
-            elif 4 <= days <= 8:
-                d4_8 += 1
-            else:
-                ge_9 += 1
-
-        avg_days = round(sum(delivery_days) / len(delivery_days), 2) if delivery_days else 0
-        delivered_pct = round(delivered_orders * 100 / total_orders, 2) if total_orders else 0
+        start_ist = start_utc.astimezone(TZ_IST)
+        end_ist = (end_utc - timedelta(seconds=1)).astimezone(TZ_IST)
 
         rows.append({
             "week": week,
             "year": year,
             "from_date": start_ist.date().isoformat(),
             "to_date": end_ist.date().isoformat(),
-            "total_orders": total_orders,
-            "total_delivered": delivered_orders,
-            "delivered_pct": delivered_pct,
-            "avg_days": avg_days,
-            "sla_counts": {
-                "le_3": le_3,
-                "d4_8": d4_8,
-                "ge_9": ge_9,
-            },
-            "sla_pct": {
-                "le_3": round(le_3 * 100 / delivered_orders, 2) if delivered_orders else 0,
-                "d4_8": round(d4_8 * 100 / delivered_orders, 2) if delivered_orders else 0,
-                "ge_9": round(ge_9 * 100 / delivered_orders, 2) if delivered_orders else 0,
-            },
+            **per_week[(year, week)],
         })
 
     # --------------------------------------------------
@@ -6956,6 +6638,7 @@ def shipment_weekly_sla(
     }
 
 @app.get("/api/stats/sla-summary") #“Orders delivered within 8 days”, “Not delivered within 8 days”)
+@cached_stats
 def stats_sla_summary(
     start_date: str = Query(...),
     end_date: str = Query(...)
@@ -6963,167 +6646,20 @@ def stats_sla_summary(
     start_ist = _ist_midnight(_parse_ymd_ist(start_date))
     end_ist = _ist_midnight(_parse_ymd_ist(end_date)) + timedelta(days=1)
 
-    start_utc = start_ist.astimezone(timezone.utc)
-    end_utc = end_ist.astimezone(timezone.utc)
-
-    query = {
-        "$and": [
-            {"paid": True},
-            {"processed_at": {"$gte": start_utc, "$lt": end_utc}},
-            {"printer": {"$in": ["Genesis", "Yara"]}},
-            {"order_id": {"$regex": r"^#\d+(_\d+)?$"}},
-            {
-                "$or": [
-                    {"discount_code": {"$exists": False}},
-                    {"discount_code": None},
-                    {
-                        "$expr": {
-                            "$not": {
-                                "$in": [
-                                    {"$toUpper": "$discount_code"},
-                                    EXCLUDE_CODES
-                                ]
-                            }
-                        }
-                    }
-                ]
-            },
-            {
-                "$or": [
-                    {"current_status": {"$exists": False}},
-                    {"current_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-            {
-                "$or": [
-                    {"order_status": {"$exists": False}},
-                    {"order_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-        ]
-    }
-
-
-    projection = {
-        "_id": 0,
-        "processed_at": 1,
-        "current_status": 1,
-        "current_timestamp_iso": 1,
-    }
-
-    docs = list(orders_collection.find(query, projection))
-
-    delivered = 0
-    undelivered = 0
-
-    for d in docs:
-        status = (d.get("current_status") or "").upper()
-
-        if status == "DELIVERED":
-            delivered_at = _parse_iso_utc(d.get("current_timestamp_iso"))
-            if delivered_at:
-                delta = (delivered_at - d["processed_at"]).days
-                if delta <= 8:
-                    delivered += 1
-                else:
-                    undelivered += 1
-            else:
-                undelivered += 1
-        else:
-            undelivered += 1
-
-    return {
-        "delivered_within_8_days": delivered,
-        "not_delivered_within_8_days": undelivered,
-        "total_orders": delivered + undelivered,
-    }
+    frame = _sla_frame(start_ist.astimezone(timezone.utc), end_ist.astimezone(timezone.utc))
+    return sla_engine.sla_summary(frame.without_excluded())
 
 @app.get("/api/stats/production-kpis")
+@cached_stats
 def production_kpis():
-    query = {
-        "$and": [
-            {"paid": True},
-            {"printer": {"$in": ["Genesis", "Yara"]}},
-            {"order_id": {"$regex": r"^#\d+(_\d+)?$"}},
-            {
-                "$or": [
-                    {"discount_code": {"$exists": False}},
-                    {"discount_code": None},
-                    {
-                        "$expr": {
-                            "$not": {
-                                "$in": [
-                                    {"$toUpper": "$discount_code"},
-                                    EXCLUDE_CODES
-                                ]
-                            }
-                        }
-                    }
-                ]
-            },
-            {
-                "$or": [
-                    {"current_status": {"$exists": False}},
-                    {"current_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-            {
-                "$or": [
-                    {"order_status": {"$exists": False}},
-                    {"order_status": {"$not": {"$regex": "cancelled", "$options": "i"}}},
-                ]
-            },
-        ]
-    }
-
-
-    projection = {
-        "_id": 0,
-        "printer": 1,
-        "current_status": 1,
-    }
-
-    docs = list(orders_collection.find(query, projection))
-
-    genesis_total = yara_total = 0
-    genesis_in_prod = yara_in_prod = 0
-    genesis_shipped = yara_shipped = 0
-
-    for d in docs:
-        printer = (d.get("printer") or "").strip().lower()
-        status = (d.get("current_status") or "").strip().upper()
-        is_shipped = status in SHIPPED_STATUSES
-
-        if printer == "genesis":
-            genesis_total += 1
-            if is_shipped:
-                genesis_shipped += 1
-            else:
-                genesis_in_prod += 1
-
-        elif printer == "yara":
-            yara_total += 1
-            if is_shipped:
-                yara_shipped += 1
-            else:
-                yara_in_prod += 1
-
-    return {
-        "in_production": {
-            "genesis": genesis_in_prod,
-            "yara": yara_in_prod,
-        },
-        "shipped": {
-            "genesis": genesis_shipped,
-            "yara": yara_shipped,
-        },
-        "total_sent": {
-            "genesis": genesis_total,
-            "yara": yara_total,
-        },
-    }
+    if STATS_KPI_COUNTERS and counters_ready(kpi_counters_collection):
+        rows = counter_kpi_counts(kpi_counters_collection)
+    else:
+        rows = group_kpi_counts(orders_collection)
+    return kpi_tiles(rows)
 
 @app.get("/api/stats/production-kpis-graph")
+@cached_stats
 def production_kpis_graph(
     start_date: str = Query(..., description="YYYY-MM-DD"),
     end_date: str = Query(..., description="YYYY-MM-DD"),
@@ -7176,6 +6712,14 @@ def production_kpis_graph(
         "current_status": 1,
     }
 
+    if STATS_ORDER_FLAGS and _derived_ready():
+        query = {
+            "paid": True,
+            "processed_at_dt": {"$gte": start_utc, "$lt": end_utc},
+            "printer": {"$in": ["Genesis", "Yara"]},
+            **flag_population_match(),
+        }
+
     docs = list(orders_collection.find(query, projection))
 
     # -----------------------------
@@ -7227,22 +6771,21 @@ def production_kpis_graph(
     }
 
 @app.get("/api/stats/ship-status-v2")
+@cached_stats
 def stats_ship_status_v2(
     range: str = Query("1w", description="1d, 1w, 1m, 6m, this_month, custom"),
     start_date: Optional[str] = Query(None),
     end_date: Optional[str] = Query(None),
     printer: Optional[str] = Query("all", description="genesis | yara"),
     loc: Optional[str] = Query("IN", description="country code"),
+    include_ids: bool = Query(False, description="embed *_ids / order_ids lists (legacy); the UI drills down via drilldown_token"),
 ):
     """
     Shipment Status V2
     Uses ONLY orders_collection.current_status
-    Adds pending_age_chart with order_ids for NO-status orders
+    Adds pending_age_chart for NO-status orders (ids via the drilldown endpoint)
     """
 
-    exclude_codes = ["TEST", "COLLAB", "REJECTED", "TINA"]
-    exclude_set = {c.upper() for c in exclude_codes}
-
     # --------------------------------------------------
     # Location match
     # --------------------------------------------------
@@ -7274,216 +6817,19 @@ def stats_ship_status_v2(
         cs = ce = None
 
     # --------------------------------------------------
-    # 2) Base order query
+    # 2) Shared window frame → per-day rows + pending age chart
     # --------------------------------------------------
-    base_match = {
-        "$and": [
-            {"paid": True},
-            {"processed_at": {"$exists": True, "$ne": None}},
-            {
-                "$or": [
-                    {"current_status": {"$exists": False}},
-                    {"current_status": {"$not": {"$regex": "cancelled|refunded", "$options": "i"}}},
-                ]
-            },
-            {
-                "$or": [
-                    {"order_status": {"$exists": False}},
-                    {"order_status": {"$not": {"$regex": "cancelled|refunded", "$options": "i"}}},
-                ]
-            },
-        ]
-    }
-
-
-    if loc_match:
-        base_match["$and"].append(loc_match)
-
-
-    if cs and ce:
-        base_match["$and"].append(
-            {"processed_at": {"$gte": cs, "$lt": ce}}
-        )
-
-
-    projection = {
-        "order_id": 1,
-        "processed_at": 1,
-        "printer": 1,
-        "discount_code": 1,
-        "current_status": 1,
-        "order_status": 1,
-        "_id": 0,
-    }
-
-    cursor = orders_collection.find(base_match, projection)
-
-    # --------------------------------------------------
-    # 3) Organize orders
-    # --------------------------------------------------
-    orders_by_date = {k.split(" ")[0]: [] for k in labels}
-
-    # ✅ CHANGED: store order_ids per age bucket
-    pending_age_buckets = defaultdict(list)
-
-    for doc in cursor:
-        try:
-            raw_code = (doc.get("discount_code") or "").strip().upper()
-            if raw_code in exclude_set:
-                continue
-
-            dt = doc.get("processed_at")
-            if isinstance(dt, str):
-                dt = date_parser.isoparse(dt)
-
-            if not dt:
-                continue
-
-            dt_ist = dt.astimezone(IST_TZ)
-            ist_date = dt_ist.strftime("%Y-%m-%d")
-
-            if ist_date not in orders_by_date:
-                continue
-
-            printer_val = (doc.get("printer") or "").strip().lower()
-            if printer and printer.lower() not in ("all", ""):
-                if printer_val != printer.lower():
-                    continue
-
-            status = (doc.get("current_status") or "").strip().lower()
-            oid = doc.get("order_id")
-
-            
-            if status != "delivered" and printer_val!="cloudprinter":
-                age_days = (now_ist.date() - dt_ist.date()).days
-                if age_days >= 0:
-                    pending_age_buckets[age_days].append(oid)
-
-
-            orders_by_date[ist_date].append({
-                "order_id": oid,
-                "current_status": status,
-                "printer": printer_val,
-            })
-
-        except Exception:
-            continue
-
-    # --------------------------------------------------
-    # 4) Build rows per day
-    # --------------------------------------------------
-    rows = []
-
-    for lbl in labels:
-        date_key = lbl.split(" ")[0]
-        day_orders = orders_by_date.get(date_key, [])
-
-        unapproved_ids = []
-        new_ids = []
-        sent_to_print_ids = []
-        out_for_pickup_ids = []
-        pickup_exception_ids = []
-        shipped_ids = []
-        delivered_ids = []
-        issue_ids = []
-
-        for od in day_orders:
-            oid = od["order_id"]
-            printer_val = od["printer"]
-            status = od["current_status"]
-
-            if not printer_val:
-                unapproved_ids.append(oid)
-
-            if printer_val in ("genesis", "yara"):
-                sent_to_print_ids.append(oid)
-
-            if not status:
-                new_ids.append(oid)
-                continue
-
-            if "pickup exception" in status:
-                pickup_exception_ids.append(oid)
-                continue
-
-            if "out for pickup" in status:
-                out_for_pickup_ids.append(oid)
-                continue
-
-            if "delivered" in status:
-                delivered_ids.append(oid)
-                continue
-
-            if "issue" in status or "rto" in status or "undelivered" in status:
-                issue_ids.append(oid)
-                continue
-
-            if (
-                "picked up" in status
-                or "pickup done" in status
-                or "in transit" in status
-                or "transit" in status
-            ):
-                shipped_ids.append(oid)
-                continue
-
-            shipped_ids.append(oid)
-
-        rows.append({
-            "date": date_key,
-            "total": len(day_orders),
-
-            "unapproved": len(unapproved_ids),
-            "unapproved_ids": unapproved_ids,
-
-            "sent_to_print": len(sent_to_print_ids),
-            "sent_to_print_ids": sent_to_print_ids,
-
-            "new": len(new_ids),
-            "new_ids": new_ids,
-
-            "out_for_pickup": len(out_for_pickup_ids),
-            "out_for_pickup_ids": out_for_pickup_ids,
-
-            "pickup_exception": len(pickup_exception_ids),
-            "pickup_exception_ids": pickup_exception_ids,
-
-            "shipped": len(shipped_ids),
-            "shipped_ids": shipped_ids,
-
-            "delivered": len(delivered_ids),
-            "delivered_ids": delivered_ids,
-
-            "issue": len(issue_ids),
-            "issue_ids": issue_ids,
-        })
-
-    # --------------------------------------------------
-    # 5) Build pending age chart (FINAL)
-    # --------------------------------------------------
-    if pending_age_buckets:
-        min_day = min(pending_age_buckets.keys())
-        max_day = max(pending_age_buckets.keys())
-    else:
-        min_day = max_day = 0
-
-    pending_age_chart = []
-
-    for day in builtins.range(min_day, max_day + 1):
-        order_ids = pending_age_buckets.get(day, [])
-
-        pending_age_chart.append({
-            "label": f"{day} days",
-            "value": len(order_ids),
-            "order_ids": order_ids,
-        })
-
+    frame = _status_board_frame(cs, ce, loc, loc_match).for_printer(printer)
+    today_day = (now_ist.date() - date(1970, 1, 1)).days
+    board = status_board.ship_status_board(
+        frame.without_cancelled_or_refunded(), labels, today_day, include_ids=include_ids)
 
     return {
         "labels": labels,
-        "rows": rows,
-        "pending_age_chart": pending_age_chart,
+        "rows": board["rows"],
+        "pending_age_chart": board["pending_age_chart"],
         "printer": printer or "all",
+        "drilldown_token": _status_board_token("ship", cs, ce, loc, printer, labels, today_day),
     }
 
 @app.post("/api/orders/{order_id}/status")
@@ -7536,15 +6882,20 @@ def update_order_status(order_id: str, payload: OrderStatusUpdatePayload):
     # ===============================
     # UPDATE IN DB
     # ===============================
-    updated = orders_collection.find_one_and_update(
+    before = orders_collection.find_one_and_update(
         {"order_id": order_id},
         {"$set": update_data},
-        return_document=ReturnDocument.AFTER
+        return_document=ReturnDocument.BEFORE
     )
 
-    if not updated:
+    if not before:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    updated = {**before, **update_data}
+    kpi_transition(kpi_counters_collection, before, update_data)
+    sync_order_timestamps(orders_collection, {"order_id": order_id})
+    invalidate_stats_cache()
+
     # IMPORTANT: clean response
     response = {
         "success": True,
@@ -7668,10 +7019,27 @@ def patch_order(order_id: str, update: OrderUpdate):
             raise HTTPException(status_code=404, detail="Order not found")
         return {"updated": False, "order": _build_order_response(existing)}
 
+    kpi_before = None
+    if STATS_KPI_COUNTERS and any(k in set_ops for k in ("current_status", "discount_code", "order_id")):
+        kpi_before = orders_collection.find_one({"order_id": order_id})
+
+    # old orders fall outside the incremental rollup window: queue their hours
+    rollup_dirty = STATS_USE_ROLLUPS and rollup_source_touched(set_ops)
+    if rollup_dirty:
+        mark_rollups_dirty(orders_collection, rollup_state_collection, {"order_id": order_id})
+
     res = orders_collection.update_one(
         {"order_id": order_id}, {"$set": set_ops})
     if res.matched_count == 0:
         raise HTTPException(status_code=404, detail="Order not found")
+    if res.modified_count:
+        kpi_transition(kpi_counters_collection, kpi_before, set_ops)
+        if any(k.split(".")[0] in DERIVED_SOURCE_FIELDS for k in set_ops):
+            sync_order_timestamps(orders_collection, {"order_id": set_ops.get("order_id", order_id)})
+        if rollup_dirty:
+            mark_rollups_dirty(
+                orders_collection, rollup_state_collection, {"order_id": set_ops.get("order_id", order_id)})
+        invalidate_stats_cache()
 
     updated = orders_collection.find_one({"order_id": order_id})
     return {"updated": bool(res.modified_count), "order": _build_order_response(updated)}
@@ -7681,7 +7049,7 @@ class LockRequest(BaseModel):
     order_id: str
 
 @app.post("/api/orders/unapprove")
-async def unapprove_orders(req: UnapproveRequest):
+def unapprove_orders(req: UnapproveRequest):
     print(f"Unapprove request: {req}")
     for job_id in req.job_ids:
         print(f"Unapproving order with job_id: {job_id}")
@@ -7694,30 +7062,22 @@ async def unapprove_orders(req: UnapproveRequest):
             raise HTTPException(
                 status_code=404, detail=f"No order found with job_id {job_id}")
 
-    prefix = f"output/{job_id}/"
+    # output/<job_id>/<folder> -> output/<job_id>/previous/<folder>, all jobs in parallel
     folders_to_move = ["final_coverpage/", "approved_output/"]
-    for folder in folders_to_move:
-        print(f"Moving folder: {folder}")
-        old_prefix = prefix + folder
-        new_prefix = prefix + "previous/" + folder
-
-        response = s3.list_objects_v2(Bucket=BUCKET_NAME, Prefix=old_prefix)
-        print(f"List objects response: {response}")
-
-        if "Contents" not in response:
-            continue
-
-        for obj in response["Contents"]:
-            src_key = obj["Key"]
-            dst_key = src_key.replace(old_prefix, new_prefix, 1)
-            print(f"Moving from: {src_key} to: {dst_key}")
-
-            s3.copy_object(Bucket=BUCKET_NAME, CopySource={
-                           "Bucket": BUCKET_NAME, "Key": src_key}, Key=dst_key)
-            s3.delete_object(Bucket=BUCKET_NAME, Key=src_key)
+    moves = move_jobs(s3, BUCKET_NAME, req.job_ids, folders_to_move)
+    incomplete = [
+        job_id for job_id, report in moves.items()
+        if any("error" in r or r["failed"] or r["not_deleted"] for r in report.values())
+    ]
+    if incomplete:
+        logger.warning("[UNAPPROVE] S3 move incomplete for jobs: %s", ", ".join(incomplete))
 
     print(f"Unapproved {len(req.job_ids)} orders successfully")
-    return {"message": f"Unapproved {len(req.job_ids)} orders successfully"}
+    return {
+        "message": f"Unapproved {len(req.job_ids)} orders successfully",
+        "moves": moves,
+        "incomplete": incomplete,
+    }
 
 @app.post("/api/orders/lock")
 async def lock_order(
@@ -0,0 +1,81 @@
+# tests/conftest.py
+"""
+Shared fixtures. `main` is imported without a database or a built frontend:
+MONGO_URI only has to be set (pymongo connects lazily) and the static mount
+needs `../frontend/out` to exist relative to the working directory.
+
+`mongod_db` is a throwaway database on TEST_MONGO_URI; tests using it are
+skipped when no server answers there.
+"""
+import os
+import sys
+import uuid
+from typing import Any, Dict, Iterable, List, Tuple
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+TEST_MONGO_URI = os.getenv("TEST_MONGO_URI", "mongodb://localhost:27017")
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture(scope="session")
+def main_module(tmp_path_factory):
+    os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    root = tmp_path_factory.mktemp("app_root")
+    (root / "frontend" / "out").mkdir(parents=True)
+    (root / "backend").mkdir()
+    cwd = os.getcwd()
+    os.chdir(root / "backend")
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+class CommandCounter:
+    """
+    Stands in for a pymongo Collection and records every command sent to it.
+    `aggregate` returns the canned documents; any other collection method fails
+    the test, so a call path that adds a round trip cannot go unnoticed.
+    """
+
+    def __init__(self, aggregate_results: Iterable[Dict[str, Any]] = ()):
+        self.commands: List[Tuple[str, Any]] = []
+        self._aggregate_results = list(aggregate_results)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self.commands.append(("aggregate", pipeline))
+        return iter(self._aggregate_results)
+
+    def count(self, name: str) -> int:
+        return sum(1 for cmd, _ in self.commands if cmd == name)
+
+    def __getattr__(self, name):
+        def unexpected(*args, **kwargs):
+            self.commands.append((name, args))
+            raise AssertionError(f"unexpected collection command: {name}")
+        return unexpected
+
+
+@pytest.fixture
+def command_counter():
+    return CommandCounter
+
+
+@pytest.fixture
+def mongod_db():
+    client = MongoClient(TEST_MONGO_URI, tz_aware=True, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no mongod reachable at {TEST_MONGO_URI}")
+    name = f"test_{uuid.uuid4().hex[:12]}"
+    yield client[name]
+    client.drop_database(name)
+    client.close()
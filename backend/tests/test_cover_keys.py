@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+
+from app import cover_keys
+
+
+class _FakeS3:
+    def __init__(self, keys):
+        self.keys = keys
+
+    def list_objects_v2(self, **kwargs):
+        return {"Contents": [
+            {"Key": k, "LastModified": datetime(2026, 1, 1, i, tzinfo=timezone.utc)}
+            for i, k in enumerate(self.keys)
+        ]}
+
+
+class _FakeCol:
+    def __init__(self):
+        self.ops = []
+
+    def bulk_write(self, ops, ordered=True):
+        self.ops.extend(ops)
+
+
+def test_only_the_001_page_is_final():
+    assert cover_keys.is_final_cover_key("jpg_output/j1_pg0_001.JPG")
+    assert not cover_keys.is_final_cover_key("jpg_output/j1_pg0_002.jpg")
+    assert not cover_keys.is_final_cover_key(None)
+
+
+def test_provisional_key_is_shown_but_not_stored():
+    s3 = _FakeS3(["jpg_output/j1_pg0_002.jpg"])
+    key = cover_keys.find_cover_key(s3, "bucket", "j1")
+    col = _FakeCol()
+
+    assert key == "jpg_output/j1_pg0_002.jpg"
+    assert cover_keys.remember_cover_key(col, "j1", key) is False
+    assert col.ops == []
+
+
+def test_final_key_wins_and_is_stored():
+    s3 = _FakeS3(["jpg_output/j1_pg0_002.jpg", "jpg_output/j1_pg0_001.jpg"])
+    key = cover_keys.find_cover_key(s3, "bucket", "j1")
+    col = _FakeCol()
+
+    assert key == "jpg_output/j1_pg0_001.jpg"
+    assert cover_keys.remember_cover_key(col, "j1", key) is True
+    assert col.ops == [cover_keys._remember_op("j1", key)]
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from app import live_updates
+
+
+def test_invalidation_is_coalesced(monkeypatch):
+    calls = []
+    clock = [100.0]
+    monkeypatch.setattr(live_updates, "invalidate_stats_cache", lambda: calls.append(clock[0]))
+    monkeypatch.setattr(live_updates.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(live_updates, "LIVE_INVALIDATE_INTERVAL_SECONDS", 2.0)
+    feed = live_updates.ChangeFeed(col=None)
+
+    for _ in range(50):  # burst of changes
+        feed._dirty = True
+        feed._maybe_invalidate()
+    assert calls == [100.0]
+
+    feed._maybe_invalidate()  # quiet poll inside the window: nothing to flush yet
+    clock[0] += 2.5
+    feed._maybe_invalidate()  # trailing flush once the window passed
+    assert calls == [100.0, 102.5]
+
+    clock[0] += 10
+    feed._maybe_invalidate()  # clean: no extra invalidation
+    assert len(calls) == 2
+
+
+TEST_MONGO_RS_URI = os.getenv("TEST_MONGO_RS_URI", "mongodb://localhost:27017/?replicaSet=rs0")
+
+
+@pytest.fixture
+def rs_collection():
+    client = MongoClient(TEST_MONGO_RS_URI, tz_aware=True, serverSelectionTimeoutMS=1000)
+    try:
+        hello = client.admin.command("hello")
+    except PyMongoError:
+        client.close()
+        pytest.skip(f"no mongod reachable at {TEST_MONGO_RS_URI}")
+    if not hello.get("setName"):
+        client.close()
+        pytest.skip("change streams need a replica set")
+    name = f"test_live_updates_{uuid.uuid4().hex[:8]}"
+    yield client[name]["user_details"]
+    client.drop_database(name)
+    client.close()
+
+
+def test_feed_runs_without_subscribers_and_fans_out_to_them(rs_collection, monkeypatch):
+    invalidations = []
+    monkeypatch.setattr(live_updates, "invalidate_stats_cache", lambda: invalidations.append(1))
+    feed = live_updates.ChangeFeed(rs_collection)
+
+    async def scenario():
+        feed.start()
+        for _ in range(100):  # the watch is open once `connected` flips
+            if feed.connected:
+                break
+            await asyncio.sleep(0.1)
+        rs_collection.insert_one({"order_id": "#1", "paid": True})
+        for _ in range(100):
+            if invalidations:
+                break
+            await asyncio.sleep(0.1)
+        assert invalidations  # external write seen with nobody subscribed
+
+        q = feed.subscribe()
+        rs_collection.update_one({"order_id": "#1"}, {"$set": {"current_status": "DELIVERED"}})
+        delta = await asyncio.wait_for(q.get(), timeout=10)
+        feed.unsubscribe(q)
+        return delta
+
+    try:
+        delta = asyncio.run(scenario())
+    finally:
+        feed.stop()
+    assert delta["type"] == "status_changed" and delta["order_id"] == "#1"
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import order_timestamps, status_board
+from app.stats_cache import frame_cache
+
+UTC = timezone.utc
+
+
+class _State:
+    """order_timestamps_state: documents by _id, find_one / update_one with $set."""
+
+    def __init__(self, docs=()):
+        self.docs = {d["_id"]: dict(d) for d in docs}
+        self.reads = 0
+
+    def find_one(self, query, projection=None):
+        self.reads += 1
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc else None
+
+    def update_one(self, query, update, upsert=False):
+        self.docs.setdefault(query["_id"], {"_id": query["_id"]}).update(update.get("$set", {}))
+
+
+class _Orders:
+    def __init__(self, state):
+        self.database = {order_timestamps.TIMESTAMPS_STATE_COLLECTION: state}
+        self.queries = []
+
+    def find(self, query, projection=None, batch_size=None):
+        self.queries.append(query)
+        return iter([])
+
+
+@pytest.fixture(autouse=True)
+def _fresh_module_state(monkeypatch):
+    monkeypatch.setattr(order_timestamps, "_last_sweep", None)
+    monkeypatch.setattr(order_timestamps, "_derived_ready", False)
+    monkeypatch.setattr(order_timestamps, "_derived_checked_at", None)
+
+
+def _since(query):
+    return next(b["processed_at"]["$gte"] for b in query["$or"] if isinstance(b["processed_at"]["$gte"], datetime))
+
+
+def test_sweep_starts_from_persisted_sweep_minus_skew():
+    swept_at = datetime.now(UTC) - timedelta(minutes=3)
+    state = _State([{"_id": "sweep", "swept_at": swept_at}])
+    col = _Orders(state)
+
+    order_timestamps.ensure_timestamps_fresh(col, 0)
+
+    assert _since(col.queries[0]) == swept_at - order_timestamps.TIMESTAMPS_SWEEP_SKEW
+    assert state.docs["sweep"]["swept_at"] > swept_at
+
+    first = state.docs["sweep"]["swept_at"]
+    order_timestamps.ensure_timestamps_fresh(col, 0)
+    assert _since(col.queries[1]) == first - order_timestamps.TIMESTAMPS_SWEEP_SKEW
+
+
+def test_first_sweep_without_state_uses_lookback():
+    col = _Orders(_State())
+    before = datetime.now(UTC)
+
+    order_timestamps.ensure_timestamps_fresh(col, 0)
+
+    assert _since(col.queries[0]) <= before - order_timestamps.TIMESTAMPS_LOOKBACK + timedelta(seconds=5)
+
+
+def test_derived_fields_ready_rechecks_false_and_caches_true():
+    state = _State()
+    col = _Orders(state)
+
+    assert order_timestamps.derived_fields_ready(col) is False
+    assert order_timestamps.derived_fields_ready(col) is False
+    assert state.reads == 1  # a False answer is cached for TIMESTAMPS_MAX_LAG_SECONDS
+
+    state.docs["backfill"] = {"_id": "backfill"}
+    order_timestamps._derived_checked_at -= timedelta(seconds=order_timestamps.TIMESTAMPS_MAX_LAG_SECONDS)
+    assert order_timestamps.derived_fields_ready(col) is True
+    assert order_timestamps.derived_fields_ready(col) is True
+    assert state.reads == 2
+
+
+def _mentions(obj, field):
+    if isinstance(obj, dict):
+        return any(k == field or v == f"${field}" or _mentions(v, field) for k, v in obj.items())
+    if isinstance(obj, list):
+        return any(_mentions(v, field) for v in obj)
+    return False
+
+
+@pytest.mark.parametrize("flags", [False, True])
+def test_stats_queries_use_raw_fields_until_backfilled(main_module, monkeypatch, command_counter, flags):
+    monkeypatch.setattr(main_module, "_derived_ready", lambda: False)
+    monkeypatch.setattr(main_module, "STATS_ORDER_FLAGS", flags)
+    end = datetime.now(UTC)
+    start = end - timedelta(days=7)
+    loc_match = main_module._build_loc_match("IN")
+
+    for query in (
+        main_module._fetch_counts_match(start, end, ["TEST"], loc_match),
+        main_module._sla_base_query(start, end),
+        main_module._status_board_query(start, end, loc_match),
+        main_module._status_board_query(None, None, loc_match),
+    ):
+        assert _mentions(query, "processed_at")
+        for derived in ("processed_at_dt", "loc_norm", "is_real_order", "discount_code_norm"):
+            assert not _mentions(query, derived)
+
+    col = command_counter()
+    main_module._fetch_counts(col, start, end, ["TEST"], "day", loc_match)
+    group = col.commands[0][1][1]["$group"]
+    assert group["_id"]["$dateToString"]["date"] == order_timestamps.raw_date("processed_at")
+
+
+def test_status_frame_reads_raw_processed_at_until_backfilled(command_counter):
+    frame_cache.clear()
+    col = command_counter([{"order_id": "#1", "p": 0}])
+
+    status_board.load_status_frame(col, {}, cache_key="k", derived=False)
+    status_board.load_status_frame(col, {}, cache_key="k", derived=True)
+
+    projections = [pipeline[1]["$project"]["p"] for _, pipeline in col.commands]
+    assert projections == [{"$toLong": order_timestamps.raw_date("processed_at")}, {"$toLong": "$processed_at_dt"}]
+    frame_cache.clear()
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+from botocore.credentials import RefreshableCredentials
+
+from app import presign_cache as pc
+
+
+def _client(**creds):
+    return boto3.client("s3", region_name="ap-south-1", aws_access_key_id="AKIA", aws_secret_access_key="s", **creds)
+
+
+@pytest.fixture
+def ttls(monkeypatch):
+    pc.presign_cache.clear()
+    seen = []
+    real_set = pc.presign_cache.set
+
+    def record(key, value, ttl=None):
+        seen.append(ttl)
+        real_set(key, value, ttl=ttl)
+
+    monkeypatch.setattr(pc.presign_cache, "set", record)
+    yield seen
+    pc.presign_cache.clear()
+
+
+def test_long_term_keys_use_expires_in(ttls):
+    s3 = _client()
+    assert pc.cached_presigned_url(lambda: s3, "b", "k", expires_in=3600, verify=False)
+    assert ttls == [3600 - pc.PRESIGN_REFRESH_MARGIN_SECONDS]
+
+
+def test_session_token_caps_ttl(ttls):
+    s3 = _client(aws_session_token="tok")
+    pc.cached_presigned_url(lambda: s3, "b", "k", expires_in=3600, verify=False)
+    assert ttls == [pc.PRESIGN_TEMP_CREDENTIALS_TTL_SECONDS - pc.PRESIGN_REFRESH_MARGIN_SECONDS]
+
+
+def test_refreshable_credentials_cap_ttl_by_expiry(ttls):
+    expiry = datetime.now(timezone.utc) + timedelta(minutes=20)
+    s3 = _client()
+    s3._request_signer._credentials = RefreshableCredentials.create_from_metadata(
+        {"access_key": "AKIA", "secret_key": "s", "token": "tok", "expiry_time": expiry.isoformat()},
+        refresh_using=lambda: None,
+        method="test",
+    )
+    pc.cached_presigned_url(lambda: s3, "b", "k", expires_in=3600, verify=False)
+    assert len(ttls) == 1
+    assert 1200 - pc.PRESIGN_REFRESH_MARGIN_SECONDS - 5 < ttls[0] <= 1200 - pc.PRESIGN_REFRESH_MARGIN_SECONDS
+
+
+def test_nearly_expired_credentials_are_not_cached(ttls):
+    expiry = datetime.now(timezone.utc) + timedelta(seconds=pc.PRESIGN_REFRESH_MARGIN_SECONDS / 2)
+    s3 = _client()
+    s3._request_signer._credentials = RefreshableCredentials.create_from_metadata(
+        {"access_key": "AKIA", "secret_key": "s", "token": "tok", "expiry_time": expiry.isoformat()},
+        refresh_using=lambda: {"access_key": "AKIA", "secret_key": "s", "token": "tok",
+                               "expiry_time": expiry.isoformat()},
+        method="test",
+    )
+    assert pc.cached_presigned_url(lambda: s3, "b", "k", expires_in=3600, verify=False)
+    assert ttls == []
@@ -0,0 +1,30 @@
+"""
+Explain every hot query shape against a real mongod (the `mongod_db` fixture),
+on a throwaway database with INDEX_REGISTRY applied.
+"""
+import pytest
+
+from app.indexes import _plan_nodes, _winning_plan, check_query_plans, ensure_indexes, query_shapes
+
+
+@pytest.fixture
+def plan_db(mongod_db):
+    assert ensure_indexes(mongod_db) == []
+    return mongod_db
+
+
+def test_every_shape_is_index_served(plan_db, main_module):
+    problems = {}
+    for shape in query_shapes(main_module):
+        nodes = _plan_nodes(_winning_plan(plan_db, shape))
+        stages = [n["stage"] for n in nodes]
+        used = sorted({n["indexName"] for n in nodes if n.get("indexName")})
+        if not any("IXSCAN" in s for s in stages) or any(s in ("COLLSCAN", "SORT") for s in stages):
+            problems[shape["name"]] = stages
+        elif shape.get("index") and used != [shape["index"]]:
+            problems[shape["name"]] = used
+    assert problems == {}
+
+
+def test_check_query_plans_reports_nothing(plan_db, main_module):
+    assert check_query_plans(plan_db, main_module) == []
@@ -0,0 +1,61 @@
+# tests/test_query_shapes.py
+from app.indexes import INDEX_REGISTRY, query_shapes
+
+
+def _leading_fields(collection):
+    return {next(iter(model.document["key"])) for model in INDEX_REGISTRY[collection]}
+
+
+def test_shapes_come_from_builders_in_both_flag_modes(main_module):
+    names = [s["name"] for s in query_shapes(main_module)]
+    assert len(names) == len(set(names))
+    for base in ("order counts", "sla population", "status board window", "kpi population"):
+        assert base in names and f"{base} [flags]" in names
+
+
+def test_builder_flag_mode_is_restored(main_module):
+    before = main_module.STATS_ORDER_FLAGS
+    query_shapes(main_module)
+    assert main_module.STATS_ORDER_FLAGS == before
+
+
+def test_sweep_branches_each_lead_an_index(main_module):
+    # an $or is only index-served when every branch is
+    sweep = next(s for s in query_shapes(main_module) if s["name"] == "derived-field sweep")
+    leading = _leading_fields("user_details")
+    for branch in sweep["filter"]["$or"]:
+        (field,) = branch.keys()
+        assert field in leading, f"sweep branch on {field} has no index"
+
+
+def _predicates(flt):
+    """field -> predicate for the top-level fields of `flt`, flattening $and."""
+    out = {}
+    for key, value in flt.items():
+        if key == "$and":
+            for sub in value:
+                out.update(_predicates(sub))
+        elif not key.startswith("$"):
+            out[key] = value
+    return out
+
+
+def _is_point(predicate):
+    return not isinstance(predicate, dict) or set(predicate) == {"$in"}
+
+
+def test_expected_index_prefix_has_no_gaps(main_module):
+    # every index key ahead of the first range must be an equality / $in
+    indexes = {(c, m.document["name"]): list(m.document["key"]) for c, ms in INDEX_REGISTRY.items() for m in ms}
+    shapes = [s for s in query_shapes(main_module) if s.get("index")]
+    assert {"order counts [flags]", "sla population [flags]", "kpi population [flags]"} <= {s["name"] for s in shapes}
+    for shape in shapes:
+        keys = indexes[(shape["collection"], shape["index"])]
+        preds = _predicates(shape["filter"])
+        for field in keys:
+            if field not in preds:
+                # a gap is only fine once nothing after it is constrained
+                assert not any(f in preds for f in keys[keys.index(field):]), (shape["name"], field)
+                break
+            if not _is_point(preds[field]):
+                break
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from pymongo.errors import PyMongoError
+
+
+class _Cursor:
+    """Yields `docs`, then raises `error` if given."""
+
+    def __init__(self, docs, error=None):
+        self.docs = docs
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        yield from self.docs
+        if self.error:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def reconcile(main_module):
+    from app.routers import reconcile
+    return reconcile
+
+
+DOCS = [{"order_id": "#1", "paid": True}, {"order_id": "#2", "paid": True}]
+
+
+def _body(reconcile, cursor, fmt):
+    return "".join(reconcile._stream_order_rows(cursor, fmt))
+
+
+def test_json_stream_is_one_array(reconcile):
+    cursor = _Cursor(DOCS)
+    rows = json.loads(_body(reconcile, cursor, "json"))
+    assert [r["order_id"] for r in rows] == ["#1", "#2"]
+    assert cursor.closed
+
+
+def test_ndjson_stream_is_one_row_per_line(reconcile):
+    lines = _body(reconcile, _Cursor(DOCS), "ndjson").splitlines()
+    assert [json.loads(line)["order_id"] for line in lines] == ["#1", "#2"]
+
+
+@pytest.mark.parametrize("docs", [DOCS, []])
+def test_json_stream_error_closes_array_with_error_element(reconcile, docs):
+    cursor = _Cursor(docs, PyMongoError("cursor killed"))
+    rows = json.loads(_body(reconcile, cursor, "json"))
+    assert [r.get("order_id") for r in rows[:-1]] == [d["order_id"] for d in docs]
+    assert rows[-1] == {"error": "cursor killed"}
+    assert cursor.closed
+
+
+def test_ndjson_stream_error_ends_with_error_line(reconcile):
+    lines = _body(reconcile, _Cursor(DOCS, PyMongoError("cursor killed")), "ndjson").splitlines()
+    assert len(lines) == 3
+    assert json.loads(lines[-1]) == {"error": "cursor killed"}
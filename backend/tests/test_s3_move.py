@@ -0,0 +1,42 @@
+import threading
+
+from app import s3_move
+
+
+class _FakeS3:
+    def __init__(self, keys):
+        self.keys = set(keys)
+        self.copy_threads = set()
+        self._lock = threading.Lock()
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class _Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": k} for k in sorted(s3.keys) if k.startswith(Prefix)]}
+
+        return _Paginator()
+
+    def copy_object(self, Bucket, CopySource, Key):
+        with self._lock:
+            self.copy_threads.add(threading.current_thread().name)
+            self.keys.add(Key)
+
+    def delete_objects(self, Bucket, Delete):
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.keys.discard(obj["Key"])
+        return {}
+
+
+def test_move_jobs_reuses_the_module_pools():
+    s3 = _FakeS3([f"output/j{j}/approved_output/{i}.pdf" for j in range(3) for i in range(5)])
+
+    for _ in range(3):  # repeated requests run on the same long-lived pools
+        report = s3_move.move_jobs(s3, "bucket", ["j0", "j1", "j1", "j2"], ["approved_output/"])
+        assert set(report) == {"j0", "j1", "j2"}
+        s3.keys = {k.replace("/previous/", "/") for k in s3.keys}
+
+    assert report["j1"]["approved_output/"]["deleted"] == 5
+    assert all(name.startswith("s3-copy") for name in s3.copy_threads)
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+
+def _lookup_stages(pipeline):
+    return [stage["$lookup"] for stage in pipeline if "$lookup" in stage]
+
+
+def test_endpoint_uses_newest_shipping_doc_lookup(main_module, monkeypatch, command_counter):
+    col = command_counter()
+    monkeypatch.setattr(main_module, "orders_collection", col)
+    monkeypatch.setattr(main_module, "_use_rollups", lambda: False)
+    monkeypatch.setattr(main_module, "_derived_ready", lambda: True)
+
+    main_module.stats_ship_status.__wrapped__(
+        range="1w", start_date=None, end_date=None, printer="all", loc="IN")
+
+    lookups = [lk for _, pipeline in col.commands for lk in _lookup_stages(pipeline)]
+    assert lookups == [main_module._last_scan_lookup(main_module.shipping_collection.name)["$lookup"]]
+    assert lookups[0]["pipeline"][:2] == [{"$sort": {"_id": -1}}, {"$limit": 1}]
+
+
+def test_last_written_shipping_doc_wins(main_module, mongod_db):
+    older, newer = ObjectId.from_datetime(datetime(2025, 1, 1)), ObjectId()
+    # inserted newest first, so natural order alone would pick the wrong one
+    mongod_db["shipping_details"].insert_many([
+        {"_id": newer, "order_id": "#1", "shiprocket_data": {"scans": [{"sr-status-label": "DELIVERED"}]}},
+        {"_id": older, "order_id": "#1", "shiprocket_data": {"scans": [{"sr-status-label": "SHIPPED"}]}},
+    ])
+    mongod_db["user_details"].insert_one({"order_id": "#1"})
+
+    rows = list(mongod_db["user_details"].aggregate([
+        main_module._last_scan_lookup("shipping_details"),
+        {"$project": {"_id": 0, "label": {"$first": "$_ship.last.sr-status-label"}}},
+    ]))
+
+    assert rows == [{"label": "DELIVERED"}]
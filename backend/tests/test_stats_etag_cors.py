@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+from app import stats_watermark
+
+
+def test_stats_304_carries_cors_headers(main_module, monkeypatch):
+    monkeypatch.setattr(stats_watermark, "current_watermark", lambda: ("wm", None))
+    path = "/api/stats/orders"
+    etag = stats_watermark.stats_etag(path, "range=1w", "wm")
+
+    client = TestClient(main_module.app)
+    resp = client.get(
+        path + "?range=1w",
+        headers={"Origin": "http://localhost:3000", "If-None-Match": etag},
+    )
+
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == etag
+    assert resp.headers["access-control-allow-origin"] == "http://localhost:3000"
@@ -0,0 +1,61 @@
+# tests/test_stats_preview_vs_orders.py
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+UTC = timezone.utc
+
+
+@pytest.fixture
+def windows():
+    ce = datetime(2026, 3, 8, tzinfo=UTC)
+    cs = ce - timedelta(days=7)
+    return {"curr": (cs, ce), "prev": (cs - timedelta(days=7), cs)}
+
+
+@pytest.mark.parametrize("granularity", ["hour", "day"])
+def test_per_bucket_is_one_aggregate(main_module, command_counter, windows, granularity):
+    col = command_counter([{"jobs": [], "paid": []}])
+    main_module._fetch_preview_vs_orders_per_bucket(
+        col, windows, granularity=granularity, loc_match=main_module._build_loc_match("IN"))
+
+    assert col.count("aggregate") == 1
+    assert len(col.commands) == 1
+    pipeline = col.commands[0][1]
+    # the date range is in the first stage, where an index can serve it
+    assert "$match" in pipeline[0]
+    assert "$facet" in pipeline[-1]
+
+
+def test_per_bucket_splits_windows_and_metrics(main_module, command_counter, windows):
+    col = command_counter([{
+        "jobs": [
+            {"_id": {"w": "curr", "b": "2026-03-02"}, "count": 5},
+            {"_id": {"w": "prev", "b": "2026-02-24"}, "count": 3},
+        ],
+        "paid": [{"_id": {"w": "curr", "b": "2026-03-02"}, "count": 2}],
+    }])
+    out = main_module._fetch_preview_vs_orders_per_bucket(col, windows, granularity="day", loc_match={})
+
+    assert out == {
+        "jobs": {"curr": {"2026-03-02": 5}, "prev": {"2026-02-24": 3}},
+        "paid": {"curr": {"2026-03-02": 2}, "prev": {}},
+    }
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"range": "1w", "start_date": None, "end_date": None, "loc": ["IN"]},
+    {"range": "1d", "start_date": None, "end_date": None, "loc": ["IN", "US"]},
+    {"range": "1w", "start_date": "2026-02-01", "end_date": "2026-02-28", "loc": ["ALL"]},
+])
+def test_endpoint_is_one_round_trip(main_module, command_counter, monkeypatch, kwargs):
+    col = command_counter([{"jobs": [], "paid": []}])
+    monkeypatch.setattr(main_module, "orders_collection", col)
+    monkeypatch.setattr(main_module, "STATS_USE_ROLLUPS", False)
+
+    # __wrapped__ skips the stats cache, so every call reaches Mongo
+    body = main_module.stats_preview_vs_orders.__wrapped__(**kwargs)
+
+    assert col.count("aggregate") == 1
+    assert len(col.commands) == 1
+    assert len(body["current_jobs"]) == len(body["labels"])
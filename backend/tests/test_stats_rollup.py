@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta, timezone
+
+from app import stats_rollup
+from app.order_flags import discount_exclusion
+
+UTC = timezone.utc
+
+
+class _State:
+    """Minimal state collection: one document, find_one / update_one with $set, $addToSet, $pullAll."""
+
+    def __init__(self, doc=None):
+        self.doc = dict(doc or {})
+
+    def find_one(self, query, projection=None):
+        return dict(self.doc) if self.doc else None
+
+    def update_one(self, query, update, upsert=False):
+        self.doc.update(update.get("$set", {}))
+        for field, spec in update.get("$addToSet", {}).items():
+            cur = self.doc.setdefault(field, [])
+            cur.extend(v for v in spec["$each"] if v not in cur)
+        for field, values in update.get("$pullAll", {}).items():
+            self.doc[field] = [v for v in self.doc.get(field, []) if v not in values]
+
+
+class _Source:
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.pipelines = []
+
+    def find(self, query, projection=None):
+        return iter(self.docs)
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipelines.append(pipeline)
+        return iter([])
+
+
+class _Rollups:
+    def __init__(self):
+        self.deletes = []
+
+    def bulk_write(self, ops, ordered=True):
+        pass
+
+    def delete_many(self, query):
+        self.deletes.append(query)
+        return type("R", (), {"deleted_count": 0})()
+
+
+def test_not_built_falls_back_without_building(monkeypatch):
+    monkeypatch.setattr(stats_rollup, "_last_watermark", None)
+    called = []
+    monkeypatch.setattr(stats_rollup, "refresh_rollups", lambda *a, **k: called.append(a))
+
+    assert stats_rollup.ensure_fresh(_Source(), _Rollups(), _State()) is False
+    old_schema = _State({"watermark": datetime.now(UTC), "schema": stats_rollup.ROLLUP_SCHEMA - 1})
+    assert stats_rollup.ensure_fresh(_Source(), _Rollups(), old_schema) is False
+    assert called == []
+
+
+def test_mark_dirty_and_refresh_recomputes_old_hours(monkeypatch):
+    monkeypatch.setattr(stats_rollup, "_last_watermark", None)
+    old = datetime(2025, 1, 10, 8, 40, tzinfo=UTC)
+    src = _Source([{"processed_at": "2025-01-10T14:10:00+05:30", "created_at": old}])
+    state = _State({"watermark": datetime.now(UTC), "schema": stats_rollup.ROLLUP_SCHEMA})
+
+    assert stats_rollup.mark_rollups_dirty(src, state, {"order_id": "#1"}) == 1
+    hour = stats_rollup.ist_hour_floor(old)
+    assert state.doc["dirty_hours"] == [hour]
+
+    rollups = _Rollups()
+    result = stats_rollup.refresh_rollups(src, rollups, state)
+
+    assert result["dirty_hours"] == 1
+    assert len(src.pipelines) == 2  # lookback window + the dirty hour
+    assert {"hour": {"$in": [hour]}}.items() <= rollups.deletes[-1].items()
+    assert state.doc["dirty_hours"] == []
+
+
+def test_rollups_and_live_share_the_exclusion_rule():
+    windows = {"curr": (datetime(2025, 1, 1, tzinfo=UTC), datetime(2025, 1, 2, tzinfo=UTC))}
+    match = stats_rollup.rollup_match(windows, exclude_codes=["test", " Collab "])
+    assert discount_exclusion(["TEST", "COLLAB"], normalized=True) in match["$and"]
+
+
+def test_rollup_source_fields():
+    assert stats_rollup.rollup_source_touched(["discount_code"])
+    assert stats_rollup.rollup_source_touched(["shipping_address.city", "locale"])
+    assert not stats_rollup.rollup_source_touched(["current_status", "shipping_address.city"])
+
+
+def test_hours_pipeline_only_keeps_events_in_those_hours():
+    h = datetime(2025, 1, 10, 8, 30, tzinfo=UTC)
+    pipeline = stats_rollup._events_pipeline(None, hours=[h])
+    event_match = next(st["$match"] for st in pipeline[1:] if "$match" in st)
+    assert event_match == {"$or": [{"_events.t": {"$gte": h, "$lt": h + timedelta(hours=1)}}]}
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+
+import pytest
+
+from app import stats_watermark
+
+
+class _Col:
+    """stats_watermark / watched collections: update_one blocks until `release` is set."""
+
+    def __init__(self):
+        self.seq = 0
+        self.incs = []
+        self.release = threading.Event()
+        self.written = threading.Event()
+
+    def update_one(self, query, update, upsert=False):
+        self.release.wait(5)
+        self.seq += update["$inc"]["seq"]
+        self.incs.append(update["$inc"]["seq"])
+        self.written.set()
+
+    def find_one(self, query, projection=None, sort=None):
+        return {"_id": "orders", "seq": self.seq} if sort is None else None
+
+
+@pytest.fixture
+def col(monkeypatch):
+    col = _Col()
+    monkeypatch.setattr(stats_watermark, "watermark_collection", col)
+    monkeypatch.setattr(stats_watermark, "_WATCHED", ())
+    monkeypatch.setattr(stats_watermark, "_pending", 0)
+    monkeypatch.setattr(stats_watermark, "_pending_since", None)
+    monkeypatch.setattr(stats_watermark, "_cached", (0.0, "", None))
+    yield col
+    col.release.set()
+
+
+def _seq(watermark):
+    return int(watermark.split(":")[1])
+
+
+def test_bump_does_not_wait_for_mongo_and_counts_until_persisted(col):
+    stats_watermark.bump_watermark()
+    stats_watermark.bump_watermark()  # returned although the first write is still blocked
+
+    watermark, updated_at = stats_watermark.current_watermark()
+    assert _seq(watermark) == 2 and updated_at is not None
+
+    col.release.set()
+    assert col.written.wait(5)
+    stats_watermark._flush_pool.submit(lambda: None).result(5)  # drain queued flushes
+
+    assert sum(col.incs) == 2
+    assert stats_watermark._pending == 0
+    assert _seq(stats_watermark.current_watermark()[0]) == 2
+
+
+def _run(middleware, path, request_headers=(), sent=None):
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": b"range=1w",
+             "headers": [(k.encode(), v.encode()) for k, v in request_headers]}
+    sent = [] if sent is None else sent
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent
+
+
+def test_streamed_body_passes_through_chunk_by_chunk(monkeypatch):
+    monkeypatch.setattr(stats_watermark, "current_watermark", lambda: ("wm", None))
+    seen_by_client = []
+
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"a", "more_body": True})
+        # a buffering middleware would not have forwarded the first chunk yet
+        seen_by_client.append(len(sent))
+        await send({"type": "http.response.body", "body": b"b", "more_body": False})
+
+    sent = []
+    _run(stats_watermark.StatsETagMiddleware(streaming_app), "/api/stats/orders", sent=sent)
+
+    assert seen_by_client == [2]
+    assert [m.get("body") for m in sent[1:]] == [b"a", b"b"]
+    etag = dict(sent[0]["headers"])[b"etag"].decode()
+    assert etag == stats_watermark.stats_etag("/api/stats/orders", "range=1w", "wm")
+
+
+def test_matching_etag_short_circuits_with_304(monkeypatch):
+    monkeypatch.setattr(stats_watermark, "current_watermark", lambda: ("wm", None))
+    etag = stats_watermark.stats_etag("/api/stats/orders", "range=1w", "wm")
+
+    async def endpoint(scope, receive, send):
+        raise AssertionError("endpoint must not run on a matching ETag")
+
+    sent = _run(stats_watermark.StatsETagMiddleware(endpoint), "/api/stats/orders", [("if-none-match", etag)])
+    assert sent[0]["status"] == 304
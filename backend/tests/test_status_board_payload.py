@@ -0,0 +1,58 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import stats_watermark
+from app.stats_cache import frame_cache, stats_cache
+
+
+def _row(order_id, printer="", status=""):
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    return {"order_id": order_id, "printer": printer, "discount_code": "",
+            "current_status": status, "order_status": "", "p": now_ms}
+
+
+@pytest.fixture
+def client(main_module, monkeypatch, command_counter):
+    rows = [_row("#1"), _row("#2", printer="genesis"), _row("#3", printer="genesis", status="Delivered")]
+    monkeypatch.setattr(main_module, "orders_collection", command_counter(rows))
+    monkeypatch.setattr(main_module, "_derived_ready", lambda: True)
+    monkeypatch.setattr(stats_watermark, "current_watermark", lambda: ("wm", None))
+    stats_cache.clear()
+    frame_cache.clear()
+    yield TestClient(main_module.app)
+    stats_cache.clear()
+    frame_cache.clear()
+
+
+def _id_keys(payload):
+    keys = set()
+    for row in payload["rows"] + payload.get("pending_age_chart", []):
+        keys |= {k for k in row if k.endswith("_ids")}
+    return keys
+
+
+@pytest.mark.parametrize("path", ["/api/stats/order-status", "/api/stats/ship-status-v2"])
+def test_default_payload_has_no_id_lists(client, path):
+    payload = client.get(path, params={"range": "1w", "loc": "ALL"}).json()
+
+    assert payload["rows"] and payload["drilldown_token"]
+    assert sum(r["total"] for r in payload["rows"]) == 3
+    assert _id_keys(payload) == set()
+
+
+def test_include_ids_still_embeds_lists(client):
+    payload = client.get("/api/stats/order-status", params={"range": "1w", "loc": "ALL", "include_ids": "true"}).json()
+    assert "unapproved_ids" in _id_keys(payload)
+
+
+def test_drilldown_resolves_a_cell(client):
+    payload = client.get("/api/stats/order-status", params={"range": "1w", "loc": "ALL"}).json()
+    today = next(r for r in payload["rows"] if r["total"])
+
+    resp = client.get("/api/stats/status-board/drilldown", params={
+        "token": payload["drilldown_token"], "column": "sent_to_print", "date": today["date"].split(" ")[0]})
+
+    assert resp.status_code == 200
+    assert sorted(resp.json()["order_ids"]) == ["#2", "#3"]
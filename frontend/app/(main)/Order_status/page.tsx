@@ -1,6 +1,7 @@
 "use client";
 
 import { useEffect, useMemo, useState } from "react";
+import { fetchDrilldownIds } from "../components/statusDrilldown";
 
 type RangeKey = "1d" | "1w" | "1m" | "6m" | "this_month" | "custom";
 type CountryCode = "IN" | "AE" | "CA" | "US" | "GB" | "IN_ONLY";
@@ -8,33 +9,15 @@ type CountryCode = "IN" | "AE" | "CA" | "US" | "GB" | "IN_ONLY";
 type OrderRow = {
   date: string;
   total: number;
-
   unapproved: number;
-  unapproved_ids?: string[];
-
   sent_to_print: number;
-  sent_to_print_ids?: string[];
-
   new: number;
-  new_ids?: string[];
-
   shipped: number;
-  shipped_ids?: string[];
-
   delivered: number;
-  delivered_ids?: string[];
-
   cancelled: number;
-  cancelled_ids?: string[];
-
   rejected: number;
-  rejected_ids?: string[];
-
   refunded: number;
-  refunded_ids?: string[];
-
   reprint: number;
-  reprint_ids?: string[];
 };
 
 export default function OrderStatusPage() {
@@ -54,6 +37,7 @@ export default function OrderStatusPage() {
   const [country] = useState<CountryCode>("IN_ONLY");
 
   const [rows, setRows] = useState<OrderRow[]>([]);
+  const [drilldownToken, setDrilldownToken] = useState<string>("");
   const [error, setError] = useState<string>("");
   const [loading, setLoading] = useState<boolean>(false);
 
@@ -89,33 +73,15 @@ export default function OrderStatusPage() {
       .map((r) => ({
         date: r.date,
         total: r.total ?? 0,
-
         unapproved: r.unapproved ?? 0,
-        unapproved_ids: r.unapproved_ids ?? [],
-
         sent_to_print: r.sent_to_print ?? 0,
-        sent_to_print_ids: r.sent_to_print_ids ?? [],
-
         new: r.new ?? 0,
-        new_ids: r.new_ids ?? [],
-
         shipped: r.shipped ?? 0,
-        shipped_ids: r.shipped_ids ?? [],
-
         delivered: r.delivered ?? 0,
-        delivered_ids: r.delivered_ids ?? [],
-
         cancelled: r.cancelled ?? 0,
-        cancelled_ids: r.cancelled_ids ?? [],
-
         rejected: r.rejected ?? 0,
-        rejected_ids: r.rejected_ids ?? [],
-
         refunded: r.refunded ?? 0,
-        refunded_ids: r.refunded_ids ?? [],
-
         reprint: r.reprint ?? 0,
-        reprint_ids: r.reprint_ids ?? [],
       }))
       .sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime());
   };
@@ -134,6 +100,7 @@ export default function OrderStatusPage() {
       })
       .then((json) => {
         setRows(parseRows(json));
+        setDrilldownToken(json.drilldown_token || "");
       })
       .catch((err) => {
         console.error("order-status fetch error:", err);
@@ -150,18 +117,29 @@ export default function OrderStatusPage() {
 
     fetch(buildOrderStatusUrl(range), { cache: "no-store" })
       .then((r) => (r.ok ? r.json() : Promise.reject(r.statusText || r.status)))
-      .then((json) => setRows(parseRows(json)))
+      .then((json) => {
+        setRows(parseRows(json));
+        setDrilldownToken(json.drilldown_token || "");
+      })
       .catch((err) => setError(String(err)))
       .finally(() => setLoading(false));
   };
 
-  const goToOrders = (ids: string[]) => {
-    if (!ids || ids.length === 0) return;
+  const goToOrders = async (date: string, column: string, count: number) => {
+    if (!count || !drilldownToken) return;
 
-    const params = new URLSearchParams();
-    ids.forEach((id) => params.append("order_ids", id));
+    try {
+      const ids = await fetchDrilldownIds(baseUrl, drilldownToken, { column, date });
+      if (ids.length === 0) return;
+
+      const params = new URLSearchParams();
+      ids.forEach((id) => params.append("order_ids", id));
 
-    window.location.href = `/api/Shipment_orders?${params.toString()}`;
+      window.location.href = `/api/Shipment_orders?${params.toString()}`;
+    } catch (err) {
+      console.error("order-status drilldown error:", err);
+      setError(String(err));
+    }
   };
 
   return (
@@ -279,7 +257,7 @@ export default function OrderStatusPage() {
                     {/* New */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.unapproved_ids || [])}
+                      onClick={() => goToOrders(r.date, "unapproved", r.unapproved)}
                     >
                       {r.unapproved}
                     </td>
@@ -287,7 +265,7 @@ export default function OrderStatusPage() {
                     {/* Sent to Print */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.sent_to_print_ids || [])}
+                      onClick={() => goToOrders(r.date, "sent_to_print", r.sent_to_print)}
                     >
                       {r.sent_to_print}
                     </td>
@@ -295,7 +273,7 @@ export default function OrderStatusPage() {
                     {/* Cancelled */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.cancelled_ids || [])}
+                      onClick={() => goToOrders(r.date, "cancelled", r.cancelled)}
                     >
                       {r.cancelled}
                     </td>
@@ -303,7 +281,7 @@ export default function OrderStatusPage() {
                     {/* Rejected */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.rejected_ids || [])}
+                      onClick={() => goToOrders(r.date, "rejected", r.rejected)}
                     >
                       {r.rejected}
                     </td>
@@ -311,7 +289,7 @@ export default function OrderStatusPage() {
                     {/* Refunded */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.refunded_ids || [])}
+                      onClick={() => goToOrders(r.date, "refunded", r.refunded)}
                     >
                       {r.refunded}
                     </td>
@@ -319,7 +297,7 @@ export default function OrderStatusPage() {
                     {/* Reprint */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.reprint_ids || [])}
+                      onClick={() => goToOrders(r.date, "reprint", r.reprint)}
                     >
                       {r.reprint}
                     </td>
@@ -327,7 +305,7 @@ export default function OrderStatusPage() {
                     {/* Shipped */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.shipped_ids || [])}
+                      onClick={() => goToOrders(r.date, "shipped", r.shipped)}
                     >
                       {r.shipped}
                     </td>
@@ -335,7 +313,7 @@ export default function OrderStatusPage() {
                     {/* Delivered */}
                     <td
                       className="p-2 text-blue-600 cursor-pointer"
-                      onClick={() => goToOrders(r.delivered_ids || [])}
+                      onClick={() => goToOrders(r.date, "delivered", r.delivered)}
                     >
                       {r.delivered}
                     </td>
@@ -1,6 +1,7 @@
 "use client";
 
 import { useEffect, useMemo, useState } from "react";
+import { fetchDrilldownIds } from "../components/statusDrilldown";
 
 type RangeKey = "1d" | "1w" | "1m" | "6m" | "this_month" | "custom";
 type CountryCode = "IN" | "AE" | "CA" | "US" | "GB" | "IN_ONLY";
@@ -8,36 +9,20 @@ type CountryCode = "IN" | "AE" | "CA" | "US" | "GB" | "IN_ONLY";
 type ShipRow = {
   date: string;
   total: number;
-
   unapproved: number;
-  unapproved_ids?: string[];
-
   sent_to_print: number;
-  sent_to_print_ids?: string[];
-
   new: number;
-  new_ids?: string[];
-
   out_for_pickup: number;
-  out_for_pickup_ids?: string[];
-
   pickup_exception: number;
-  pickup_exception_ids?: string[];
-
   shipped: number;
-  shipped_ids?: string[];
-
   delivered: number;
-  delivered_ids?: string[];
-
   issue: number;
-  issue_ids?: string[];
 };
 
 type PendingAgeRow = {
   label: string;
+  age: number;
   value: number;
-  order_ids: string[];
 };
 
 
@@ -63,6 +48,7 @@ export default function ShipmentStatusPage() {
   const [shipLoading, setShipLoading] = useState<boolean>(false);
 
   const [pendingAgeChart, setPendingAgeChart] = useState<PendingAgeRow[]>([]);
+  const [drilldownToken, setDrilldownToken] = useState<string>("");
 
   const [modalOpen, setModalOpen] = useState(false);
   const [modalDate, setModalDate] = useState("");
@@ -99,30 +85,14 @@ export default function ShipmentStatusPage() {
         return {
           date: r.date,
           total: r.total ?? 0,
-
           unapproved: r.unapproved ?? 0,
-          unapproved_ids: r.unapproved_ids ?? [],
-
           sent_to_print: r.sent_to_print ?? 0,
-          sent_to_print_ids: r.sent_to_print_ids ?? [],
-
           new: r.new ?? 0,
-          new_ids: r.new_ids ?? [],
-
           out_for_pickup: r.out_for_pickup ?? 0,
-          out_for_pickup_ids: r.out_for_pickup_ids ?? [],
-
           pickup_exception: r.pickup_exception ?? 0,
-          pickup_exception_ids: r.pickup_exception_ids ?? [],
-
           shipped: r.shipped ?? 0,
-          shipped_ids: r.shipped_ids ?? [],
-
           delivered: r.delivered ?? 0,
-          delivered_ids: r.delivered_ids ?? [],
-
           issue: r.issue ?? 0,
-          issue_ids: r.issue_ids ?? [],
         } as ShipRow;
       })
       .sort((a, b) => new Date(b.date).getTime() - new Date(a.date).getTime());
@@ -143,6 +113,7 @@ export default function ShipmentStatusPage() {
       .then((json) => {
         setShipRows(parseRows(json));
         setPendingAgeChart(json.pending_age_chart || []);
+        setDrilldownToken(json.drilldown_token || "");
       })
       .catch((err) => {
         console.error("ship-status-v2 fetch error:", err);
@@ -160,7 +131,11 @@ export default function ShipmentStatusPage() {
       .then((r) =>
         r.ok ? r.json() : Promise.reject(r.statusText || r.status)
       )
-      .then((json) => setShipRows(parseRows(json)))
+      .then((json) => {
+        setShipRows(parseRows(json));
+        setPendingAgeChart(json.pending_age_chart || []);
+        setDrilldownToken(json.drilldown_token || "");
+      })
       .catch((err) => setShipError(String(err)))
       .finally(() => setShipLoading(false));
   };
@@ -172,11 +147,21 @@ export default function ShipmentStatusPage() {
     setModalOpen(true);
   };
 
-  const goToShipmentOrders = (ids: string[]) => {
-    if (!ids || ids.length === 0) return;
-    const params = new URLSearchParams();
-    ids.forEach(id => params.append("order_ids", id));
-    window.location.href = `/api/Shipment_orders?${params.toString()}`;
+  const goToShipmentOrders = async (
+    cell: { column: string; date?: string; age?: number },
+    count: number
+  ) => {
+    if (!count || !drilldownToken) return;
+    try {
+      const ids = await fetchDrilldownIds(baseUrl, drilldownToken, cell);
+      if (ids.length === 0) return;
+      const params = new URLSearchParams();
+      ids.forEach(id => params.append("order_ids", id));
+      window.location.href = `/api/Shipment_orders?${params.toString()}`;
+    } catch (err) {
+      console.error("ship-status-v2 drilldown error:", err);
+      setShipError(String(err));
+    }
   };
 
   return (
@@ -297,37 +282,37 @@ export default function ShipmentStatusPage() {
                         <td className="p-2">{r.date}</td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.unapproved_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "unapproved", date: r.date }, r.unapproved)}>
                           {r.unapproved}
                         </td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.sent_to_print_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "sent_to_print", date: r.date }, r.sent_to_print)}>
                           {r.sent_to_print}
                         </td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.out_for_pickup_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "out_for_pickup", date: r.date }, r.out_for_pickup)}>
                           {r.out_for_pickup}
                         </td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.pickup_exception_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "pickup_exception", date: r.date }, r.pickup_exception)}>
                           {r.pickup_exception}
                         </td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.shipped_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "shipped", date: r.date }, r.shipped)}>
                           {r.shipped}
                         </td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.issue_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "issue", date: r.date }, r.issue)}>
                           {r.issue}
                         </td>
 
                         <td className="p-2 text-blue-600 cursor-pointer"
-                          onClick={() => goToShipmentOrders(r.delivered_ids || [])}>
+                          onClick={() => goToShipmentOrders({ column: "delivered", date: r.date }, r.delivered)}>
                           {r.delivered}
                         </td>
 
@@ -377,7 +362,10 @@ export default function ShipmentStatusPage() {
                                   width: `${(row.value / max) * 100}%`,
                                 }}
                                 onClick={() =>
-                                  goToShipmentOrders(row.order_ids)
+                                  goToShipmentOrders(
+                                    { column: "pending_age", age: row.age },
+                                    row.value
+                                  )
                                 }
                               />
                               <span className="text-sm text-slate-800 font-medium">
@@ -0,0 +1,43 @@
+// Resolves one cell of the order-status / ship-status-v2 boards into its order ids.
+// The boards only return counts plus a `drilldown_token`; ids are fetched on click.
+
+type DrilldownCell = {
+  column: string;
+  date?: string; // row date, YYYY-MM-DD (labels may carry a weekday suffix)
+  age?: number; // pending_age bucket
+};
+
+const PAGE_LIMIT = 1000;
+
+export async function fetchDrilldownIds(
+  baseUrl: string,
+  token: string,
+  cell: DrilldownCell
+): Promise<string[]> {
+  const ids: string[] = [];
+  let page = 1;
+  let pages = 1;
+
+  do {
+    const params = new URLSearchParams();
+    params.append("token", token);
+    params.append("column", cell.column);
+    if (cell.date) params.append("date", cell.date.split(" ")[0]);
+    if (cell.age !== undefined) params.append("age", String(cell.age));
+    params.append("page", String(page));
+    params.append("limit", String(PAGE_LIMIT));
+
+    const r = await fetch(
+      `${baseUrl}/api/stats/status-board/drilldown?${params.toString()}`,
+      { cache: "no-store" }
+    );
+    if (!r.ok) throw new Error((await r.text()) || String(r.status));
+    const json = await r.json();
+
+    ids.push(...(json.order_ids ?? []));
+    pages = json.pagination?.pages ?? 1;
+    page += 1;
+  } while (page <= pages);
+
+  return ids;
+}